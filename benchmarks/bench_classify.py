@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+import random
+import time
+from formatter import DocumentFormatter
+from classifier import CompiledTemplate
+
+# 用法（在项目根目录）：python -m benchmarks.bench_classify
+
+TEMPLATE = {
+    "name": "基准测试模板",
+    "rules": {
+        "title": {"type": "position", "position": 1},
+        "subtitle": {"type": "regex", "pattern": r"^第[一二三四五六七八九十百]+[章节条]"},
+        "heading": {"type": "keyword", "keyword": "关于"},
+        "notice": {"type": "keyword", "keyword": "通知"},
+        "signature": {"type": "length", "max_length": 8},
+        "body": {"type": "default"}
+    },
+    "formats": {}
+}
+
+# 关键词规则较多的模板（如按公文种类识别标题），用于比较多模式匹配器
+KEYWORD_TEMPLATE = {
+    "name": "多关键词模板",
+    "rules": dict(
+        [(f"kind{i}", {"type": "keyword", "keyword": kw}) for i, kw in enumerate([
+            "决定", "命令", "公报", "公告", "通告", "意见", "通报", "报告", "请示", "批复",
+            "议案", "函", "纪要", "规定", "办法", "细则", "方案", "计划", "总结", "章程",
+            "条例", "规则", "制度", "须知", "简报", "要点", "预案", "指南", "说明", "声明"
+        ])] + [("body", {"type": "default"})]
+    ),
+    "formats": {}
+}
+
+SAMPLES = [
+    "第三章 总则",
+    "关于进一步加强文档管理工作的通知",
+    "为贯彻落实有关要求，现就相关事项通知如下。",
+    "办公室",
+    "各部门应当按照统一格式整理归档材料，确保内容完整、格式规范、便于检索。",
+    "附件：文档格式规范说明",
+]
+
+
+def make_paragraphs(count, seed=0):
+    rnd = random.Random(seed)
+    return [SimpleNamespace(text=rnd.choice(SAMPLES)) for _ in range(count)]
+
+
+def bench_rule_loop(paragraphs, template):
+    formatter = DocumentFormatter()
+    rules = template['rules']
+    return [formatter.classify_paragraph(p, rules, para_index=i + 1) for i, p in enumerate(paragraphs)]
+
+
+def bench_compiled(paragraphs, template):
+    classifier = CompiledTemplate(template)
+    return classifier.classify_all([p.text.strip() for p in paragraphs])
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(count=50000):
+    paragraphs = make_paragraphs(count)
+    print(f"段落数: {count}")
+    for template in (TEMPLATE, KEYWORD_TEMPLATE):
+        loop_time, expected = timed(bench_rule_loop, paragraphs, template)
+        compiled_time, actual = timed(bench_compiled, paragraphs, template)
+        if expected != actual:
+            raise Exception("编译后的分类结果与逐条规则结果不一致！")
+        print(f"[{template['name']}]")
+        print(f"  逐条规则: {loop_time * 1000:.1f} ms")
+        print(f"  编译模板: {compiled_time * 1000:.1f} ms")
+        print(f"  加速比: {loop_time / compiled_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.corpus import generate_corpus, add_corpus_arguments, params_from_args, MANIFEST
+
+# 用法（在项目根目录）：
+#   python -m benchmarks.bench_e2e                         生成语料并运行全部用例
+#   python -m benchmarks.bench_e2e --cases merge,format_lxml --docs 100 --repeat 5
+#   python -m benchmarks.bench_e2e --compare benchmarks/results/基准.json
+# 每个用例在单独的进程中运行，峰值内存为该进程的峰值 RSS（不含其中启动的工作进程）。
+# 默认使用临时 SQLite 数据库，--db configured 时使用 config/database.py 配置的数据库。
+# 结果写入 benchmarks/results/<时间>_<提交>.json；--compare 与基准结果比较，
+# 有指标变差超过 --threshold 时退出码为 1。
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# 覆盖位置、正则、关键词、长度和默认规则，与语料的公文结构对应
+TEMPLATE = {
+    "name": "基准测试模板",
+    "rules": {
+        "title": {"type": "position", "position": 1},
+        "chapter": {"type": "regex", "pattern": r"^第[一二三四五六七八九十]+章"},
+        "notice": {"type": "keyword", "keyword": "通知"},
+        "signature": {"type": "length", "max_length": 12},
+        "body": {"type": "default"}
+    },
+    "formats": {
+        "title": {"font": "方正小标宋简体", "size": 22, "alignment": "居中", "bold": True},
+        "chapter": {"font": "黑体", "size": 16, "alignment": "左对齐"},
+        "notice": {"font": "黑体", "size": 16, "alignment": "居中"},
+        "signature": {"font": "仿宋", "size": 16, "alignment": "右对齐"},
+        "body": {"font": "仿宋", "size": 16, "alignment": "两端对齐", "indent": 0.74, "line_spacing": 28}
+    }
+}
+
+# 用例名 -> (类型, 参数)；workers 为 None 时取 --workers
+CASES = {
+    'merge': ('merge', {'workers': 1}),
+    'merge_parallel': ('merge', {'workers': None}),
+    'format_docx': ('format', {'engine': 'docx', 'workers': 1}),
+    'format_lxml': ('format', {'engine': 'lxml', 'workers': 1}),
+    'format_style': ('format', {'engine': 'style', 'workers': 1}),
+    'format_stream': ('format', {'engine': 'stream', 'workers': 1}),
+    'format_parallel': ('format', {'engine': 'lxml', 'workers': None}),
+    'models': ('models', {'calls': 500}),
+}
+
+# 比较时低于这些绝对差值的变化视为测量噪声（按指标单位）
+NOISE_FLOOR = {'_s': 0.01, '_ms': 1.0, '_mb': 5.0}
+
+# 影响结果的环境变量，记录在结果中
+RECORDED_ENV = ('DB_BACKEND', 'TRACE', 'TRACE_MIN_MS', 'LOG_ASYNC', 'MODEL_CACHE', 'ZIP_COMPRESS_LEVEL')
+
+
+def percentile(values, q):
+    """线性插值的百分位数（q 为 0～100）"""
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def latency_summary(latencies_ms):
+    return {
+        'count': len(latencies_ms),
+        'p50': round(percentile(latencies_ms, 50), 2) if latencies_ms else None,
+        'p95': round(percentile(latencies_ms, 95), 2) if latencies_ms else None,
+        'max': round(max(latencies_ms), 2) if latencies_ms else None
+    }
+
+
+class _FileClock:
+    """代替进度条和状态标签，记录合并时每个文件开始处理的时间"""
+
+    def __init__(self):
+        self.starts = []
+
+    def setValue(self, value):
+        pass
+
+    def setText(self, text):
+        self.starts.append(time.perf_counter())
+
+
+def bench_user():
+    from database.migrations import ensure_schema
+    from database.models import User
+    ensure_schema()
+    user = User().get_by_username('benchmark')
+    if user:
+        return user['id']
+    return User().create('benchmark', 'benchmark@example.com', '-')
+
+
+def run_merge_case(corpus_dir, work_dir, workers):
+    from merger import merge_documents
+    user_id = bench_user()
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    clock = _FileClock()
+    start = time.perf_counter()
+    merge_documents(corpus_dir, 'merged', out_dir, clock, clock, user_id=user_id, workers=workers)
+    end = time.perf_counter()
+    # 每个文件的耗时为相邻两个文件开始处理的间隔，最后一个文件计到合并结束（含保存）
+    marks = clock.starts + [end]
+    latencies = [(marks[i + 1] - marks[i]) * 1000 for i in range(len(clock.starts))]
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return end - start, latencies
+
+
+def run_format_case(corpus_dir, work_dir, engine, workers):
+    from formatter import DocumentFormatter
+    user_id = bench_user()
+    files = sorted(os.path.join(corpus_dir, f) for f in os.listdir(corpus_dir) if f.endswith('.docx'))
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    formatter = DocumentFormatter(user_id=user_id, engine=engine)
+    formatter.current_template = TEMPLATE
+    latencies = []
+
+    def on_result(record):
+        # 单文档耗时取读取、排版、保存各阶段之和，不含在流水线队列中等待的时间
+        timings = record['timings']
+        latencies.append(sum(timings.get(key, 0) for key in ('load_ms', 'format_ms', 'save_ms')))
+
+    start = time.perf_counter()
+    result = formatter.format_files(files, out_dir, workers=workers, use_cache=False, result_callback=on_result)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(out_dir, ignore_errors=True)
+    if result['failed']:
+        raise Exception(f"格式化失败: {result['failed'][:3]}")
+    return elapsed, latencies
+
+
+def time_calls(func, calls):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(calls):
+        t0 = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    total = time.perf_counter() - start
+    return dict(latency_summary(latencies), ops_per_s=round(calls / total, 1) if total else None)
+
+
+def run_models_case(calls):
+    """database.models 常用调用的单次耗时"""
+    from database.models import User, DocTask, DocFile, TaskLog, FormatTemplate
+    from database.cache import model_cache
+    from database.log_writer import flush_logs
+    user_id = bench_user()
+    users, tasks, files, logs, templates = User(), DocTask(), DocFile(), TaskLog(), FormatTemplate()
+    task_id = tasks.create(user_id, 'format', 'benchmark', '', '', None)
+    batch = [(f"f{i}.docx", f"/bench/f{i}.docx", 1000, 'docx') for i in range(50)]
+    files.create_many(task_id, batch)
+    file_ids = [f['id'] for f in tasks.get_task_files(task_id)]
+    batch_calls = max(calls // 25, 1)
+
+    def uncached_user(i):
+        model_cache.invalidate('user')
+        users.get_by_id(user_id)
+
+    ops = {
+        'user.get_by_id': time_calls(lambda i: users.get_by_id(user_id), calls),
+        'user.get_by_id_uncached': time_calls(uncached_user, calls),
+        'format_template.get_user_templates': time_calls(lambda i: templates.get_user_templates(user_id), calls),
+        'doc_task.create': time_calls(lambda i: tasks.create(user_id, 'format', f'benchmark{i}', '', '', None), calls),
+        'doc_task.get_task_files': time_calls(lambda i: tasks.get_task_files(task_id), calls),
+        'doc_file.create_many_50': time_calls(lambda i: files.create_many(task_id, batch), batch_calls),
+        'doc_file.save_progress_50': time_calls(
+            lambda i: files.save_progress(task_id, [('success', None, f) for f in file_ids], 50, 50, 0), batch_calls),
+        'task_log.add_log': time_calls(lambda i: logs.add_log(task_id, 'progress', f"基准 {i}"), calls),
+    }
+    start = time.perf_counter()
+    flush_logs()
+    ops['task_log.flush'] = dict(latency_summary([(time.perf_counter() - start) * 1000]), ops_per_s=None)
+    return ops
+
+
+def peak_rss_mb():
+    """进程启动以来的峰值常驻内存（MB），只增不减，无法获取时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        from tracing import windows_memory_mb
+        return windows_memory_mb('PeakWorkingSetSize')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def run_case(name, kind, params, corpus_dir, work_dir, repeat, warmup):
+    """在独立进程中运行一个用例并返回结果记录"""
+    record = {'name': name, 'kind': kind, 'params': params}
+    if kind == 'models':
+        record['ops'] = run_models_case(params['calls'])
+        record['peak_rss_mb'] = peak_rss_mb()
+        return record
+    with open(os.path.join(corpus_dir, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    docs = len(manifest['files'])
+    mb = manifest['bytes'] / 1024 / 1024
+    if kind == 'merge':
+        run = lambda: run_merge_case(corpus_dir, work_dir, params['workers'])
+    else:
+        run = lambda: run_format_case(corpus_dir, work_dir, params['engine'], params['workers'])
+    for _ in range(warmup):
+        run()
+    wall, latencies = [], []
+    for _ in range(repeat):
+        elapsed, file_latencies = run()
+        wall.append(elapsed)
+        latencies.extend(file_latencies)
+    median = percentile(wall, 50)
+    record.update({
+        'repeat': repeat,
+        'wall_s': [round(w, 4) for w in wall],
+        'median_s': round(median, 4),
+        'docs_per_s': round(docs / median, 2),
+        'mb_per_s': round(mb / median, 2),
+        'latency_ms': latency_summary(latencies),
+        'peak_rss_mb': peak_rss_mb()
+    })
+    return record
+
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    return commit or None, bool(dirty)
+
+
+def metrics(result):
+    """结果中参与比较的指标（都是越小越好）"""
+    values = {}
+    for case in result['cases']:
+        if case['kind'] == 'models':
+            for op, stats in case['ops'].items():
+                values[f"{case['name']}/{op}/p50_ms"] = stats['p50']
+        else:
+            values[f"{case['name']}/median_s"] = case['median_s']
+            values[f"{case['name']}/p95_ms"] = case['latency_ms']['p95']
+            values[f"{case['name']}/peak_rss_mb"] = case['peak_rss_mb']
+    return values
+
+
+def compare(result, baseline, threshold):
+    """打印与基准结果的比较，返回变差超过 threshold 的指标数"""
+    current, base = metrics(result), metrics(baseline)
+    regressions = 0
+    print(f"\n与基准比较（{baseline['meta'].get('commit')} → {result['meta'].get('commit')}，阈值 {threshold:.0%}）")
+    for key, value in current.items():
+        old = base.get(key)
+        if value is None or not old:
+            continue
+        change = value / old - 1
+        floor = next(v for suffix, v in NOISE_FLOOR.items() if key.endswith(suffix))
+        flag = ''
+        if change > threshold and value - old > floor:
+            flag = '  <-- 变差'
+            regressions += 1
+        print(f"  {key:<50} {old:>10g} → {value:>10g}  {change:+.1%}{flag}")
+    return regressions
+
+
+def print_case(case):
+    if case['kind'] == 'models':
+        print(f"[{case['name']}] 峰值内存 {case['peak_rss_mb']} MB")
+        for op, stats in case['ops'].items():
+            rate = f"  {stats['ops_per_s']} 次/秒" if stats['ops_per_s'] else ''
+            print(f"  {op:<40} p50 {stats['p50']} ms  p95 {stats['p95']} ms{rate}")
+        return
+    latency = case['latency_ms']
+    print(f"[{case['name']}] 中位 {case['median_s']} s，{case['docs_per_s']} 文档/秒，{case['mb_per_s']} MB/秒，"
+          f"单文档 p50 {latency['p50']} ms / p95 {latency['p95']} ms，峰值内存 {case['peak_rss_mb']} MB")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='端到端基准测试：合并、格式化与数据库模型调用')
+    add_corpus_arguments(parser)
+    parser.add_argument('--cases', help=f"运行的用例，逗号分隔（默认全部）：{','.join(CASES)}")
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例的计时次数')
+    parser.add_argument('--warmup', type=int, default=1, help='每个用例计时前的预热次数')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='并行用例的进程数')
+    parser.add_argument('--calls', type=int, default=500, help='模型用例每个调用的次数')
+    parser.add_argument('--corpus-dir', help='语料目录（默认在临时目录中生成，结束后删除）')
+    parser.add_argument('--db', choices=('sqlite', 'configured'), default='sqlite',
+                        help='sqlite 使用临时 SQLite 数据库，configured 使用配置的数据库')
+    parser.add_argument('--output', help='结果文件路径，默认 benchmarks/results/<时间>_<提交>.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='与基准结果文件比较')
+    parser.add_argument('--threshold', type=float, default=0.1, help='比较时视为变差的比例')
+    args = parser.parse_args()
+
+    names = args.cases.split(',') if args.cases else list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        raise Exception(f"未知的用例: {', '.join(unknown)}")
+    work_dir = tempfile.mkdtemp(prefix='xxwenling_bench_')
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, 'corpus')
+    params = params_from_args(args)
+    if args.db == 'sqlite':
+        # 在启动用例进程前设置，用例进程导入配置时读取
+        os.environ['DB_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(work_dir, 'bench.db')
+    try:
+        print(f"生成语料: {corpus_dir}")
+        generate_corpus(corpus_dir, params)
+        commit, dirty = git_revision()
+        result = {
+            'meta': {
+                'commit': commit,
+                'dirty': dirty,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'corpus': params,
+                'repeat': args.repeat,
+                'warmup': args.warmup,
+                'env': {key: os.environ[key] for key in RECORDED_ENV if key in os.environ}
+            },
+            'cases': []
+        }
+        for name in names:
+            kind, case_params = CASES[name]
+            case_params = dict(case_params)
+            if case_params.get('workers', 1) is None:
+                case_params['workers'] = args.workers
+            if kind == 'models':
+                case_params['calls'] = args.calls
+            # 每个用例使用新的进程，峰值内存互不影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                case = pool.submit(run_case, name, kind, case_params, corpus_dir, work_dir,
+                                   args.repeat, args.warmup).result()
+            print_case(case)
+            result['cases'].append(case)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
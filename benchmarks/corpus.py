@@ -0,0 +1,172 @@
+import os
+import json
+import zlib
+import struct
+import random
+from io import BytesIO
+from docx import Document
+from docx.shared import Cm
+from docx.oxml.ns import qn
+
+# 用法（在项目根目录）：python -m benchmarks.corpus 输出目录 --docs 50 --paragraphs 300
+# 相同参数和种子生成的文档内容相同；目录中已有参数相同的语料时直接沿用。
+
+MANIFEST = 'corpus.json'
+
+DEFAULT_FONTS = ['宋体', '仿宋', '黑体', '楷体', '仿宋_GB2312', '方正小标宋简体', 'Times New Roman']
+
+TOPICS = ['文档管理', '档案归档', '安全生产', '财务报销', '信息化建设', '人员培训', '节能减排', '质量检查']
+CHAPTER_NUMBERS = '一二三四五六七八九十'
+SENTENCES = [
+    "为贯彻落实有关要求，进一步规范工作流程，现就相关事项通知如下。",
+    "各部门应当按照统一格式整理归档材料，确保内容完整、格式规范、便于检索。",
+    "请各单位高度重视，结合实际认真组织实施，并于每月底前报送工作进展情况。",
+    "对工作中发现的问题要及时整改，建立台账，明确责任人和完成时限。",
+    "本办法自印发之日起施行，原有规定与本办法不一致的，以本办法为准。",
+    "The quarterly report covers 2024 Q3 figures, see Appendix A for details.",
+    "经研究决定，成立专项工作小组，负责统筹协调和督促检查相关工作。",
+    "各级负责人要切实履行职责，加强沟通协作，形成工作合力。",
+]
+
+
+def corpus_params(docs=20, paragraphs=200, runs=4, tables=1, images=1, fonts=None, seed=0):
+    """语料参数：文档数、每个文档的平均段落数、每段的 run 数（格式碎片化程度）、
+    每个文档的表格数和图片数、混用的字体列表、随机种子"""
+    return {
+        'docs': docs,
+        'paragraphs': paragraphs,
+        'runs': runs,
+        'tables': tables,
+        'images': images,
+        'fonts': list(fonts or DEFAULT_FONTS),
+        'seed': seed
+    }
+
+
+def make_png(width, height, seed):
+    """生成一张简单的渐变 PNG 图片（不依赖图像库）"""
+    rnd = random.Random(seed)
+    base = [rnd.randrange(256) for _ in range(3)]
+    rows = []
+    for y in range(height):
+        row = bytearray(b'\x00')
+        for x in range(width):
+            row += bytes(((base[0] + x) % 256, (base[1] + y) % 256, (base[2] + x + y) % 256))
+        rows.append(bytes(row))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 9))
+            + chunk(b'IEND', b''))
+
+
+def split_runs(text, count, rnd):
+    """把文本切成 count 段，模拟逐字修改后格式碎片化的段落"""
+    count = max(1, min(count, len(text)))
+    cuts = sorted(rnd.sample(range(1, len(text)), count - 1)) if count > 1 else []
+    bounds = [0] + cuts + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+def add_paragraph(doc, text, params, rnd):
+    paragraph = doc.add_paragraph()
+    for piece in split_runs(text, rnd.randint(1, params['runs'] * 2 - 1) if params['runs'] > 1 else 1, rnd):
+        run = paragraph.add_run(piece)
+        font = rnd.choice(params['fonts'])
+        run.font.name = font
+        run._element.get_or_add_rPr().get_or_add_rFonts().set(qn('w:eastAsia'), font)
+        if rnd.random() < 0.1:
+            run.font.bold = True
+    return paragraph
+
+
+def paragraph_texts(count, rnd):
+    """公文结构的段落：标题、发文对象、各章标题与正文，最后为落款和日期"""
+    topic = rnd.choice(TOPICS)
+    texts = [f"关于加强{topic}工作的通知", "各部门、各单位："]
+    chapter = 0
+    while len(texts) < count - 2:
+        if (len(texts) - 2) % 15 == 0:
+            texts.append(f"第{CHAPTER_NUMBERS[chapter % 10]}章 {rnd.choice(TOPICS)}")
+            chapter += 1
+        else:
+            texts.append(''.join(rnd.choice(SENTENCES) for _ in range(rnd.randint(1, 4))))
+    texts += ["办公室", f"2024年{rnd.randint(1, 12)}月{rnd.randint(1, 28)}日"]
+    return texts[:max(count, 1)]
+
+
+def build_document(path, params, index):
+    rnd = random.Random(params['seed'] * 100003 + index)
+    # 段落数在平均值的 50%～150% 之间变化
+    count = max(3, int(params['paragraphs'] * rnd.uniform(0.5, 1.5)))
+    texts = paragraph_texts(count, rnd)
+    doc = Document()
+    table_at = {rnd.randrange(len(texts)) for _ in range(params['tables'])}
+    image_at = {rnd.randrange(len(texts)) for _ in range(params['images'])}
+    for i, text in enumerate(texts):
+        add_paragraph(doc, text, params, rnd)
+        if i in table_at:
+            rows, cols = rnd.randint(3, 8), rnd.randint(2, 5)
+            table = doc.add_table(rows=rows, cols=cols)
+            table.style = 'Table Grid'
+            for r in range(rows):
+                for c in range(cols):
+                    table.cell(r, c).text = f"{rnd.choice(TOPICS)}{r * cols + c}"
+        if i in image_at:
+            image = make_png(rnd.randint(40, 120), rnd.randint(30, 90), rnd.random())
+            doc.add_picture(BytesIO(image), width=Cm(rnd.uniform(3, 8)))
+    doc.save(path)
+
+
+def generate_corpus(directory, params):
+    """在 directory 中生成语料并返回文件列表；已有参数相同的语料时直接返回"""
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    names = [f"doc_{i:04d}.docx" for i in range(params['docs'])]
+    paths = [os.path.join(directory, name) for name in names]
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['params'] == params and all(os.path.exists(p) for p in paths):
+            return paths
+    for name in os.listdir(directory):
+        if name.startswith('doc_') and name.endswith('.docx'):
+            os.remove(os.path.join(directory, name))
+    for i, path in enumerate(paths):
+        build_document(path, params, i)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'params': params, 'files': names, 'bytes': sum(os.path.getsize(p) for p in paths)},
+                  f, ensure_ascii=False, indent=2)
+    return paths
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='生成基准测试用的 DOCX 语料')
+    parser.add_argument('directory', help='输出目录')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    paths = generate_corpus(args.directory, params_from_args(args))
+    print(f"已生成 {len(paths)} 个文档: {args.directory}")
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument('--docs', type=int, default=20, help='文档数')
+    parser.add_argument('--paragraphs', type=int, default=200, help='每个文档的平均段落数')
+    parser.add_argument('--runs', type=int, default=4, help='每段的平均 run 数（格式碎片化程度）')
+    parser.add_argument('--tables', type=int, default=1, help='每个文档的表格数')
+    parser.add_argument('--images', type=int, default=1, help='每个文档的图片数')
+    parser.add_argument('--fonts', help='混用的字体，逗号分隔')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+
+def params_from_args(args):
+    fonts = args.fonts.split(',') if args.fonts else None
+    return corpus_params(args.docs, args.paragraphs, args.runs, args.tables, args.images, fonts, args.seed)
+
+
+if __name__ == "__main__":
+    main()
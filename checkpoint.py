@@ -0,0 +1,98 @@
+import os
+import time
+from collections import deque
+from database.models import DocTask, DocFile
+from config.settings import CHECKPOINT_CONFIG
+from tracing import span
+
+# 已完成、继续执行时不再处理的文件状态
+DONE_STATUSES = ('success', 'cached')
+
+
+def _file_row(path):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return (os.path.basename(path), path, size, ext if ext in ('doc', 'docx') else None)
+
+
+class TaskCheckpoint:
+    """批处理任务的文件级检查点
+
+    开始时把本次要处理的文件一次性登记到 doc_files（任务中已有的未完成记录直接沿用），
+    处理结果先在内存中累积，每 interval 个文件或最多 max_delay 秒与任务的
+    total_files/processed_files/error_count 在同一事务中写入一次。
+    进程中断时最多丢失最后一个检查点之后的状态，这些文件在继续执行时重新处理。
+    """
+
+    def __init__(self, task_id, file_list, interval=None, max_delay=None):
+        self.task_id = task_id
+        self.interval = interval or CHECKPOINT_CONFIG['interval']
+        self.max_delay = CHECKPOINT_CONFIG['max_delay'] if max_delay is None else max_delay
+        self.file_model = DocFile()
+        self._ids = self._register(file_list)
+        self._updates = []
+        self._last_flush = time.monotonic()
+
+    def _open_rows(self):
+        """任务的全部文件记录，以及按路径排列的未完成记录ID"""
+        rows = DocTask().get_task_files(self.task_id)
+        open_ids = {}
+        for row in rows:
+            if row['status'] not in DONE_STATUSES:
+                open_ids.setdefault(row['file_path'], deque()).append(row['id'])
+        return rows, open_ids
+
+    def _register(self, file_list):
+        rows, open_ids = self._open_rows()
+        available = {path: len(ids) for path, ids in open_ids.items()}
+        missing = []
+        for path in file_list:
+            if available.get(path):
+                available[path] -= 1
+            else:
+                missing.append(_file_row(path))
+        if missing:
+            self.file_model.create_many(self.task_id, missing)
+            rows, open_ids = self._open_rows()
+        # 本次要处理的记录从计数中扣除，其余记录按已有状态计入
+        claimed = set()
+        ids = {}
+        for path in file_list:
+            file_id = open_ids[path].popleft()
+            claimed.add(file_id)
+            ids.setdefault(path, deque()).append(file_id)
+        self.total = len(rows)
+        self.processed = sum(1 for row in rows if row['id'] not in claimed and row['status'] != 'pending')
+        self.errors = sum(1 for row in rows if row['id'] not in claimed and row['status'] == 'failed')
+        self.file_model.save_progress(self.task_id, [], self.total, self.processed, self.errors)
+        return ids
+
+    def mark(self, path, status, error=None):
+        """记录一个文件的处理结果，到达检查点时写入数据库"""
+        self._add(path, status, error)
+        if len(self._updates) >= self.interval or time.monotonic() - self._last_flush >= self.max_delay:
+            self.flush()
+
+    def mark_all(self, paths, status, error=None):
+        """记录多个文件的同一结果并立即在一个事务中写入（如合并结果保存之后）"""
+        for path in paths:
+            self._add(path, status, error)
+        self.flush()
+
+    def _add(self, path, status, error):
+        queue = self._ids.get(path)
+        if not queue:
+            return
+        self._updates.append((status, error, queue.popleft()))
+        self.processed += 1
+        if status == 'failed':
+            self.errors += 1
+
+    def flush(self):
+        updates, self._updates = self._updates, []
+        with span('db_checkpoint', files=len(updates)):
+            self.file_model.save_progress(self.task_id, updates, self.total, self.processed, self.errors)
+        self._last_flush = time.monotonic()
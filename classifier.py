@@ -0,0 +1,89 @@
+import regex
+
+# 关键词数量超过该值时使用多模式匹配器，否则逐个做子串查找更快
+KEYWORD_AUTOMATON_THRESHOLD = 16
+
+
+class CompiledTemplate:
+    """编译后的格式模板段落分类器
+
+    与 DocumentFormatter.classify_paragraph 的语义完全一致（按规则顺序取第一条命中的规则，
+    都不命中时为正文），但模板只编译一次：正则预编译，位置规则转为查找表，
+    关键词较多时合并为一个多模式匹配器，只扫描文本一遍；
+    各类规则只检查序号小于当前最优结果的部分。
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.formats = template.get('formats', {})
+        rules = template.get('rules', {})
+        self.rule_types = list(rules.keys())
+        self._none = len(self.rule_types)
+        self._positions = {}
+        self._lengths = []
+        self._regexes = []
+        self._always = self._none
+        keywords = {}
+        for index, (rule_type, rule) in enumerate(rules.items()):
+            kind = rule['type']
+            if kind == 'regex':
+                self._regexes.append((index, regex.compile(rule['pattern'])))
+            elif kind == 'keyword':
+                if rule['keyword']:
+                    keywords.setdefault(rule['keyword'], index)
+                else:
+                    # 空关键词总是命中
+                    self._always = min(self._always, index)
+            elif kind == 'position':
+                self._positions.setdefault(rule['position'], index)
+            elif kind == 'length':
+                self._lengths.append((index, rule['max_length']))
+        self._keyword_min = min(keywords.values(), default=self._none)
+        self._keywords = sorted(((i, k) for k, i in keywords.items()))
+        self._keyword_pattern = None
+        self._keyword_hits = {}
+        if len(keywords) > KEYWORD_AUTOMATON_THRESHOLD:
+            # 同一起点只返回最长的关键词，其前缀关键词通过 _keyword_hits 一并计入
+            ordered = sorted(keywords, key=len, reverse=True)
+            self._keyword_pattern = regex.compile('|'.join(regex.escape(k) for k in ordered))
+            for k in keywords:
+                self._keyword_hits[k] = min(i for p, i in keywords.items() if k.startswith(p))
+
+    def classify(self, text, para_index=1):
+        """对已去除首尾空白的段落文本分类，para_index为1基序号"""
+        best = min(self._positions.get(para_index, self._none), self._always)
+        for index, max_length in self._lengths:
+            if index >= best:
+                break
+            if len(text) <= max_length:
+                best = index
+                break
+        if self._keyword_min < best:
+            if self._keyword_pattern is None:
+                for index, keyword in self._keywords:
+                    if index >= best:
+                        break
+                    if keyword in text:
+                        best = index
+                        break
+            else:
+                for match in self._keyword_pattern.finditer(text, overlapped=True):
+                    hit = self._keyword_hits[match.group()]
+                    if hit < best:
+                        best = hit
+                        if best == self._keyword_min:
+                            break
+        for index, pattern in self._regexes:
+            if index >= best:
+                break
+            if pattern.search(text):
+                best = index
+                break
+        if best < self._none:
+            return self.rule_types[best]
+        return 'body'  # 默认为正文
+
+    def classify_all(self, texts):
+        """一次遍历对全部段落文本分类，返回与 texts 等长的类别列表"""
+        classify = self.classify
+        return [classify(text, index) for index, text in enumerate(texts, 1)]
@@ -0,0 +1,279 @@
+"""小小文灵命令行批处理入口（无界面，不依赖 Qt）
+
+    python cli.py merge 文档目录 --name 合并结果 [--save-dir 目录] [--workers N]
+    python cli.py format 文件或目录... --template 模板名 [--templates-file [路径]] [--output-dir 目录]
+    python cli.py resume 任务ID [--template 模板名] [--workers N]
+    python cli.py watch 监视目录 --template 模板名 [--output-dir 目录] [--workers N]
+    python cli.py serve [--host 地址] [--port 端口] [--workers N]
+    python cli.py init-db
+
+每处理完一个文件向标准输出写一行 JSON，最后一行为汇总（event 为 summary）。
+有文件失败时退出码为 1，参数或运行错误时为 2。
+"""
+import os
+import sys
+import json
+import argparse
+
+DEFAULT_TEMPLATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'format_templates.json')
+
+
+def emit(record):
+    """输出一行 JSON 并立即刷新，便于调用方逐行消费"""
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    sys.stdout.flush()
+
+
+class _MergeReporter:
+    """代替界面的进度条和状态标签，merge_documents 每处理一个文件输出一行"""
+
+    def __init__(self):
+        self.progress = 0
+
+    def setValue(self, value):
+        self.progress = value
+
+    def setText(self, text):
+        emit({'event': 'file', 'message': text, 'progress': self.progress})
+
+
+def resolve_user_id(args):
+    from database.models import User
+    if args.user is None:
+        raise Exception("请通过 --user 或环境变量 XXWENLING_USER 指定用户名！")
+    user = User().get_by_username(args.user)
+    if not user:
+        raise Exception(f"用户不存在: {args.user}")
+    return user['id']
+
+
+def load_template(args, user_id):
+    """按名称加载模板：指定 --templates-file 时从 JSON 文件读取，否则从数据库读取"""
+    if args.templates_file:
+        with open(args.templates_file, encoding='utf-8') as f:
+            templates = json.load(f)
+        if args.template not in templates:
+            raise Exception(f"模板文件中没有模板: {args.template}")
+        return templates[args.template]
+    from database.models import FormatTemplate
+    ft = FormatTemplate()
+    t = ft.find_by_name(user_id, args.template)
+    if t:
+        return ft.load_config(t)
+    raise Exception(f"数据库中没有模板: {args.template}")
+
+
+def db_pool_stats():
+    """数据库连接池统计，便于并行批处理时观察连接等待情况"""
+    from database.connection import DatabaseConnection
+    try:
+        return DatabaseConnection().pool_stats()
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def expand_inputs(paths):
+    """展开输入：目录取其中的 .docx 文件（按文件名排序），文件原样保留"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, f) for f in sorted(os.listdir(path))
+                         if f.lower().endswith('.docx') and not f.startswith('~$'))
+        else:
+            files.append(path)
+    return files
+
+
+def cmd_merge(args):
+    from merger import merge_documents
+    user_id = resolve_user_id(args)
+    reporter = _MergeReporter()
+    output_path = merge_documents(args.doc_dir, args.name, args.save_dir or args.doc_dir, reporter, reporter,
+                                  user_id=user_id, workers=args.workers, compress_level=args.compress_level,
+                                  trace=args.trace, profile=args.profile)
+    emit({'event': 'summary', 'success': True, 'output': output_path})
+    return 0
+
+
+def cmd_format(args):
+    from formatter import DocumentFormatter
+    user_id = resolve_user_id(args)
+    files = expand_inputs(args.inputs)
+    if not files:
+        raise Exception("没有需要处理的文档文件！")
+    formatter = DocumentFormatter(user_id=user_id, compress_level=args.compress_level, engine=args.engine)
+    if args.templates_file:
+        formatter.current_template = load_template(args, user_id)
+    elif not formatter.set_current_template(args.template):
+        # 从数据库选中模板，任务记录模板ID，继续执行时可直接使用
+        raise Exception(f"数据库中没有模板: {args.template}")
+    result = formatter.format_files(files, args.output_dir, workers=args.workers,
+                                    result_callback=lambda r: emit(dict(r, event='file')),
+                                    use_cache=False if args.no_cache else None, trace=args.trace,
+                                    profile=args.profile)
+    return emit_format_summary(result)
+
+
+def emit_format_summary(result):
+    emit({
+        'event': 'summary',
+        'task_id': result.get('task_id'),
+        'total': result['total'],
+        'success': result['success'],
+        'cached': result['cached'],
+        'failed': len(result['failed']),
+        'db_pool': db_pool_stats()
+    })
+    return 1 if result['failed'] else 0
+
+
+def cmd_resume(args):
+    """继续执行中断或失败的任务：格式化任务只处理未成功的文件，合并任务完整重做
+
+    未指定 --template 时使用任务记录的模板ID从数据库加载模板。
+    """
+    if args.templates_file and not args.template:
+        # 模板文件按名称查找，只给文件时无法确定使用哪个模板
+        raise Exception("--templates-file 需要与 --template 一起使用")
+    from database.models import DocTask
+    task = DocTask().get_by_id(args.task_id)
+    if not task:
+        raise Exception(f"任务不存在: {args.task_id}")
+    if task['task_type'] == 'merge':
+        from merger import resume_merge
+        reporter = _MergeReporter()
+        output_path = resume_merge(args.task_id, reporter, reporter, workers=args.workers,
+                                   compress_level=args.compress_level, trace=args.trace, profile=args.profile)
+        emit({'event': 'summary', 'success': True, 'output': output_path})
+        return 0
+    from formatter import DocumentFormatter
+    formatter = DocumentFormatter(user_id=task['user_id'], compress_level=args.compress_level, engine=args.engine)
+    if args.template:
+        formatter.current_template = load_template(args, task['user_id'])
+    result = formatter.resume_task(args.task_id, workers=args.workers,
+                                   result_callback=lambda r: emit(dict(r, event='file')),
+                                   use_cache=False if args.no_cache else None, trace=args.trace,
+                                   profile=args.profile)
+    return emit_format_summary(result)
+
+
+def cmd_watch(args):
+    from formatter import DocumentFormatter
+    from watcher import FolderWatcher
+    user_id = resolve_user_id(args)
+    formatter = DocumentFormatter(user_id=user_id, compress_level=args.compress_level, engine=args.engine)
+    formatter.current_template = load_template(args, user_id)
+    watcher = FolderWatcher(formatter, args.watch_dir, args.output_dir, workers=args.workers,
+                            interval=args.interval, settle=args.settle,
+                            result_callback=lambda r: emit(dict(r, event='file')),
+                            error_callback=lambda e: emit({'event': 'error', 'error': str(e)}))
+    emit({'event': 'watching', 'dir': os.path.abspath(args.watch_dir), 'state': watcher.state_path})
+    watcher.run()
+    return 0
+
+
+def cmd_serve(args):
+    from http_service import make_server, JobService
+    from database.migrations import ensure_schema
+    ensure_schema()
+    server = make_server(args.host, args.port, JobService(args.workers))
+    host, port = server.server_address[:2]
+    emit({'event': 'serving', 'url': f"http://{host}:{port}/", 'workers': server.service.workers})
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+    return 0
+
+
+def cmd_init_db(args):
+    from database.init_db import init_database
+    init_database()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='xxwenling', description='小小文灵命令行批处理（无界面）')
+    parser.add_argument('--user', default=os.getenv('XXWENLING_USER'), help='用户名（任务记录与数据库模板所属用户）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    merge = sub.add_parser('merge', help='合并目录下的文档')
+    merge.add_argument('doc_dir', help='文档目录')
+    merge.add_argument('--name', required=True, help='合并后文件名（不含扩展名）')
+    merge.add_argument('--save-dir', help='保存目录，默认为文档目录')
+    merge.add_argument('--workers', type=int, default=1, help='并行解析源文档的进程数')
+    merge.add_argument('--compress-level', type=int, help='改写部件的压缩级别（0 仅存储）')
+    merge.add_argument('--trace', metavar='FILE', help='把各阶段耗时导出为 Chrome trace JSON')
+    merge.add_argument('--profile', type=int, nargs='?', const=0, metavar='N',
+                       help='逐个文件剖析（cProfile + tracemalloc），只保留最慢的 N 个，不给 N 时保留全部')
+    merge.set_defaults(func=cmd_merge)
+
+    fmt = sub.add_parser('format', help='按模板批量格式化文档')
+    fmt.add_argument('inputs', nargs='+', help='.docx 文件或目录')
+    fmt.add_argument('--template', required=True, help='模板名称')
+    fmt.add_argument('--templates-file', nargs='?', const=DEFAULT_TEMPLATES_FILE,
+                     help='从 JSON 模板文件读取模板（不带路径时使用 templates/format_templates.json），默认从数据库读取')
+    fmt.add_argument('--output-dir', help='输出目录，默认在原文件旁生成 _formatted 文件')
+    fmt.add_argument('--workers', type=int, default=1, help='并行格式化的进程数')
+    fmt.add_argument('--engine', default='docx', choices=('docx', 'lxml', 'style', 'stream'), help='格式化引擎')
+    fmt.add_argument('--no-cache', action='store_true', help='不使用格式化结果缓存')
+    fmt.add_argument('--compress-level', type=int, help='改写部件的压缩级别（0 仅存储）')
+    fmt.add_argument('--trace', metavar='FILE', help='把各阶段耗时导出为 Chrome trace JSON')
+    fmt.add_argument('--profile', type=int, nargs='?', const=0, metavar='N',
+                     help='逐个文件剖析（cProfile + tracemalloc），只保留最慢的 N 个，不给 N 时保留全部')
+    fmt.set_defaults(func=cmd_format)
+
+    resume = sub.add_parser('resume', help='继续执行中断或失败的任务')
+    resume.add_argument('task_id', type=int, help='任务ID')
+    resume.add_argument('--template', help='格式化任务使用的模板名称，默认使用任务记录的模板')
+    resume.add_argument('--templates-file', nargs='?', const=DEFAULT_TEMPLATES_FILE,
+                        help='从 JSON 模板文件读取 --template 指定的模板（需与 --template 一起使用）')
+    resume.add_argument('--workers', type=int, default=1, help='并行处理的进程数')
+    resume.add_argument('--engine', default='docx', choices=('docx', 'lxml', 'style', 'stream'), help='格式化引擎')
+    resume.add_argument('--no-cache', action='store_true', help='不使用格式化结果缓存')
+    resume.add_argument('--compress-level', type=int, help='改写部件的压缩级别（0 仅存储）')
+    resume.add_argument('--trace', metavar='FILE', help='把各阶段耗时导出为 Chrome trace JSON')
+    resume.add_argument('--profile', type=int, nargs='?', const=0, metavar='N',
+                        help='逐个文件剖析（cProfile + tracemalloc），只保留最慢的 N 个，不给 N 时保留全部')
+    resume.set_defaults(func=cmd_resume)
+
+    watch = sub.add_parser('watch', help='监视目录，新文件写入完成后自动格式化')
+    watch.add_argument('watch_dir', help='监视目录')
+    watch.add_argument('--template', required=True, help='模板名称')
+    watch.add_argument('--templates-file', nargs='?', const=DEFAULT_TEMPLATES_FILE,
+                       help='从 JSON 模板文件读取模板，默认从数据库读取')
+    watch.add_argument('--output-dir', help='输出目录，默认在原文件旁生成 _formatted 文件')
+    watch.add_argument('--workers', type=int, default=1, help='并行格式化的进程数')
+    watch.add_argument('--engine', default='docx', choices=('docx', 'lxml', 'style', 'stream'), help='格式化引擎')
+    watch.add_argument('--interval', type=float, help='扫描间隔（秒）')
+    watch.add_argument('--settle', type=float, help='文件保持不变多少秒后视为写入完成')
+    watch.add_argument('--compress-level', type=int, help='改写部件的压缩级别（0 仅存储）')
+    watch.set_defaults(func=cmd_watch)
+
+    serve = sub.add_parser('serve', help='启动本地 HTTP 任务服务')
+    serve.add_argument('--host', help='监听地址，默认 SERVICE_HOST（127.0.0.1）')
+    serve.add_argument('--port', type=int, help='监听端口，默认 SERVICE_PORT（8765）')
+    serve.add_argument('--workers', type=int, help='同时执行的任务数，默认 SERVICE_WORKERS')
+    serve.set_defaults(func=cmd_serve)
+
+    init_db = sub.add_parser('init-db', help='初始化数据库')
+    init_db.set_defaults(func=cmd_init_db)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        emit({'event': 'error', 'error': str(e)})
+        return 2
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
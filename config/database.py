@@ -1,5 +1,6 @@
 from typing import Dict
 import os
+from config.settings import DATA_DIR
 
 # 数据库配置
 DB_CONFIG: Dict = {
@@ -11,9 +12,43 @@ DB_CONFIG: Dict = {
     'charset': 'utf8mb4'
 }
 
-# 数据库连接池配置
+# 数据库连接池配置：连接数在 min_size 与 max_size 之间随负载伸缩
 POOL_CONFIG: Dict = {
-    'pool_name': 'xxwenling_pool',
-    'pool_size': 5,
-    'pool_reset_session': True
-} 
\ No newline at end of file
+    'min_size': int(os.getenv('DB_POOL_MIN', 2)),
+    'max_size': int(os.getenv('DB_POOL_MAX', 20)),
+    # 连接全部占用时最长等待秒数
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    # 超出 min_size 的空闲连接保留秒数
+    'idle_timeout': float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+    # 空闲超过该秒数的连接取出前先检查是否可用
+    'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+    # 每个连接缓存的预处理语句数（0 表示不缓存，每次执行都重新预处理）
+    'statement_cache': int(os.getenv('DB_STATEMENT_CACHE', 64))
+}
+
+# 数据库后端：mysql 或 sqlite（单机使用，无需数据库服务器）
+DB_BACKEND: str = os.getenv('DB_BACKEND', 'mysql')
+
+# SQLite 配置：数据库文件路径与写锁等待时间（秒）
+SQLITE_CONFIG: Dict = {
+    'path': os.getenv('SQLITE_PATH', os.path.join(DATA_DIR, 'xxwenling.db')),
+    'timeout': float(os.getenv('SQLITE_TIMEOUT', 5))
+}
+
+# 日志异步写入：日志先进入内存队列，由后台线程攒批后用 executemany 写入（LOG_ASYNC=0 时同步写入）
+LOG_WRITER_CONFIG: Dict = {
+    'enabled': os.getenv('LOG_ASYNC', '1') != '0',
+    'batch_size': int(os.getenv('LOG_BATCH_SIZE', 200)),
+    'flush_interval': float(os.getenv('LOG_FLUSH_INTERVAL', 0.5)),
+    'max_queue': int(os.getenv('LOG_MAX_QUEUE', 10000)),
+    # 模型层等待日志写完的最长时间（秒），写入线程异常时不会无限等待
+    'flush_timeout': float(os.getenv('LOG_FLUSH_TIMEOUT', 30))
+}
+
+# 模型读缓存：用户与格式模板的查询结果在进程内缓存，本进程写入时失效，
+# 其他进程的修改最迟 ttl 秒后可见（MODEL_CACHE=0 关闭）
+MODEL_CACHE_CONFIG: Dict = {
+    'enabled': os.getenv('MODEL_CACHE', '1') != '0',
+    'max_size': int(os.getenv('MODEL_CACHE_SIZE', 512)),
+    'ttl': float(os.getenv('MODEL_CACHE_TTL', 60))
+}
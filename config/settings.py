@@ -0,0 +1,84 @@
+from typing import Dict
+import os
+
+# 本地数据目录（缓存、状态文件等）
+DATA_DIR: str = os.getenv('XXWENLING_DATA_DIR', os.path.join(os.path.expanduser('~'), '.xxwenling'))
+
+# .doc 转换服务配置
+CONVERTER_CONFIG: Dict = {
+    'backend': os.getenv('CONVERTER_BACKEND', 'word'),  # word / soffice / copy
+    'pool_size': int(os.getenv('CONVERTER_POOL_SIZE', 2)),
+    'cache_dir': os.getenv('CONVERTER_CACHE_DIR', os.path.join(DATA_DIR, 'convert_cache')),
+    'soffice_path': os.getenv('SOFFICE_PATH', 'soffice'),
+    'timeout': int(os.getenv('CONVERTER_TIMEOUT', 120)),
+    # 转换结果缓存的总大小上限（MB）与最长未使用天数，超出时淘汰最久未使用的文件，0 为不限
+    'max_mb': int(os.getenv('CONVERTER_CACHE_MAX_MB', 1024)),
+    'max_age_days': int(os.getenv('CONVERTER_CACHE_MAX_AGE_DAYS', 30))
+}
+
+# 输出 ZIP 写入配置：compress_level 为 0 时仅存储不压缩，1-9 为 deflate 压缩级别
+ZIP_CONFIG: Dict = {
+    'compress_level': int(os.getenv('ZIP_COMPRESS_LEVEL', 6))
+}
+
+# 格式化结果缓存：输入内容与模板均未变化的文件跳过处理（FORMAT_CACHE=0 关闭）
+FORMAT_CACHE_CONFIG: Dict = {
+    'enabled': os.getenv('FORMAT_CACHE', '1') != '0',
+    'cache_dir': os.getenv('FORMAT_CACHE_DIR', os.path.join(DATA_DIR, 'format_cache')),
+    # 缓存对象总大小上限（MB）与最长未使用天数，超出时淘汰最久未使用的对象，0 为不限
+    'max_mb': int(os.getenv('FORMAT_CACHE_MAX_MB', 2048)),
+    'max_age_days': int(os.getenv('FORMAT_CACHE_MAX_AGE_DAYS', 30)),
+    # 索引变化追加写入日志，日志条目超过该数量且多于索引条目时整体重写 index.json
+    'index_batch': int(os.getenv('FORMAT_CACHE_INDEX_BATCH', 1000)),
+    # 缓存对象与输出文件使用硬链接而不是复制（输出文件可能被原地修改时不要开启）
+    'link': os.getenv('FORMAT_CACHE_LINK', '0') == '1'
+}
+
+# 批量格式化流水线：读取预取数量与待写出队列长度，限制同时驻留内存的文档数
+PIPELINE_CONFIG: Dict = {
+    'read_ahead': int(os.getenv('PIPELINE_READ_AHEAD', 4)),
+    'write_queue': int(os.getenv('PIPELINE_WRITE_QUEUE', 2))
+}
+
+# 监视目录服务：扫描间隔与文件稳定判定时间（秒），文件大小和修改时间保持不变达到 settle 秒才处理
+WATCH_CONFIG: Dict = {
+    'interval': float(os.getenv('WATCH_INTERVAL', 1.0)),
+    'settle': float(os.getenv('WATCH_SETTLE', 2.0)),
+    'state_dir': os.getenv('WATCH_STATE_DIR', os.path.join(DATA_DIR, 'watch'))
+}
+
+# 本地任务服务：监听地址、同时执行的任务数、上传文件目录与单个上传文件大小上限（MB）
+SERVICE_CONFIG: Dict = {
+    'host': os.getenv('SERVICE_HOST', '127.0.0.1'),
+    'port': int(os.getenv('SERVICE_PORT', 8765)),
+    'workers': int(os.getenv('SERVICE_WORKERS', 2)),
+    'upload_dir': os.getenv('SERVICE_UPLOAD_DIR', os.path.join(DATA_DIR, 'uploads')),
+    # 任务的输出只能写在该目录下
+    'output_dir': os.getenv('SERVICE_OUTPUT_DIR', os.path.join(DATA_DIR, 'outputs')),
+    # 客户端需在请求头 Authorization: Bearer <令牌> 中给出的共享令牌，未设置时服务不启动
+    'token': os.getenv('SERVICE_TOKEN', ''),
+    'max_upload_mb': int(os.getenv('SERVICE_MAX_UPLOAD_MB', 200))
+}
+
+# 批处理检查点：文件状态和任务进度每处理 interval 个文件或最多 max_delay 秒写入数据库一次
+CHECKPOINT_CONFIG: Dict = {
+    'interval': int(os.getenv('CHECKPOINT_INTERVAL', 50)),
+    'max_delay': float(os.getenv('CHECKPOINT_MAX_DELAY', 5.0))
+}
+
+# 性能跟踪：批处理各阶段的跨度写入 performance_logs（TRACE=0 时每个任务只记录一条总耗时）；
+# 短于 min_ms 毫秒的跨度不写入数据库，export_dir 不为空时每个任务导出 Chrome trace-event JSON
+TRACE_CONFIG: Dict = {
+    'enabled': os.getenv('TRACE', '1') != '0',
+    'min_ms': float(os.getenv('TRACE_MIN_MS', 0)),
+    'export_dir': os.getenv('TRACE_EXPORT_DIR') or None,
+    # 跨度峰值内存的采样间隔（毫秒），0 时只取跨度开始和结束时的 RSS
+    'sample_ms': float(os.getenv('TRACE_SAMPLE_MS', 10))
+}
+
+# 性能剖析（--profile）：报告中的函数统计行数、内存分配行数和 tracemalloc 记录的调用栈深度
+PROFILE_CONFIG: Dict = {
+    'stats_lines': int(os.getenv('PROFILE_STATS_LINES', 40)),
+    'alloc_lines': int(os.getenv('PROFILE_ALLOC_LINES', 25)),
+    'frames': int(os.getenv('PROFILE_FRAMES', 1))
+}
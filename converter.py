@@ -0,0 +1,395 @@
+import os
+import sys
+import time
+import socket
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import atexit
+import queue
+from pathlib import Path
+from concurrent.futures import Future
+from config.settings import CONVERTER_CONFIG
+
+
+class ConverterBackend:
+    """.doc 转换后端接口
+
+    每个后端实例由转换池中的一个工作线程独占：start 在该线程中调用一次并保持预热，
+    之后反复调用 convert，池关闭时调用 stop。
+    """
+    name = None
+
+    def start(self):
+        pass
+
+    def convert(self, src_path, dst_path):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class WordComBackend(ConverterBackend):
+    """通过 COM 驱动常驻的 Word 进程进行转换"""
+    name = 'word'
+
+    def __init__(self):
+        self.word = None
+
+    def start(self):
+        import pythoncom
+        import win32com.client
+        pythoncom.CoInitialize()
+        self.word = win32com.client.DispatchEx("Word.Application")
+        self.word.Visible = False
+        self.word.DisplayAlerts = 0
+
+    def convert(self, src_path, dst_path):
+        try:
+            doc = self.word.Documents.Open(os.path.abspath(src_path), ReadOnly=True)
+            try:
+                doc.SaveAs2(os.path.abspath(dst_path), FileFormat=16)
+            finally:
+                doc.Close(False)
+        except Exception as e:
+            # Word 进程可能已失效，重启后再把错误抛给调用方；重启也失败时保留原来的转换错误
+            try:
+                self.stop()
+                self.start()
+            except Exception as restart_error:
+                raise Exception(f"{str(e)}（Word 重启失败: {str(restart_error)}）") from e
+            raise
+
+    def stop(self):
+        import pythoncom
+        if self.word is not None:
+            try:
+                self.word.Quit()
+            except Exception:
+                pass
+            self.word = None
+        pythoncom.CoUninitialize()
+
+
+class SofficeBackend(ConverterBackend):
+    """通过常驻的无界面 LibreOffice/soffice 进行转换
+
+    每个工作线程启动一个监听本机端口的 soffice 进程（--accept），并使用独立的用户配置目录
+    （-env:UserInstallation，多个 soffice 共用默认配置会相互冲突），之后通过 UNO 逐个转换文件，
+    不再为每个文件付出 LibreOffice 的启动开销。转换出错时重启该进程。
+    当前 Python 无法导入 uno 模块（需使用 LibreOffice 自带的 Python 或安装 python3-uno）时，
+    退回为每个文件单独运行一次 soffice --convert-to。
+    """
+    name = 'soffice'
+    # Word 2007-365 (.docx) 导出过滤器
+    FILTER = 'MS Word 2007 XML'
+
+    def __init__(self, binary=None, timeout=None):
+        self.binary = binary or CONVERTER_CONFIG['soffice_path']
+        self.timeout = timeout or CONVERTER_CONFIG['timeout']
+        self.profile_dir = None
+        self.process = None
+        self.desktop = None
+        self.uno = None
+
+    def start(self):
+        self.profile_dir = tempfile.mkdtemp(prefix='xxwenling_soffice_')
+        try:
+            import uno
+        except ImportError:
+            print("未找到 uno 模块，soffice 转换退回为每个文件启动一次", file=sys.stderr)
+            return
+        self.uno = uno
+        self._launch()
+
+    def _launch(self):
+        port = _free_port()
+        self.process = subprocess.Popen([
+            self.binary,
+            f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+            '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+            f"--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        local = self.uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                # 首次启动需要初始化配置目录，监听端口就绪前连接会被拒绝
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self._terminate()
+                    raise Exception("soffice 监听进程启动失败")
+                time.sleep(0.2)
+        self.desktop = ctx.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', ctx)
+
+    def _props(self, **values):
+        from com.sun.star.beans import PropertyValue
+        props = []
+        for name, value in values.items():
+            prop = PropertyValue()
+            prop.Name = name
+            prop.Value = value
+            props.append(prop)
+        return tuple(props)
+
+    def convert(self, src_path, dst_path):
+        if self.uno is None:
+            return self._convert_once(src_path, dst_path)
+        try:
+            if self.process is None or self.process.poll() is not None:
+                self._launch()
+            doc = self.desktop.loadComponentFromURL(self.uno.systemPathToFileUrl(os.path.abspath(src_path)),
+                                                    '_blank', 0, self._props(Hidden=True, ReadOnly=True))
+            if doc is None:
+                raise Exception(f"无法打开文档: {os.path.basename(src_path)}")
+            try:
+                doc.storeToURL(self.uno.systemPathToFileUrl(os.path.abspath(dst_path)),
+                               self._props(FilterName=self.FILTER, Overwrite=True))
+            finally:
+                doc.close(True)
+        except Exception:
+            # 监听进程可能已失效，下次转换时重新启动
+            self._terminate()
+            raise
+
+    def _convert_once(self, src_path, dst_path):
+        out_dir = tempfile.mkdtemp(prefix='xxwenling_convert_')
+        try:
+            subprocess.run([
+                self.binary,
+                f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+                '--headless', '--norestore',
+                '--convert-to', 'docx',
+                '--outdir', out_dir,
+                os.path.abspath(src_path)
+            ], check=True, timeout=self.timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            produced = os.path.join(out_dir, f"{os.path.splitext(os.path.basename(src_path))[0]}.docx")
+            if not os.path.exists(produced):
+                raise Exception(f"转换未生成输出文件: {os.path.basename(src_path)}")
+            shutil.move(produced, dst_path)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    def _terminate(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(10)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+
+    def stop(self):
+        self._terminate()
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class CopyBackend(ConverterBackend):
+    """本地替身后端：直接复制源文件，用于测试（源文件需本身就是 docx 内容）"""
+    name = 'copy'
+
+    def convert(self, src_path, dst_path):
+        shutil.copyfile(src_path, dst_path)
+
+
+BACKENDS = {
+    WordComBackend.name: WordComBackend,
+    SofficeBackend.name: SofficeBackend,
+    CopyBackend.name: CopyBackend
+}
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """计算文件内容的 SHA-256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ConverterPool:
+    """常驻的 .doc 转换池
+
+    维护至多 pool_size 个预热的转换后端实例（各占一个工作线程），
+    转换结果按后端名称和源文件内容哈希缓存在 cache_dir 中，相同内容的文件只转换一次。
+    缓存文件的修改时间即最近使用时间，每次转换出新文件后按 max_mb 和 max_age_days
+    淘汰最久未使用的文件；最近 KEEP_RECENT 秒内用过的文件调用方可能仍在读取，不按大小淘汰。
+    """
+    KEEP_RECENT = 3600
+
+    def __init__(self, backend=None, pool_size=None, cache_dir=None):
+        backend = backend or CONVERTER_CONFIG['backend']
+        if isinstance(backend, str):
+            if backend not in BACKENDS:
+                raise Exception(f"未知的转换后端: {backend}")
+            backend = BACKENDS[backend]
+        self.backend_factory = backend
+        self.backend_name = getattr(backend, 'name', None) or backend.__name__
+        self.pool_size = pool_size or CONVERTER_CONFIG['pool_size']
+        self.cache_dir = cache_dir or CONVERTER_CONFIG['cache_dir']
+        self._jobs = queue.Queue()
+        self._threads = []
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._closed = False
+
+    def cache_path(self, digest):
+        return os.path.join(self.cache_dir, self.backend_name, digest[:2], f"{digest}.docx")
+
+    def submit(self, doc_path):
+        """提交转换，返回 Future，结果为缓存中的 .docx 路径（调用方不得删除）"""
+        digest = file_sha256(doc_path)
+        cached = self.cache_path(digest)
+        with self._lock:
+            if self._closed:
+                raise Exception("转换服务已关闭！")
+            future = self._inflight.get(digest)
+            if future is not None:
+                return future
+            future = Future()
+            if _touch(cached):
+                future.set_result(cached)
+                return future
+            self._inflight[digest] = future
+            if len(self._threads) < self.pool_size:
+                self._start_worker()
+        self._jobs.put((doc_path, digest, future))
+        return future
+
+    def convert(self, doc_path):
+        """同步转换，命中缓存时直接返回"""
+        return self.submit(doc_path).result()
+
+    def _start_worker(self):
+        t = threading.Thread(target=self._worker, name=f"doc-converter-{len(self._threads) + 1}", daemon=True)
+        self._threads.append(t)
+        t.start()
+
+    def _worker(self):
+        backend = self.backend_factory()
+        started = False
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                doc_path, digest, future = job
+                try:
+                    if not started:
+                        backend.start()
+                        started = True
+                    cached = self.cache_path(digest)
+                    os.makedirs(os.path.dirname(cached), exist_ok=True)
+                    # 先写临时文件再原子替换，避免缓存中出现半成品
+                    fd, temp_path = tempfile.mkstemp(suffix='.docx', dir=os.path.dirname(cached))
+                    os.close(fd)
+                    try:
+                        backend.convert(doc_path, temp_path)
+                        os.replace(temp_path, cached)
+                    finally:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                    self.prune()
+                    future.set_result(cached)
+                except Exception as e:
+                    future.set_exception(Exception(f"文档转换失败: {os.path.basename(doc_path)} - {str(e)}"))
+                finally:
+                    with self._lock:
+                        self._inflight.pop(digest, None)
+        finally:
+            if started:
+                backend.stop()
+
+    def prune(self):
+        """删除过期的转换结果，并按最近使用时间从旧到新删除，直到总大小不超过 max_mb；返回删除的文件数"""
+        max_bytes = CONVERTER_CONFIG['max_mb'] * 1024 * 1024
+        max_age = CONVERTER_CONFIG['max_age_days'] * 86400
+        if not max_bytes and not max_age:
+            return 0
+        with self._prune_lock:
+            files = []
+            try:
+                for folder in os.scandir(os.path.join(self.cache_dir, self.backend_name)):
+                    if not folder.is_dir():
+                        continue
+                    for entry in os.scandir(folder.path):
+                        if entry.name.endswith('.docx'):
+                            st = entry.stat()
+                            files.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:
+                # 目录不存在或文件同时被删除，下次再清理
+                return 0
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            now = time.time()
+            removed = 0
+            for used, size, path in files:
+                expired = max_age and now - used > max_age
+                if not expired and not (max_bytes and total > max_bytes and now - used > self.KEEP_RECENT):
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+    def shutdown(self):
+        """停止所有工作线程并关闭后端实例"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._jobs.put(None)
+        for t in threads:
+            t.join()
+
+
+def _touch(path):
+    """把缓存文件的修改时间更新为现在（记为最近使用），文件不存在时返回 False"""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_converter():
+    """获取进程内共享的默认转换池（按 CONVERTER_CONFIG 创建）"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ConverterPool()
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
@@ -0,0 +1,64 @@
+import time
+import threading
+from collections import OrderedDict
+from config.database import MODEL_CACHE_CONFIG
+
+
+class ModelCache:
+    """模型查询的进程内读穿透缓存
+
+    键为元组，第一项为命名空间（如 'user'、'template'）；容量超过 max_size 时淘汰最久未用的项，
+    超过 ttl 秒的项重新查询。模型写入后按命名空间整体失效；加载期间发生失效时，
+    加载到的旧结果不放入缓存。结果为 None（记录不存在）时不缓存。
+    缓存的记录和配置由各调用方共享，不要原地修改。
+    """
+
+    def __init__(self, max_size=None, ttl=None, enabled=None):
+        self.max_size = max_size or MODEL_CACHE_CONFIG['max_size']
+        self.ttl = MODEL_CACHE_CONFIG['ttl'] if ttl is None else ttl
+        self.enabled = MODEL_CACHE_CONFIG['enabled'] if enabled is None else enabled
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """返回缓存的值，未命中或已过期时调用 loader() 加载并缓存"""
+        if not self.enabled:
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        if value is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._data[key] = (now + self.ttl, value)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.max_size:
+                        self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, namespace=None):
+        """使某个命名空间（为 None 时全部）的缓存失效"""
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if k[0] == namespace]:
+                    del self._data[key]
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+model_cache = ModelCache()
@@ -1,90 +1,316 @@
-import mysql.connector
-from mysql.connector import pooling
+import threading
+from collections import OrderedDict
 from typing import Optional
-from config.database import DB_CONFIG, POOL_CONFIG
+from config.database import DB_CONFIG, DB_BACKEND, POOL_CONFIG
+from .pool import ConnectionPool
+
+
+class MySQLConnection:
+    """池中的 MySQL 连接：在连接上缓存服务端预处理游标（按语句，最近最少使用的超出上限时关闭），
+    连接归还后再次取出仍可复用，不必每个会话都重新 PREPARE；连接被池关闭时一并释放。
+    其余属性转发给实际连接"""
+
+    def __init__(self, conn, statement_cache=None):
+        self._conn = conn
+        self._statements = OrderedDict()
+        self._statement_cache = POOL_CONFIG['statement_cache'] if statement_cache is None else statement_cache
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def statement(self, query, dictionary=False):
+        """取语句对应的预处理游标，没有时新建（首次执行时预处理）"""
+        key = (query, dictionary)
+        cursor = self._statements.get(key)
+        if cursor is not None:
+            self._statements.move_to_end(key)
+            return cursor
+        cursor = self._conn.cursor(prepared=True, dictionary=dictionary)
+        if self._statement_cache > 0:
+            self._statements[key] = cursor
+            while len(self._statements) > self._statement_cache:
+                self._statements.popitem(last=False)[1].close()
+        return cursor
+
+    def close(self):
+        statements, self._statements = self._statements, OrderedDict()
+        for cursor in statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._conn.close()
+
+
+class MySQLSession:
+    """MySQL 工作单元：独占一个池连接，语句使用连接上缓存的预处理游标"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _cursor(self, query, dictionary=False):
+        return self.conn.statement(query, dictionary)
+
+    def execute(self, query, params=None):
+        cursor = self._cursor(query)
+        cursor.execute(query, params or ())
+        return cursor.lastrowid, cursor.rowcount
+
+    def execute_many(self, query, params_list):
+        cursor = self._cursor(query)
+        cursor.executemany(query, params_list)
+        return cursor.rowcount
+
+    def query(self, query, params=None):
+        cursor = self._cursor(query, dictionary=True)
+        cursor.execute(query, params or ())
+        return cursor.fetchall()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        _release(self.conn, self.conn.in_transaction)
+
+
+def _mysql_ping(conn):
+    conn.ping(reconnect=False)
+    return True
+
+
+def _release(conn, failed):
+    """归还连接；语句执行出错且连接已断开时丢弃，不放回池中"""
+    broken = False
+    if failed:
+        try:
+            broken = not conn.is_connected()
+        except Exception:
+            broken = True
+    conn.close(broken=broken)
+
+
+def _mysql_reset(conn):
+    # 归还前回滚未提交的事务，下一个使用者拿到的是干净的会话
+    if conn.in_transaction:
+        conn.rollback()
+
+
+class MySQLBackend:
+    """MySQL 后端，使用可伸缩的线程安全连接池（见 database/pool.py）"""
+
+    def __init__(self):
+        import mysql.connector
+        self._connect = mysql.connector.connect
+        self._pool = ConnectionPool(self._new_connection, ping=_mysql_ping, reset=_mysql_reset)
+
+    def _new_connection(self):
+        return MySQLConnection(self._connect(**DB_CONFIG))
+
+    def get_connection(self):
+        return self._pool.connection()
+
+    def stats(self):
+        return dict(self._pool.stats(), backend='mysql')
+
+    def session(self):
+        return MySQLSession(self.get_connection())
+
+    def execute_query(self, query, params=None):
+        conn = self.get_connection()
+        cursor = None
+        failed = True
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, params or ())
+            result = cursor.fetchall()
+            failed = False
+            return result
+        finally:
+            if cursor:
+                cursor.close()
+            _release(conn, failed)
+
+    def execute_update(self, query, params=None):
+        return self._write(lambda cursor: cursor.execute(query, params or ()))
+
+    def execute_many(self, query, params_list):
+        # mysql-connector 把 INSERT ... VALUES 的 executemany 改写为一条多行插入
+        return self._write(lambda cursor: cursor.executemany(query, params_list))
+
+    def execute_transaction(self, queries):
+        def run(cursor):
+            for query, params in queries:
+                cursor.execute(query, params or ())
+        self._write(run)
+        return True
+
+    def _write(self, run):
+        """在一个连接上执行写入并提交，出错时回滚，返回影响行数"""
+        conn = self.get_connection()
+        cursor = None
+        failed = True
+        try:
+            cursor = conn.cursor()
+            run(cursor)
+            conn.commit()
+            failed = False
+            return cursor.rowcount
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            _release(conn, failed)
+
+
+class Session:
+    """工作单元：一次逻辑操作只取一个连接，其中的写入在退出时一起提交，出错时一起回滚
+
+        with DatabaseConnection().session() as s:
+            task_id = s.insert("INSERT INTO doc_tasks ...", params)
+            s.execute("INSERT INTO task_logs ...", (task_id, ...))
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._impl = None
+
+    def __enter__(self):
+        try:
+            self._impl = self._backend.session()
+        except Exception as e:
+            raise Exception(f"获取数据库连接失败: {str(e)}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._impl.commit()
+            else:
+                self._impl.rollback()
+        except Exception as e:
+            if exc_type is None:
+                raise Exception(f"事务执行失败: {str(e)}")
+        finally:
+            self._impl.close()
+            self._impl = None
+        return False
+
+    def execute(self, query: str, params: tuple = None) -> int:
+        """执行写入语句，返回影响行数"""
+        try:
+            return self._impl.execute(query, params)[1]
+        except Exception as e:
+            raise Exception(f"更新执行失败: {str(e)}")
+
+    def execute_many(self, query: str, params_list: list) -> int:
+        """用同一条语句写入多组参数"""
+        try:
+            return self._impl.execute_many(query, params_list)
+        except Exception as e:
+            raise Exception(f"批量写入失败: {str(e)}")
+
+    def insert(self, query: str, params: tuple = None) -> int:
+        """执行插入语句，返回新记录的自增ID（由驱动直接返回，不再查询）"""
+        try:
+            return self._impl.execute(query, params)[0]
+        except Exception as e:
+            raise Exception(f"更新执行失败: {str(e)}")
+
+    def query(self, query: str, params: tuple = None) -> list:
+        try:
+            return self._impl.query(query, params)
+        except Exception as e:
+            raise Exception(f"查询执行失败: {str(e)}")
+
+    def query_one(self, query: str, params: tuple = None):
+        rows = self.query(query, params)
+        return rows[0] if rows else None
+
+
+def create_backend(backend=None):
+    """按 DB_BACKEND 创建数据库后端"""
+    backend = backend or DB_BACKEND
+    if backend == 'mysql':
+        return MySQLBackend()
+    if backend == 'sqlite':
+        from database.sqlite_backend import SQLiteBackend
+        return SQLiteBackend()
+    raise Exception(f"未知的数据库后端: {backend}")
+
 
 class DatabaseConnection:
     _instance = None
-    _pool = None
+    _backend = None
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(DatabaseConnection, cls).__new__(cls)
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(DatabaseConnection, cls).__new__(cls)
         return cls._instance
 
     def __init__(self):
-        if self._pool is None:
-            try:
-                self._pool = mysql.connector.pooling.MySQLConnectionPool(
-                    **DB_CONFIG,
-                    **POOL_CONFIG
-                )
-            except Exception as e:
-                raise Exception(f"数据库连接池初始化失败: {str(e)}")
+        if self._backend is None:
+            # 多个线程同时首次使用时只创建一次后端（连接池）
+            with self._lock:
+                if self._backend is None:
+                    try:
+                        DatabaseConnection._backend = create_backend()
+                    except Exception as e:
+                        raise Exception(f"数据库连接池初始化失败: {str(e)}")
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def session(self) -> Session:
+        """开始一个工作单元（with 语句中使用）"""
+        return Session(self._backend)
+
+    def pool_stats(self) -> dict:
+        """连接池统计：连接数、占用数、取连接耗时与等待时间等"""
+        return self._backend.stats()
 
     def get_connection(self):
         """获取数据库连接"""
         try:
-            return self._pool.get_connection()
+            return self._backend.get_connection()
         except Exception as e:
             raise Exception(f"获取数据库连接失败: {str(e)}")
 
     def execute_query(self, query: str, params: tuple = None) -> list:
         """执行查询操作"""
-        conn = None
-        cursor = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
+            return self._backend.execute_query(query, params)
         except Exception as e:
             raise Exception(f"查询执行失败: {str(e)}")
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
 
     def execute_update(self, query: str, params: tuple = None) -> int:
         """执行更新操作"""
-        conn = None
-        cursor = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, params or ())
-            conn.commit()
-            return cursor.rowcount
+            return self._backend.execute_update(query, params)
         except Exception as e:
-            if conn:
-                conn.rollback()
             raise Exception(f"更新执行失败: {str(e)}")
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+
+    def execute_many(self, query: str, params_list: list) -> int:
+        """用同一条语句批量写入多行（一次提交）"""
+        try:
+            return self._backend.execute_many(query, params_list)
+        except Exception as e:
+            raise Exception(f"批量写入失败: {str(e)}")
 
     def execute_transaction(self, queries: list) -> bool:
         """执行事务"""
-        conn = None
-        cursor = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            for query, params in queries:
-                cursor.execute(query, params or ())
-            
-            conn.commit()
-            return True
+            return self._backend.execute_transaction(queries)
         except Exception as e:
-            if conn:
-                conn.rollback()
             raise Exception(f"事务执行失败: {str(e)}")
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close() 
\ No newline at end of file
@@ -0,0 +1,178 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from config.database import LOG_WRITER_CONFIG
+from .connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+# 队列中的停止标记
+_STOP = object()
+
+
+class LogWriter:
+    """日志异步写入器
+
+    任务日志、性能日志和操作日志不再逐条提交，而是放入有界队列，由后台线程按语句分组，
+    攒满 batch_size 条或距第一条超过 flush_interval 秒时用 executemany 一次写入。
+    队列满时写入方阻塞等待；flush 等待此前的日志全部写入，
+    close 写完剩余日志后停止线程（进程退出时自动调用）。
+    写入失败的一批日志重试一次，仍失败时丢弃并计入 stats() 的 failed，错误记入 logging
+    并保留到 take_errors() 取走；任何错误都不会让后台线程退出，flush 的等待总会结束。
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None):
+        self.batch_size = batch_size or LOG_WRITER_CONFIG['batch_size']
+        self.flush_interval = LOG_WRITER_CONFIG['flush_interval'] if flush_interval is None else flush_interval
+        self._queue = queue.Queue(max_queue or LOG_WRITER_CONFIG['max_queue'])
+        self._closed = False
+        self.written = 0
+        self.retried = 0
+        self.failed = 0
+        self._errors = []
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write(self, query, params):
+        self._queue.put((query, params))
+
+    def flush(self, timeout=None):
+        """等待已提交的日志全部写入数据库，超时返回 False"""
+        if self._closed:
+            return True
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        # 语句 -> 参数列表，同一张表的日志保持提交顺序
+        pending = {}
+        count = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, tuple):
+                query, params = item
+                pending.setdefault(query, []).append(params)
+                count += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if count < self.batch_size:
+                    continue
+            try:
+                self._write(pending)
+            except Exception as e:
+                self._error(f"日志写入线程异常: {str(e)}")
+            finally:
+                pending = {}
+                count = 0
+                deadline = None
+                if isinstance(item, threading.Event):
+                    item.set()
+            if item is _STOP:
+                return
+
+    def _write(self, pending):
+        for query, rows in pending.items():
+            for attempt in (1, 2):
+                try:
+                    # 连接池初始化失败等错误也在这里捕获，下一批重新获取连接
+                    DatabaseConnection().execute_many(query, rows)
+                    self.written += len(rows)
+                    break
+                except Exception as e:
+                    if attempt == 1:
+                        self.retried += len(rows)
+                        continue
+                    # 后台线程无法把错误交给调用方，重试仍失败时报告并丢弃这一批
+                    self.failed += len(rows)
+                    self._error(f"日志写入失败（{len(rows)} 条）: {str(e)}")
+
+    def _error(self, message):
+        logger.error(message)
+        self._errors.append(message)
+
+    def take_errors(self):
+        """取走上次调用以来的写入错误"""
+        errors, self._errors = self._errors, []
+        return errors
+
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'written': self.written, 'retried': self.retried,
+                'failed': self.failed, 'alive': self._thread.is_alive()}
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """当前进程的日志写入器，首次使用时启动（子进程中重新创建）"""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = LogWriter()
+            _writer_pid = os.getpid()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def write_log(query, params):
+    """写入一条日志：启用异步写入时放入队列并返回 1，否则同步执行并返回影响行数"""
+    if LOG_WRITER_CONFIG['enabled']:
+        writer = get_log_writer()
+        if not writer.closed:
+            writer.write(query, params)
+            return 1
+    return DatabaseConnection().execute_update(query, params)
+
+
+def log_writer_stats():
+    """当前进程日志写入器的统计，尚未启动时返回 None"""
+    if _writer is None or _writer_pid != os.getpid():
+        return None
+    return _writer.stats()
+
+
+def flush_logs(timeout=None):
+    """等待已提交的日志写入完成（未启用异步写入或尚未写过日志时立即返回）"""
+    if _writer is None or _writer_pid != os.getpid():
+        return True
+    return _writer.flush(timeout)
+
+
+def finish_worker_logs(timeout=None):
+    """进程池任务结束时调用：写完本进程缓冲的日志
+
+    工作进程退出时不执行 atexit，缓冲中的日志需在每个任务结束时写出；
+    超时或有日志写入失败时抛出异常，由主进程按该任务失败处理。
+    """
+    if _writer is None or _writer_pid != os.getpid():
+        return
+    timeout = LOG_WRITER_CONFIG['flush_timeout'] if timeout is None else timeout
+    if not _writer.flush(timeout):
+        raise Exception(f"日志写入超时（{timeout:g} 秒）")
+    errors = _writer.take_errors()
+    if errors:
+        raise Exception('；'.join(errors))
@@ -0,0 +1,175 @@
+"""数据库结构迁移
+
+schema_version 表记录已执行的迁移。程序启动时调用 ensure_schema()：结构已是最新版本时
+只有一次查询，不再逐条执行建表语句和索引探测；新数据库或程序升级后按版本顺序执行尚未执行的迁移。
+结构变更时在 MIGRATIONS 末尾追加一项（版本号递增），不要修改已发布的迁移。
+"""
+from config.database import DB_CONFIG, DB_BACKEND
+from .init_db import TABLES
+
+SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY COMMENT '结构版本',
+    description VARCHAR(255) COMMENT '迁移说明',
+    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '执行时间'
+) COMMENT '数据库结构版本表'
+"""
+
+# 迁移列表：backends 为需要执行语句的后端，其余后端只记录版本
+# （如 SQLite 中 ENUM 存为 TEXT，修改枚举值的 MySQL 语句无需执行）
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': '初始表结构',
+        'statements': TABLES,
+        'backends': ('mysql', 'sqlite')
+    },
+    {
+        'version': 2,
+        'description': 'doc_files 状态增加 cached（命中格式化缓存的文件）',
+        'statements': [
+            """
+            ALTER TABLE doc_files MODIFY COLUMN status
+                ENUM('pending', 'processing', 'success', 'failed', 'cached') DEFAULT 'pending' COMMENT '处理状态'
+            """
+        ],
+        'backends': ('mysql',)
+    },
+    {
+        'version': 3,
+        'description': 'performance_logs 增加跟踪跨度ID与父跨度ID',
+        'statements': [
+            "ALTER TABLE performance_logs ADD COLUMN span_id BIGINT COMMENT '跨度ID'",
+            "ALTER TABLE performance_logs ADD COLUMN parent_span_id BIGINT COMMENT '父跨度ID'"
+        ],
+        'backends': ('mysql', 'sqlite')
+    },
+    {
+        'version': 4,
+        'description': 'performance_logs 开始/结束时间精确到毫秒',
+        'statements': [
+            """
+            ALTER TABLE performance_logs
+                MODIFY COLUMN start_time DATETIME(3) NOT NULL COMMENT '开始时间',
+                MODIFY COLUMN end_time DATETIME(3) NOT NULL COMMENT '结束时间'
+            """
+        ],
+        'backends': ('mysql',)
+    },
+    {
+        'version': 5,
+        'description': 'doc_tasks 增加性能剖析结果目录',
+        'statements': [
+            "ALTER TABLE doc_tasks ADD COLUMN profile_path VARCHAR(500) COMMENT '性能剖析结果目录'"
+        ],
+        'backends': ('mysql', 'sqlite')
+    }
+]
+
+LATEST_VERSION = MIGRATIONS[-1]['version']
+
+# 多个进程同时启动时只有一个执行迁移
+_MYSQL_LOCK = 'xxwenling_schema_migration'
+
+
+def current_version():
+    """数据库当前的结构版本（一次查询），数据库或版本表不存在时返回 0"""
+    from .connection import DatabaseConnection
+    try:
+        rows = DatabaseConnection().execute_query("SELECT MAX(version) AS version FROM schema_version")
+    except Exception:
+        return 0
+    return (rows[0]['version'] or 0) if rows else 0
+
+
+def ensure_schema():
+    """启动时调用：结构已是最新时直接返回 0，否则执行迁移并返回执行的迁移数"""
+    if current_version() >= LATEST_VERSION:
+        return 0
+    return migrate()
+
+
+def migrate():
+    """建库（MySQL）并执行尚未执行的迁移，返回执行的迁移数"""
+    if DB_BACKEND == 'sqlite':
+        return _migrate_sqlite()
+    return _migrate_mysql()
+
+
+def _apply(execute, fetch_version, commit, backend, translate):
+    """按版本顺序执行迁移，每个迁移执行完即记录版本并提交"""
+    for sql in translate(SCHEMA_VERSION_TABLE):
+        execute(sql)
+    version = fetch_version() or 0
+    applied = 0
+    for migration in MIGRATIONS:
+        if migration['version'] <= version:
+            continue
+        if backend in migration['backends']:
+            for statement in migration['statements']:
+                for sql in translate(statement):
+                    execute(sql)
+        execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (migration['version'], migration['description']))
+        commit()
+        applied += 1
+    return applied
+
+
+def _migrate_mysql():
+    import mysql.connector
+    # 数据库可能尚不存在，连接时不指定数据库名
+    conn = mysql.connector.connect(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password']
+    )
+    cursor = conn.cursor()
+
+    def execute(sql, params=()):
+        cursor.execute(sql, params)
+
+    def fetch_version():
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        return cursor.fetchone()[0]
+
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        cursor.execute(f"USE {DB_CONFIG['database']}")
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (_MYSQL_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            raise Exception("等待其他进程执行数据库迁移超时")
+        try:
+            return _apply(execute, fetch_version, conn.commit, 'mysql', lambda statement: [statement])
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (_MYSQL_LOCK,))
+            cursor.fetchone()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _migrate_sqlite():
+    from .connection import DatabaseConnection
+    from .sqlite_backend import translate_ddl, translate_query
+    conn = DatabaseConnection().backend.get_connection()
+
+    def execute(sql, params=()):
+        conn.execute(translate_query(sql), params)
+
+    def fetch_version():
+        return conn.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()['version']
+
+    # 立即取得写锁，同时启动的其他进程等待本进程迁移完成后读到最新版本
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        applied = _apply(execute, fetch_version, lambda: None, 'sqlite', translate_ddl)
+        conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
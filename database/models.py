@@ -1,32 +1,38 @@
+import json
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from .connection import DatabaseConnection
+from .log_writer import write_log, flush_logs
+from config.database import LOG_WRITER_CONFIG
+from .cache import model_cache
 
 class BaseModel:
     def __init__(self):
         self.db = DatabaseConnection()
 
+    def _query_one(self, query: str, value: Any) -> Optional[Dict]:
+        result = self.db.execute_query(query, (value,))
+        return result[0] if result else None
+
 class User(BaseModel):
     def create(self, username: str, email: str, password_hash: str) -> int:
         query = """
         INSERT INTO users (username, email, password_hash)
         VALUES (%s, %s, %s)
         """
-        self.db.execute_update(query, (username, email, password_hash))
-        user = self.get_by_username(username)
-        user_id = user['id'] if user else None
+        with self.db.session() as session:
+            user_id = session.insert(query, (username, email, password_hash))
+        model_cache.invalidate('user')
         OperationLogger.log(user_id, 'create', 'users', user_id, f"username={username}")
         return user_id
 
     def get_by_id(self, user_id: int) -> Optional[Dict]:
-        query = "SELECT * FROM users WHERE id = %s"
-        result = self.db.execute_query(query, (user_id,))
-        return result[0] if result else None
+        return model_cache.get_or_load(('user', 'id', user_id),
+                                       lambda: self._query_one("SELECT * FROM users WHERE id = %s", user_id))
 
     def get_by_username(self, username: str) -> Optional[Dict]:
-        query = "SELECT * FROM users WHERE username = %s"
-        result = self.db.execute_query(query, (username,))
-        return result[0] if result else None
+        return model_cache.get_or_load(('user', 'name', username),
+                                       lambda: self._query_one("SELECT * FROM users WHERE username = %s", username))
 
 class DocTask(BaseModel):
     def create(self, user_id: int, task_type: str, task_name: str, 
@@ -35,30 +41,72 @@ class DocTask(BaseModel):
         INSERT INTO doc_tasks (user_id, task_type, task_name, input_path, output_path, template_id, start_time)
         VALUES (%s, %s, %s, %s, %s, %s, NOW())
         """
-        self.db.execute_update(query, (user_id, task_type, task_name, input_path, output_path, template_id))
-        # 获取新任务ID
-        query_id = "SELECT id FROM doc_tasks WHERE user_id=%s AND task_name=%s ORDER BY created_at DESC LIMIT 1"
-        result = self.db.execute_query(query_id, (user_id, task_name))
-        task_id = result[0]['id'] if result else None
+        with self.db.session() as session:
+            task_id = session.insert(query, (user_id, task_type, task_name, input_path, output_path, template_id))
         OperationLogger.log(user_id, 'create', 'doc_tasks', task_id, f"user_id={user_id}, task_type={task_type}, task_name={task_name}")
         return task_id
 
+    def get_by_id(self, task_id: int) -> Optional[Dict]:
+        query = "SELECT * FROM doc_tasks WHERE id = %s"
+        result = self.db.execute_query(query, (task_id,))
+        return result[0] if result else None
+
     def update_status(self, task_id: int, status: str, message: Optional[str] = None, user_id: Optional[int] = None) -> bool:
-        queries = [
-            ("UPDATE doc_tasks SET status = %s, end_time = CASE WHEN %s IN ('success', 'failed', 'cancelled') THEN NOW() ELSE end_time END WHERE id = %s",
-             (status, status, task_id)),
-            ("INSERT INTO task_logs (task_id, log_type, message) VALUES (%s, 'info', %s)",
-             (task_id, f"任务状态变更为 {status}" + (f": {message}" if message else "")))
-        ]
-        result = self.db.execute_transaction(queries)
+        if status in ('success', 'failed', 'cancelled'):
+            # 任务结束时先写完缓冲中的日志，任务状态与日志保持一致
+            flush_logs(LOG_WRITER_CONFIG['flush_timeout'])
+        with self.db.session() as session:
+            session.execute("UPDATE doc_tasks SET status = %s, end_time = CASE WHEN %s IN ('success', 'failed', 'cancelled') THEN NOW() ELSE end_time END WHERE id = %s",
+                            (status, status, task_id))
+            session.execute("INSERT INTO task_logs (task_id, log_type, message) VALUES (%s, 'info', %s)",
+                            (task_id, f"任务状态变更为 {status}" + (f": {message}" if message else "")))
         OperationLogger.log(user_id, 'update_status', 'doc_tasks', task_id, f"status={status}")
-        return result
+        return True
+
+    def set_profile_path(self, task_id: int, profile_path: str) -> bool:
+        query = "UPDATE doc_tasks SET profile_path = %s WHERE id = %s"
+        self.db.execute_update(query, (profile_path, task_id))
+        return True
 
     def get_task_files(self, task_id: int) -> List[Dict]:
-        query = "SELECT * FROM doc_files WHERE task_id = %s"
+        query = "SELECT * FROM doc_files WHERE task_id = %s ORDER BY id"
         result = self.db.execute_query(query, (task_id,))
         return result
 
+class DocFile(BaseModel):
+    def create(self, task_id: int, file_name: str, file_path: str, file_size: Optional[int] = None,
+               file_type: Optional[str] = None, status: str = 'pending', error_message: Optional[str] = None) -> int:
+        query = """
+        INSERT INTO doc_files (task_id, file_name, file_path, file_size, file_type, status, error_message)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        with self.db.session() as session:
+            return session.insert(query, (task_id, file_name, file_path, file_size, file_type, status, error_message))
+
+    def create_many(self, task_id: int, files: List[tuple]) -> int:
+        """一次登记多个文件（状态 pending），files 为 (file_name, file_path, file_size, file_type) 列表"""
+        query = """
+        INSERT INTO doc_files (task_id, file_name, file_path, file_size, file_type)
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        return self.db.execute_many(query, [(task_id,) + tuple(f) for f in files])
+
+    def reset_status(self, task_id: int) -> int:
+        """把任务的全部文件重置为 pending（重新执行整个任务时）"""
+        query = "UPDATE doc_files SET status = 'pending', error_message = NULL WHERE task_id = %s"
+        return self.db.execute_update(query, (task_id,))
+
+    def save_progress(self, task_id: int, updates: List[tuple], total_files: int,
+                      processed_files: int, error_count: int) -> bool:
+        """检查点：批量更新文件状态（updates 为 (status, error_message, id) 列表），
+        并在同一事务中更新任务的文件计数"""
+        with self.db.session() as session:
+            if updates:
+                session.execute_many("UPDATE doc_files SET status = %s, error_message = %s WHERE id = %s", updates)
+            session.execute("UPDATE doc_tasks SET total_files = %s, processed_files = %s, error_count = %s WHERE id = %s",
+                            (total_files, processed_files, error_count, task_id))
+        return True
+
 class FormatTemplate(BaseModel):
     def create(self, user_id: int, name: str, config: Any, 
                description: Optional[str] = None, is_public: bool = False) -> int:
@@ -66,44 +114,56 @@ class FormatTemplate(BaseModel):
         INSERT INTO format_templates (user_id, name, description, is_public, config)
         VALUES (%s, %s, %s, %s, %s)
         """
-        self.db.execute_update(query, (user_id, name, description, is_public, config))
-        # 获取新模板ID
-        query_id = "SELECT id FROM format_templates WHERE user_id=%s AND name=%s ORDER BY created_at DESC LIMIT 1"
-        result = self.db.execute_query(query_id, (user_id, name))
-        template_id = result[0]['id'] if result else None
+        with self.db.session() as session:
+            template_id = session.insert(query, (user_id, name, description, is_public, config))
+        # 公开模板出现在所有用户的列表中，模板写入后整个命名空间失效
+        model_cache.invalidate('template')
         OperationLogger.log(user_id, 'create', 'format_templates', template_id, f"name={name}")
         return template_id
 
     def get_by_id(self, template_id: int) -> Optional[Dict]:
-        query = "SELECT * FROM format_templates WHERE id = %s"
-        result = self.db.execute_query(query, (template_id,))
-        return result[0] if result else None
+        return model_cache.get_or_load(('template', 'id', template_id),
+                                       lambda: self._query_one("SELECT * FROM format_templates WHERE id = %s", template_id))
 
     def get_user_templates(self, user_id: int) -> List[Dict]:
         query = """
         SELECT * FROM format_templates 
         WHERE user_id = %s OR is_public = TRUE
         """
-        result = self.db.execute_query(query, (user_id,))
-        return result
+        result = model_cache.get_or_load(('template', 'user', user_id), lambda: self.db.execute_query(query, (user_id,)))
+        return list(result)
+
+    def find_by_name(self, user_id: int, name: str) -> Optional[Dict]:
+        """用户可用的模板中第一个名为 name 的模板"""
+        for t in self.get_user_templates(user_id):
+            if t['name'] == name:
+                return t
+        return None
+
+    def load_config(self, template: Dict) -> Dict:
+        """解析模板记录的配置，按模板ID和更新时间缓存，模板未变化时返回同一个对象（不要原地修改）"""
+        return model_cache.get_or_load(('template_config', template['id'], template['updated_at']),
+                                       lambda: json.loads(template['config']))
 
     def delete(self, template_id: int) -> bool:
         query = "DELETE FROM format_templates WHERE id = %s"
         result = self.db.execute_update(query, (template_id,))
+        model_cache.invalidate('template')
         # 日志可选，需传user_id
         return result
 
 class TaskLog(BaseModel):
     def add_log(self, task_id: int, log_type: str, message: str, user_id: Optional[int] = None) -> int:
         query = """
-        INSERT INTO task_logs (task_id, log_type, message)
-        VALUES (%s, %s, %s)
+        INSERT INTO task_logs (task_id, log_type, message, created_at)
+        VALUES (%s, %s, %s, %s)
         """
-        result = self.db.execute_update(query, (task_id, log_type, message))
-        OperationLogger.log(user_id, 'add_log', 'task_logs', result, message)
+        result = write_log(query, (task_id, log_type, message, datetime.now()))
+        OperationLogger.log(user_id, 'add_log', 'task_logs', None, message)
         return result
 
     def get_task_logs(self, task_id: int) -> List[Dict]:
+        flush_logs(LOG_WRITER_CONFIG['flush_timeout'])
         query = "SELECT * FROM task_logs WHERE task_id = %s ORDER BY created_at DESC"
         result = self.db.execute_query(query, (task_id,))
         return result
@@ -111,15 +171,29 @@ class TaskLog(BaseModel):
 class PerformanceLog(BaseModel):
     def add_log(self, task_id: int, operation: str, duration_ms: int, 
                 memory_usage_mb: Optional[float] = None, user_id: Optional[int] = None) -> int:
+        now = datetime.now()
         query = """
-        INSERT INTO performance_logs (task_id, operation, start_time, end_time, duration_ms, memory_usage_mb)
-        VALUES (%s, %s, NOW(), NOW(), %s, %s)
+        INSERT INTO performance_logs (task_id, operation, start_time, end_time, duration_ms, memory_usage_mb, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
-        result = self.db.execute_update(query, (task_id, operation, duration_ms, memory_usage_mb))
-        OperationLogger.log(user_id, 'add_log', 'performance_logs', result, f"operation={operation}, duration_ms={duration_ms}, memory_usage_mb={memory_usage_mb}")
+        result = write_log(query, (task_id, operation, now, now, duration_ms, memory_usage_mb, now))
+        OperationLogger.log(user_id, 'add_log', 'performance_logs', None, f"operation={operation}, duration_ms={duration_ms}, memory_usage_mb={memory_usage_mb}")
         return result
 
+    def add_span(self, task_id: int, operation: str, start_time: datetime, end_time: datetime, duration_ms: int,
+                 memory_usage_mb: Optional[float] = None, span_id: Optional[int] = None,
+                 parent_span_id: Optional[int] = None) -> int:
+        """记录一个跟踪跨度（见 tracing.py），跨度数量多，不写操作日志"""
+        query = """
+        INSERT INTO performance_logs (task_id, operation, start_time, end_time, duration_ms, memory_usage_mb,
+                                      span_id, parent_span_id, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        return write_log(query, (task_id, operation, start_time, end_time, duration_ms, memory_usage_mb,
+                                 span_id, parent_span_id, datetime.now()))
+
     def get_task_performance(self, task_id: int) -> List[Dict]:
+        flush_logs(LOG_WRITER_CONFIG['flush_timeout'])
         query = "SELECT * FROM performance_logs WHERE task_id = %s ORDER BY created_at DESC"
         result = self.db.execute_query(query, (task_id,))
         return result
@@ -127,11 +201,9 @@ class PerformanceLog(BaseModel):
 class OperationLogger:
     @staticmethod
     def log(user_id, action, table, record_id=None, detail=None):
-        from database.connection import DatabaseConnection
-        db = DatabaseConnection()
         query = """
             INSERT INTO system_logs (user_id, log_type, module, message, created_at)
             VALUES (%s, %s, %s, %s, %s)
         """
         msg = f"{action} {table} record_id={record_id or ''} {detail or ''}"
-        db.execute_update(query, (user_id, 'info', table, msg, datetime.now())) 
\ No newline at end of file
+        write_log(query, (user_id, 'info', table, msg, datetime.now())) 
\ No newline at end of file
@@ -0,0 +1,249 @@
+import time
+import threading
+from collections import deque
+from config.database import POOL_CONFIG
+
+# 交给等待者的“新建连接”许可（有连接被关闭、腾出名额时）
+_CREATE = object()
+
+
+class _Idle:
+    __slots__ = ('conn', 'since')
+
+    def __init__(self, conn, since):
+        self.conn = conn
+        self.since = since
+
+
+class _Waiter:
+    __slots__ = ('event', 'item')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.item = None
+
+
+class PooledConnection:
+    """池中连接的代理：close() 把连接归还到池中而不是断开，其余属性转发给实际连接"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self, broken=False):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, broken)
+
+
+class ConnectionPool:
+    """线程安全的数据库连接池
+
+    创建时预热 min_size 个连接；连接不够时按需新建，最多 max_size 个，全部占用时
+    最多等待 timeout 秒，归还的连接按先来后到直接交给等待者；超出 min_size 且空闲超过
+    idle_timeout 秒的连接被关闭。
+    空闲超过 ping_interval 秒的连接取出前先检查，失效的连接丢弃后重新取。
+    stats() 给出取连接耗时、等待时间、占用数等统计，便于并行批处理报告连接池状况。
+
+    factory 创建新连接，ping(conn) 返回连接是否可用，reset(conn) 在归还时清理会话状态。
+    """
+
+    def __init__(self, factory, ping=None, reset=None, min_size=None, max_size=None, timeout=None,
+                 idle_timeout=None, ping_interval=None):
+        self.factory = factory
+        self.ping = ping
+        self.reset = reset
+        self.max_size = max(1, max_size or POOL_CONFIG['max_size'])
+        self.min_size = min(POOL_CONFIG['min_size'] if min_size is None else min_size, self.max_size)
+        self.timeout = POOL_CONFIG['timeout'] if timeout is None else timeout
+        self.idle_timeout = POOL_CONFIG['idle_timeout'] if idle_timeout is None else idle_timeout
+        self.ping_interval = POOL_CONFIG['ping_interval'] if ping_interval is None else ping_interval
+        self._lock = threading.Lock()
+        # 空闲连接按归还顺序排列，取用最近归还的（后进先出），久未使用的留在队首等待回收
+        self._idle = []
+        self._waiters = deque()
+        self._size = 0
+        self._in_use = 0
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'failed_pings': 0,
+            'peak_in_use': 0,
+            'total_checkout_ms': 0.0,
+            'max_checkout_ms': 0.0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0
+        }
+        self._warm_up()
+
+    def _warm_up(self):
+        for _ in range(self.min_size):
+            conn = self._create()
+            with self._lock:
+                self._size += 1
+                self._idle.append(_Idle(conn, time.monotonic()))
+
+    def _create(self):
+        conn = self.factory()
+        with self._lock:
+            self._metrics['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._metrics['closed'] += 1
+            if self._waiters:
+                # 名额直接转给等待者，由它新建连接
+                self._hand_over(_CREATE)
+            else:
+                self._size -= 1
+
+    def _hand_over(self, item):
+        waiter = self._waiters.popleft()
+        waiter.item = item
+        waiter.event.set()
+
+    def acquire(self, timeout=None):
+        """取出一个可用连接，超时未取到时抛出异常"""
+        timeout = self.timeout if timeout is None else timeout
+        self._shrink()
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = 0.0
+        while True:
+            item = waiter = None
+            with self._lock:
+                if self._idle and not self._waiters:
+                    item = self._idle.pop()
+                elif self._size < self.max_size:
+                    # 先占一个名额，在锁外建立连接
+                    self._size += 1
+                    item = _CREATE
+                else:
+                    waiter = _Waiter()
+                    self._waiters.append(waiter)
+            if waiter:
+                wait_start = time.monotonic()
+                waiter.event.wait(max(0.0, deadline - wait_start))
+                waited += time.monotonic() - wait_start
+                with self._lock:
+                    if waiter.item is None:
+                        self._waiters.remove(waiter)
+                        self._metrics['timeouts'] += 1
+                        raise Exception(f"获取数据库连接超时（{timeout:g} 秒内 {self.max_size} 个连接均被占用）")
+                item = waiter.item
+            if item is _CREATE:
+                try:
+                    conn = self._create()
+                except Exception:
+                    with self._lock:
+                        if self._waiters:
+                            self._hand_over(_CREATE)
+                        else:
+                            self._size -= 1
+                    raise
+            else:
+                conn = item.conn
+                if self.ping and time.monotonic() - item.since >= self.ping_interval and not self._is_alive(conn):
+                    with self._lock:
+                        self._metrics['failed_pings'] += 1
+                    self._discard(conn)
+                    continue
+            self._checked_out(start, waited)
+            return conn
+
+    def connection(self, timeout=None):
+        """取出连接并包装为 PooledConnection，用完调用 close() 归还"""
+        return PooledConnection(self, self.acquire(timeout))
+
+    def _is_alive(self, conn):
+        try:
+            return self.ping(conn)
+        except Exception:
+            return False
+
+    def _checked_out(self, start, waited):
+        elapsed = (time.monotonic() - start) * 1000
+        waited *= 1000
+        with self._lock:
+            m = self._metrics
+            self._in_use += 1
+            m['checkouts'] += 1
+            m['peak_in_use'] = max(m['peak_in_use'], self._in_use)
+            m['total_checkout_ms'] += elapsed
+            m['max_checkout_ms'] = max(m['max_checkout_ms'], elapsed)
+            if waited:
+                m['waits'] += 1
+                m['total_wait_ms'] += waited
+                m['max_wait_ms'] = max(m['max_wait_ms'], waited)
+
+    def release(self, conn, broken=False):
+        """归还连接；broken 为 True 或清理失败时直接关闭"""
+        if not broken and self.reset:
+            try:
+                self.reset(conn)
+            except Exception:
+                broken = True
+        with self._lock:
+            self._in_use -= 1
+            if not broken:
+                item = _Idle(conn, time.monotonic())
+                if self._waiters:
+                    self._hand_over(item)
+                else:
+                    self._idle.append(item)
+        if broken:
+            self._discard(conn)
+        self._shrink()
+
+    def _shrink(self):
+        """关闭超出 min_size 且空闲过久的连接"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while (self._idle and self._size - len(expired) > self.min_size
+                   and now - self._idle[0].since >= self.idle_timeout):
+                expired.append(self._idle.pop(0).conn)
+        for conn in expired:
+            self._discard(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._discard(item.conn)
+
+    def stats(self):
+        with self._lock:
+            m = dict(self._metrics)
+            size, idle, in_use, waiting = self._size, len(self._idle), self._in_use, len(self._waiters)
+        checkouts = m['checkouts'] or 1
+        return {
+            'size': size,
+            'idle': idle,
+            'in_use': in_use,
+            'waiting': waiting,
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'checkouts': m['checkouts'],
+            'waits': m['waits'],
+            'timeouts': m['timeouts'],
+            'created': m['created'],
+            'closed': m['closed'],
+            'failed_pings': m['failed_pings'],
+            'peak_in_use': m['peak_in_use'],
+            'avg_checkout_ms': round(m['total_checkout_ms'] / checkouts, 3),
+            'max_checkout_ms': round(m['max_checkout_ms'], 3),
+            'avg_wait_ms': round(m['total_wait_ms'] / (m['waits'] or 1), 3),
+            'max_wait_ms': round(m['max_wait_ms'], 3)
+        }
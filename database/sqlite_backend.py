@@ -0,0 +1,220 @@
+import os
+import re
+import sqlite3
+import threading
+import weakref
+from datetime import datetime
+from functools import lru_cache
+from config.database import SQLITE_CONFIG
+
+# MySQL 的 NOW() 与 CURRENT_TIMESTAMP 为本地时间，SQLite 中对应 datetime('now', 'localtime')
+SQLITE_NOW = "datetime('now', 'localtime')"
+
+_COMMENT = re.compile(r"\s+COMMENT\s+'(?:[^']|'')*'", re.IGNORECASE)
+_AUTO_INCREMENT = re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE)
+_ENUM = re.compile(r"\bENUM\s*\([^)]*\)", re.IGNORECASE)
+_ON_UPDATE = re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.IGNORECASE)
+_DEFAULT_NOW = re.compile(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", re.IGNORECASE)
+_CREATE_TABLE = re.compile(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+_INLINE_INDEX = re.compile(r",\s*INDEX\s+(\w+)\s*\(([^)]*)\)", re.IGNORECASE)
+# 字符串、带引号的标识符整体匹配，其中的 %s 和 NOW() 原样保留
+_QUERY_TOKEN = re.compile(r"""'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`|%s|\bNOW\(\)""", re.IGNORECASE)
+
+
+def _adapt_datetime(value):
+    return value.isoformat(' ')
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+# 与 mysql-connector 一致，DATETIME 列读出为 datetime 对象
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+
+
+def translate_ddl(statement):
+    """把迁移中的 MySQL 结构语句转换为 SQLite 语句列表
+
+    自增主键改为 INTEGER PRIMARY KEY AUTOINCREMENT，ENUM 存为 TEXT，去掉列和表的注释；
+    建表语句中的索引拆为单独的 CREATE INDEX，ON UPDATE CURRENT_TIMESTAMP 改由触发器实现。
+    """
+    sql = _COMMENT.sub('', statement)
+    sql = _AUTO_INCREMENT.sub('INTEGER PRIMARY KEY AUTOINCREMENT', sql)
+    sql = _ENUM.sub('TEXT', sql)
+    sql = _DEFAULT_NOW.sub(f"DEFAULT ({SQLITE_NOW})", sql)
+    match = _CREATE_TABLE.search(sql)
+    if not match:
+        return [_ON_UPDATE.sub('', sql)]
+    table = match.group(1)
+    has_on_update = bool(_ON_UPDATE.search(sql))
+    sql = _ON_UPDATE.sub('', sql)
+    indexes = _INLINE_INDEX.findall(sql)
+    statements = [_INLINE_INDEX.sub('', sql)]
+    for index_name, columns in indexes:
+        statements.append(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({columns})")
+    if has_on_update:
+        statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_updated_at AFTER UPDATE ON {table}
+        FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE {table} SET updated_at = {SQLITE_NOW} WHERE id = NEW.id;
+        END
+        """)
+    return statements
+
+
+def _translate_token(match):
+    token = match.group(0)
+    if token == '%s':
+        return '?'
+    if token[0] in '\'"`':
+        return token
+    return SQLITE_NOW
+
+
+@lru_cache(maxsize=256)
+def translate_query(query):
+    """把模型层的 MySQL 语句转换为 SQLite 语句：引号之外的 %s 占位符改为 ?，NOW() 改为本地时间"""
+    return _QUERY_TOKEN.sub(_translate_token, query)
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SQLiteSession:
+    """SQLite 工作单元：使用当前线程的连接，sqlite3 按连接缓存预处理语句
+
+    开始时即开启事务；同一线程中嵌套的工作单元使用保存点，提交和回滚只作用于自己的写入，
+    最终由最外层的工作单元一起提交。
+    """
+
+    def __init__(self, backend, conn, savepoint=None):
+        self.backend = backend
+        self.conn = conn
+        self.savepoint = savepoint
+
+    def execute(self, query, params=None):
+        cursor = self.conn.execute(translate_query(query), params or ())
+        return cursor.lastrowid, cursor.rowcount
+
+    def execute_many(self, query, params_list):
+        return self.conn.executemany(translate_query(query), params_list).rowcount
+
+    def query(self, query, params=None):
+        return self.conn.execute(translate_query(query), params or ()).fetchall()
+
+    def commit(self):
+        if self.savepoint:
+            self.conn.execute(f"RELEASE {self.savepoint}")
+        else:
+            self.conn.commit()
+
+    def rollback(self):
+        if self.savepoint:
+            self.conn.execute(f"ROLLBACK TO {self.savepoint}")
+            self.conn.execute(f"RELEASE {self.savepoint}")
+        else:
+            self.conn.rollback()
+
+    def close(self):
+        self.backend._local.sessions -= 1
+
+
+class _ThreadToken:
+    """保存在线程本地存储中，线程结束时随之释放，触发关闭该线程的连接"""
+
+
+def _close_connection(lock, connections, conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+    with lock:
+        connections.discard(conn)
+
+
+class SQLiteBackend:
+    """嵌入式 SQLite 后端
+
+    每个线程使用自己的连接，线程结束时关闭；数据库使用 WAL 模式，读不阻塞写，写入只在本机文件上提交，
+    没有网络往返。模型层的 MySQL 语句在执行前转换。
+    线程中有未结束的工作单元时，execute_update 等写入加入该工作单元的事务，不单独提交。
+    """
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path or SQLITE_CONFIG['path']
+        self.timeout = SQLITE_CONFIG['timeout'] if timeout is None else timeout
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = set()
+        conn = self.get_connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+
+    def get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 线程结束时的清理可能在其他线程中执行，连接本身只由创建它的线程使用
+            conn = sqlite3.connect(self.path, timeout=self.timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                   check_same_thread=False)
+            conn.row_factory = _dict_row
+            conn.execute("PRAGMA foreign_keys=ON")
+            # WAL 模式下 NORMAL 仍保证数据库一致，只是断电时可能丢失最后几次提交
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.sessions = 0
+            self._local.token = _ThreadToken()
+            weakref.finalize(self._local.token, _close_connection, self._lock, self._connections, conn)
+            with self._lock:
+                self._connections.add(conn)
+        return conn
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'sqlite', 'path': self.path, 'connections': len(self._connections)}
+
+    def session(self):
+        conn = self.get_connection()
+        depth = self._local.sessions
+        savepoint = None
+        if depth:
+            savepoint = f"session_{depth}"
+            conn.execute(f"SAVEPOINT {savepoint}")
+        elif not conn.in_transaction:
+            # 开始时即取得写锁（等待 timeout 秒），避免先读后写时因其他连接已写入而无法升级为写事务
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.sessions = depth + 1
+        return SQLiteSession(self, conn, savepoint)
+
+    def _write(self, run):
+        """执行写入：在工作单元中时加入其事务，否则单独提交"""
+        conn = self.get_connection()
+        if self._local.sessions:
+            return run(conn)
+        with conn:
+            return run(conn)
+
+    def execute_query(self, query, params=None):
+        conn = self.get_connection()
+        cursor = conn.execute(translate_query(query), params or ())
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def execute_update(self, query, params=None):
+        return self._write(lambda conn: conn.execute(translate_query(query), params or ()).rowcount)
+
+    def execute_many(self, query, params_list):
+        return self._write(lambda conn: conn.executemany(translate_query(query), params_list).rowcount)
+
+    def execute_transaction(self, queries):
+        def run(conn):
+            for query, params in queries:
+                conn.execute(translate_query(query), params or ())
+        self._write(run)
+        return True
@@ -0,0 +1,178 @@
+import os
+import copy
+import struct
+import tempfile
+import time
+import zipfile
+from config.settings import ZIP_CONFIG
+from tracing import span
+
+_COPY_CHUNK = 1024 * 1024
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+_MASK_USE_DATA_DESCRIPTOR = 0x08
+
+# copy_raw 直接读写 ZipFile 的内部状态（CPython 3.8 及以后的 zipfile 实现），
+# 缺少其中任何一项时（其他 Python 实现或以后的版本改动）退回为解压后重新写入
+_RAW_COPY_ATTRS = ('_lock', 'fp', '_writecheck', '_didModify', 'start_dir', 'filelist', 'NameToInfo')
+_RAW_COPY_MODULE_ATTRS = ('sizeFileHeader', 'structFileHeader')
+
+# 原子写出时临时文件的命名，便于识别异常退出后遗留的文件
+TEMP_PREFIX = '.~'
+TEMP_SUFFIX = '.docx.tmp'
+
+
+def compression_args(compress_level=None):
+    """将压缩级别转换为 (压缩方式, compresslevel)，0 表示仅存储"""
+    if compress_level is None:
+        compress_level = ZIP_CONFIG['compress_level']
+    if compress_level <= 0:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, min(int(compress_level), 9)
+
+
+def _supports_raw_copy(zf):
+    return (all(hasattr(zipfile, name) for name in _RAW_COPY_MODULE_ATTRS)
+            and all(hasattr(zf, name) for name in _RAW_COPY_ATTRS))
+
+
+class PackageWriter:
+    """docx 包写入器
+
+    未改动的部件通过 copy_raw 原样复制源 ZIP 中的压缩字节和 CRC，不解压也不重新压缩；
+    只有改动过的部件按配置的压缩级别重新编码。
+    """
+
+    def __init__(self, output_path, compress_level=None):
+        self.output_path = output_path
+        self.compression, self.compresslevel = compression_args(compress_level)
+        self._zip = zipfile.ZipFile(output_path, 'w', self.compression, compresslevel=self.compresslevel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def copy_raw(self, source, info, arcname=None):
+        """从已打开的源 ZipFile 原样复制一个成员，可重命名
+
+        zipfile 没有公开的原样复制接口，这里使用其内部状态；不可用时解压后按原压缩方式重新写入。
+        """
+        if isinstance(info, str):
+            info = source.getinfo(info)
+        if not (_supports_raw_copy(source) and _supports_raw_copy(self._zip)):
+            self._copy_decoded(source, info, arcname)
+            return
+        zinfo = copy.copy(info)
+        zinfo.filename = arcname or info.filename
+        # 大小和 CRC 已知，写在本地文件头中，不再需要数据描述符
+        zinfo.flag_bits &= ~_MASK_USE_DATA_DESCRIPTOR
+        zinfo.extra = b''
+        dst = self._zip
+        with source._lock:
+            source.fp.seek(info.header_offset)
+            header = source.fp.read(zipfile.sizeFileHeader)
+            fheader = struct.unpack(zipfile.structFileHeader, header)
+            source.fp.seek(info.header_offset + zipfile.sizeFileHeader
+                           + fheader[_FH_FILENAME_LENGTH] + fheader[_FH_EXTRA_FIELD_LENGTH])
+            with dst._lock:
+                dst._writecheck(zinfo)
+                dst._didModify = True
+                dst.fp.seek(dst.start_dir)
+                zinfo.header_offset = dst.fp.tell()
+                dst.fp.write(zinfo.FileHeader())
+                remaining = info.compress_size
+                while remaining > 0:
+                    chunk = source.fp.read(min(_COPY_CHUNK, remaining))
+                    if not chunk:
+                        raise Exception(f"源文件数据不完整: {info.filename}")
+                    dst.fp.write(chunk)
+                    remaining -= len(chunk)
+                dst.start_dir = dst.fp.tell()
+                dst.filelist.append(zinfo)
+                dst.NameToInfo[zinfo.filename] = zinfo
+
+    def _copy_decoded(self, source, info, arcname=None):
+        zinfo = zipfile.ZipInfo(arcname or info.filename, info.date_time)
+        zinfo.compress_type = info.compress_type
+        zinfo.external_attr = info.external_attr
+        self._zip.writestr(zinfo, source.read(info))
+
+    def copy_unchanged(self, source, skip=()):
+        """原样复制源包中除 skip 以外的所有成员"""
+        for info in source.infolist():
+            if info.filename not in skip:
+                self.copy_raw(source, info)
+
+    def writestr(self, name, data):
+        """按配置的压缩级别写入一个改动过的部件"""
+        self._zip.writestr(name, data)
+
+    def open(self, name):
+        """以流的方式写入一个部件"""
+        return self._zip.open(name, 'w', force_zip64=True)
+
+    def close(self):
+        self._zip.close()
+
+
+def atomic_output(output_path):
+    """在输出目录中创建临时文件路径，写完后由 commit_output 原子替换为目标文件"""
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=TEMP_SUFFIX, dir=directory)
+    os.close(fd)
+    return temp_path
+
+
+def commit_output(temp_path, output_path):
+    os.replace(temp_path, output_path)
+
+
+def save_document(doc, source_path, output_path, parts=None, compress_level=None):
+    """保存 python-docx 文档，代替 doc.save()
+
+    主文档部件（以及 parts 中额外给出的部件）重新序列化写入，其余部件从 source_path
+    原样复制。先写入同目录下的临时文件再原子替换，output_path 可与 source_path 相同。
+    """
+    with span('serialize'):
+        changed = {doc.part.partname.lstrip('/'): doc.part.blob}
+        for part in parts or ():
+            changed[part.partname.lstrip('/')] = part.blob
+    temp_path = atomic_output(output_path)
+    try:
+        with span('write'), zipfile.ZipFile(source_path) as src, PackageWriter(temp_path, compress_level) as out:
+            for info in src.infolist():
+                if info.filename in changed:
+                    out.writestr(info.filename, changed.pop(info.filename))
+                else:
+                    out.copy_raw(src, info)
+            for name, blob in changed.items():
+                out.writestr(name, blob)
+        commit_output(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def remove_stale_outputs(directory, max_age=3600):
+    """删除目录中超过 max_age 秒未修改的临时输出文件（进程异常退出后遗留）"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    removed = 0
+    now = time.time()
+    for name in names:
+        if not (name.startswith(TEMP_PREFIX) and name.endswith(TEMP_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,430 @@
+import os
+import re
+import copy
+import hashlib
+import posixpath
+import zipfile
+from collections import namedtuple
+from functools import lru_cache
+from lxml import etree
+from docx_package import PackageWriter, atomic_output, commit_output
+
+# OOXML 命名空间与关系类型
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+RT_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+RT_IMAGE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+RT_OLE_OBJECT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/oleObject'
+RT_PACKAGE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/package'
+
+# 需要按内容去重的部件类型及其在输出包中的存放目录
+MEDIA_REL_TYPES = {
+    RT_IMAGE: 'media',
+    RT_OLE_OBJECT: 'embeddings',
+    RT_PACKAGE: 'embeddings'
+}
+
+W_BODY = f'{{{W_NS}}}body'
+W_SECT_PR = f'{{{W_NS}}}sectPr'
+
+_SPLIT_MARK = 'xxwenling-body'
+_R_PREFIX = f'{{{R_NS}}}'
+_XMLNS_DECL = re.compile(rb' xmlns(?::[^=\s]+)?="[^"]*"')
+_LEADING_XMLNS = re.compile(rb'<[^\s/>]+((?: xmlns(?::[^=\s]+)?="[^"]*")+)')
+
+# 源文档中一条需要迁移到输出包的关系：媒体/嵌入对象部件（member 为包内路径）或外部链接
+MediaRef = namedtuple('MediaRef', 'rel_id rel_type target external member content_type digest')
+
+
+def find_main_part(zf):
+    """根据包关系定位主文档部件（通常为 word/document.xml）"""
+    try:
+        rels = etree.fromstring(zf.read('_rels/.rels'))
+        for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            if rel.get('Type') == RT_OFFICE_DOCUMENT:
+                return rel.get('Target').lstrip('/')
+    except KeyError:
+        pass
+    return 'word/document.xml'
+
+
+def rels_part_name(part_name):
+    """返回部件对应的关系部件名，如 word/_rels/document.xml.rels"""
+    folder, name = posixpath.split(part_name)
+    return posixpath.join(folder, '_rels', f'{name}.rels')
+
+
+def resolve_target(source_part, target):
+    """将关系中的相对 Target 解析为包内部件路径"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def read_content_types(zf):
+    """读取 [Content_Types].xml，返回 (扩展名默认类型, 部件覆盖类型)"""
+    defaults = {}
+    overrides = {}
+    root = etree.fromstring(zf.read('[Content_Types].xml'))
+    for el in root:
+        if el.tag == f'{{{CT_NS}}}Default':
+            defaults[el.get('Extension').lower()] = el.get('ContentType')
+        elif el.tag == f'{{{CT_NS}}}Override':
+            overrides[el.get('PartName').lstrip('/')] = el.get('ContentType')
+    return defaults, overrides
+
+
+def _member_sha256(zf, member, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with zf.open(member) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def collect_media(zf, part_name=None):
+    """读取主文档的关系，计算图片、嵌入对象部件的内容哈希
+
+    返回 {原 rId: MediaRef}，包含媒体/嵌入对象以及外部链接；
+    其余内部关系（页眉、脚注等）不在其中，保持原样。
+    """
+    part_name = part_name or find_main_part(zf)
+    try:
+        rels = etree.fromstring(zf.read(rels_part_name(part_name)))
+    except KeyError:
+        return {}
+    defaults, overrides = read_content_types(zf)
+    refs = {}
+    for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+        rel_id, rel_type, target = rel.get('Id'), rel.get('Type'), rel.get('Target')
+        if rel.get('TargetMode') == 'External':
+            digest = hashlib.sha256(f"{rel_type}\n{target}".encode('utf-8')).hexdigest()
+            refs[rel_id] = MediaRef(rel_id, rel_type, target, True, None, None, digest)
+        elif rel_type in MEDIA_REL_TYPES:
+            member = resolve_target(part_name, target)
+            ext = posixpath.splitext(member)[1].lstrip('.').lower()
+            content_type = overrides.get(member) or defaults.get(ext)
+            digest = _member_sha256(zf, member)
+            refs[rel_id] = MediaRef(rel_id, rel_type, target, False, member, content_type, digest)
+    return refs
+
+
+def content_rel_id(ref):
+    """由内容哈希导出的关系 ID，相同内容在所有源文档中得到相同 ID"""
+    return f"rIdX{ref.digest[:24]}"
+
+
+def relationship_id_map(refs):
+    return {rel_id: content_rel_id(ref) for rel_id, ref in refs.items()}
+
+
+def remap_relationship_ids(elem, mapping):
+    """将元素子树中 r:id、r:embed 等关系引用改写为 mapping 中的新 ID"""
+    for el in elem.iter(etree.Element):
+        for key, value in el.attrib.items():
+            if key.startswith(_R_PREFIX) and value in mapping:
+                el.set(key, mapping[value])
+
+
+def iter_body_elements(zf, part_name=None):
+    """增量解析主文档，逐个产出 w:body 的直接子元素
+
+    每个元素产出后即被清理，内存占用只与单个顶层元素（段落或表格）有关。
+    """
+    part_name = part_name or find_main_part(zf)
+    with zf.open(part_name) as f:
+        depth = 0
+        body = None
+        for event, elem in etree.iterparse(f, events=('start', 'end'), huge_tree=True):
+            if event == 'start':
+                depth += 1
+                if depth == 2 and elem.tag == W_BODY:
+                    body = elem
+                continue
+            depth -= 1
+            if depth == 2 and body is not None and elem.getparent() is body:
+                yield elem
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del body[0]
+
+
+def read_document_shell(zf, part_name=None):
+    """读取主文档的根元素和最后的 sectPr，返回 (头部字节, 尾部字节, 根元素命名空间声明)
+
+    头部包含 XML 声明、带全部命名空间声明的 w:document 开始标签和 w:body 开始标签；
+    尾部包含文档的节属性及闭合标签。
+    """
+    part_name = part_name or find_main_part(zf)
+    root_tag = None
+    root_attrib = None
+    root_nsmap = None
+    sect_pr = None
+    with zf.open(part_name) as f:
+        depth = 0
+        for event, elem in etree.iterparse(f, events=('start', 'end'), huge_tree=True):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    root_tag, root_attrib, root_nsmap = elem.tag, dict(elem.attrib), dict(elem.nsmap)
+                continue
+            depth -= 1
+            if depth == 2:
+                if elem.tag == W_SECT_PR:
+                    sect_pr = elem
+                    continue
+                elem.clear()
+                parent = elem.getparent()
+                while elem.getprevious() is not None:
+                    del parent[0]
+    shell = etree.Element(root_tag, attrib=root_attrib, nsmap=root_nsmap)
+    body = etree.SubElement(shell, W_BODY)
+    body.append(etree.Comment(_SPLIT_MARK))
+    xml = etree.tostring(shell, xml_declaration=True, encoding='UTF-8', standalone=True)
+    head, tail = xml.split(f'<!--{_SPLIT_MARK}-->'.encode())
+    declared = namespace_declarations(root_nsmap)
+    if sect_pr is not None:
+        tail = strip_declared_namespaces(etree.tostring(sect_pr), declared) + tail
+    return head, tail, declared
+
+
+def namespace_declarations(nsmap):
+    """将 nsmap 转换为序列化后的命名空间声明字节串集合（frozenset，可作缓存键）"""
+    declared = set()
+    for prefix, uri in nsmap.items():
+        if prefix:
+            declared.add(f' xmlns:{prefix}="{uri}"'.encode())
+        else:
+            declared.add(f' xmlns="{uri}"'.encode())
+    return frozenset(declared)
+
+
+def strip_declared_namespaces(data, declared):
+    """去掉片段开始标签上已由输出根元素声明过的命名空间，避免每个片段重复声明
+
+    lxml 序列化子元素时会带上全部祖先命名空间声明，同一文档中这段声明几乎总是相同，
+    因此按声明段缓存去除结果。declared 需为 namespace_declarations 返回的 frozenset。
+    """
+    m = _LEADING_XMLNS.match(data)
+    if not m:
+        return data
+    return data[:m.start(1)] + _strip_block(m.group(1), declared) + data[m.end(1):]
+
+
+@lru_cache(maxsize=256)
+def _strip_block(block, declared):
+    return _XMLNS_DECL.sub(lambda m: b'' if m.group() in declared else m.group(), block)
+
+
+def rewrite_main_part(zf, out, transform, part_name=None):
+    """单次增量解析主文档，对 w:body 的每个直接子元素调用 transform 后立即写入 out
+
+    out 为可写的文件对象（如 PackageWriter.open 返回的 ZIP 成员流）。元素写出后即被清理，
+    内存占用只与单个顶层元素有关。正文之前的根元素子元素（如 w:background）随头部写出。
+    """
+    part_name = part_name or find_main_part(zf)
+    declared = None
+    tail = None
+    with zf.open(part_name) as f:
+        depth = 0
+        body = None
+        body_done = False
+        for event, elem in etree.iterparse(f, events=('start', 'end'), huge_tree=True):
+            if event == 'start':
+                depth += 1
+                if depth == 2 and elem.tag == W_BODY and body is None:
+                    body = elem
+                    head, tail, declared = _document_head(elem)
+                    out.write(head)
+                continue
+            depth -= 1
+            if depth == 2 and body is not None and elem.getparent() is body:
+                transform(elem)
+                out.write(strip_declared_namespaces(etree.tostring(elem, encoding='UTF-8'), declared))
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del body[0]
+            elif depth == 1 and elem is body:
+                body_done = True
+            elif depth == 1 and body_done:
+                # 正文之后的根元素子元素极少出现，写在正文闭合标签之后
+                body_close, rest = tail
+                tail = (body_close + strip_declared_namespaces(etree.tostring(elem, encoding='UTF-8'), declared), rest)
+    if tail is None:
+        raise Exception("主文档中没有正文！")
+    out.write(b''.join(tail))
+
+
+def _document_head(body):
+    """根据已解析到 w:body 开始标签的树构建头部字节和 (正文闭合标签, 根闭合标签)"""
+    root = body.getparent()
+    shell = etree.Element(root.tag, attrib=dict(root.attrib), nsmap=dict(root.nsmap))
+    for child in root:
+        if child is body:
+            break
+        shell.append(copy.deepcopy(child))
+    shell_body = etree.SubElement(shell, body.tag, attrib=dict(body.attrib))
+    shell_body.append(etree.Comment(_SPLIT_MARK))
+    xml = etree.tostring(shell, xml_declaration=True, encoding='UTF-8', standalone=True)
+    head, tail = xml.split(f'<!--{_SPLIT_MARK}-->'.encode())
+    end = tail.index(b'>') + 1
+    return head, (tail[:end], tail[end:]), namespace_declarations(root.nsmap)
+
+
+def rewrite_document(source_path, output_path, transform, compress_level=None):
+    """流式改写 docx 的主文档正文，其余部件按原顺序原样复制
+
+    先写入临时文件再原子替换，output_path 可与 source_path 相同。
+    """
+    temp_path = atomic_output(output_path)
+    try:
+        with zipfile.ZipFile(source_path) as src, PackageWriter(temp_path, compress_level) as out:
+            main_part = find_main_part(src)
+            for info in src.infolist():
+                if info.filename == main_part:
+                    with out.open(main_part) as stream:
+                        rewrite_main_part(src, stream, transform, main_part)
+                else:
+                    out.copy_raw(src, info)
+        commit_output(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def page_break_xml():
+    """分页符段落，与 python-docx 的 add_page_break 一致"""
+    p = etree.Element(f'{{{W_NS}}}p', nsmap={'w': W_NS})
+    r = etree.SubElement(p, f'{{{W_NS}}}r')
+    br = etree.SubElement(r, f'{{{W_NS}}}br')
+    br.set(f'{{{W_NS}}}type', 'page')
+    return etree.tostring(p)
+
+
+class StreamingDocxWriter:
+    """以基准文档为模板，流式写出主文档正文的 docx 写入器
+
+    除主文档外的部件原样复制自基准文档；正文片段通过 write_fragment 逐个写入 ZIP，
+    不在内存中累积整个文档树。各源文档引用的图片、嵌入对象按内容哈希只保存一份，
+    主文档关系与内容类型在关闭时统一写出。未改动的部件以原始压缩字节直接复制。
+    先写入同目录下的临时文件，正常退出 with 块时才原子替换为输出文件。
+    """
+
+    def __init__(self, output_path, base_path, compress_level=None):
+        self.output_path = output_path
+        self.base_path = base_path
+        self._base = zipfile.ZipFile(base_path)
+        self.main_part = find_main_part(self._base)
+        self.rels_part = rels_part_name(self.main_part)
+        self._head, self._tail, self._declared = read_document_shell(self._base, self.main_part)
+        self._temp_path = atomic_output(output_path)
+        self._zip = PackageWriter(self._temp_path, compress_level)
+        self._stream = None
+        self._rels = None
+        self._content_types = None
+        self._rel_ids = set()
+        self._parts = {}
+        self._pending_parts = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.close()
+            if exc_type is None:
+                commit_output(self._temp_path, self.output_path)
+        finally:
+            if os.path.exists(self._temp_path):
+                os.remove(self._temp_path)
+        return False
+
+    def open(self):
+        self._zip.copy_unchanged(self._base, skip={self.main_part, self.rels_part, '[Content_Types].xml'})
+        self._content_types = etree.fromstring(self._base.read('[Content_Types].xml'))
+        try:
+            self._rels = etree.fromstring(self._base.read(self.rels_part))
+        except KeyError:
+            self._rels = etree.Element(f'{{{PKG_REL_NS}}}Relationships', nsmap={None: PKG_REL_NS})
+        self._rel_ids = {rel.get('Id') for rel in self._rels}
+        # 基准文档自身的媒体部件已复制，登记后其他文档中的相同内容直接复用
+        for ref in collect_media(self._base, self.main_part).values():
+            if not ref.external:
+                self._parts.setdefault(ref.digest, ref.member)
+        self._stream = self._zip.open(self.main_part)
+        self._stream.write(self._head)
+
+    @property
+    def declared_namespaces(self):
+        return self._declared
+
+    def add_media(self, source_path, refs):
+        """登记源文档的媒体关系：按内容哈希去重，新内容在关闭时从源文档复制"""
+        folder = posixpath.dirname(self.main_part)
+        for ref in refs:
+            rel_id = content_rel_id(ref)
+            if rel_id in self._rel_ids:
+                continue
+            rel = etree.SubElement(self._rels, f'{{{PKG_REL_NS}}}Relationship')
+            rel.set('Id', rel_id)
+            rel.set('Type', ref.rel_type)
+            if ref.external:
+                rel.set('Target', ref.target)
+                rel.set('TargetMode', 'External')
+            else:
+                member = self._parts.get(ref.digest)
+                if member is None:
+                    ext = posixpath.splitext(ref.member)[1].lower()
+                    member = posixpath.join(folder, MEDIA_REL_TYPES[ref.rel_type], f"xxw_{ref.digest[:24]}{ext}")
+                    self._parts[ref.digest] = member
+                    self._pending_parts.append((source_path, ref, member))
+                rel.set('Target', posixpath.relpath(member, folder))
+            self._rel_ids.add(rel_id)
+
+    def write_raw(self, data):
+        """写入已去除冗余命名空间声明的正文字节"""
+        self._stream.write(data)
+
+    def write_fragment(self, data):
+        self._stream.write(strip_declared_namespaces(data, self._declared))
+
+    def write_element(self, elem):
+        self.write_fragment(etree.tostring(elem))
+
+    def write_page_break(self):
+        self.write_fragment(page_break_xml())
+
+    def _copy_pending_parts(self):
+        defaults = {el.get('Extension').lower(): el.get('ContentType')
+                    for el in self._content_types if el.tag == f'{{{CT_NS}}}Default'}
+        for source_path, ref, member in self._pending_parts:
+            with zipfile.ZipFile(source_path) as src:
+                self._zip.copy_raw(src, ref.member, arcname=member)
+            if not ref.content_type:
+                continue
+            ext = posixpath.splitext(member)[1].lstrip('.').lower()
+            if ext not in defaults:
+                el = etree.SubElement(self._content_types, f'{{{CT_NS}}}Default')
+                el.set('Extension', ext)
+                el.set('ContentType', ref.content_type)
+                defaults[ext] = ref.content_type
+            elif defaults[ext] != ref.content_type:
+                el = etree.SubElement(self._content_types, f'{{{CT_NS}}}Override')
+                el.set('PartName', f"/{member}")
+                el.set('ContentType', ref.content_type)
+        self._pending_parts = []
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.write(self._tail)
+            self._stream.close()
+            self._stream = None
+            self._copy_pending_parts()
+            self._zip.writestr(self.rels_part, etree.tostring(self._rels, xml_declaration=True, encoding='UTF-8', standalone=True))
+            self._zip.writestr('[Content_Types].xml', etree.tostring(self._content_types, xml_declaration=True, encoding='UTF-8', standalone=True))
+        self._zip.close()
+        self._base.close()
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from converter import file_sha256
+from config.settings import FORMAT_CACHE_CONFIG
+
+# 格式化输出规则或索引格式变化时递增，使旧缓存全部失效
+CACHE_VERSION = 2
+
+
+def template_hash(template, options=None):
+    """模板配置的规范哈希：键排序后紧凑序列化，与字典顺序和空白无关
+
+    options 为影响输出的格式化器参数（引擎、压缩级别）。
+    """
+    payload = {'version': CACHE_VERSION, 'template': template, 'options': options or {}}
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _link_or_copy(src, dst):
+    """先写到同目录临时路径再原子替换，目标不会出现半成品
+
+    FORMAT_CACHE_LINK=1 时同一文件系统上优先创建硬链接，不复制数据；输出文件与缓存对象
+    共用同一份数据，原地修改输出文件会改动缓存对象，由 FormatCache 命中前的校验发现。
+    """
+    dst_dir = os.path.dirname(os.path.abspath(dst))
+    os.makedirs(dst_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=dst_dir)
+    os.close(fd)
+    try:
+        linked = False
+        if FORMAT_CACHE_CONFIG['link']:
+            os.remove(temp_path)
+            try:
+                os.link(src, temp_path)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            shutil.copyfile(src, temp_path)
+        os.replace(temp_path, dst)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class FormatCache:
+    """格式化结果缓存
+
+    以 (输入内容哈希, 模板哈希) 为键，在 cache_dir/objects 中保存输出文件副本。
+    index.json 记录输入文件 (大小, 修改时间) 对应的内容哈希、写出过的输出文件状态
+    以及各缓存对象的大小、最近使用时间、修改时间和内容哈希：未变化的输入无需重新读取计算哈希，
+    未变化的输出直接跳过；缓存对象的大小或修改时间与记录不符时先核对内容哈希，被改动的对象删除后按未命中处理。
+    索引的变化按批追加到 index.log，日志条目多于索引本身时才整体重写 index.json。
+    保存新对象后按 max_mb 和 max_age_days 淘汰最久未使用的对象。
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or FORMAT_CACHE_CONFIG['cache_dir']
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self.journal_path = os.path.join(self.cache_dir, 'index.log')
+        self._lock = threading.Lock()
+        self._inputs = {}
+        self._outputs = {}
+        self._objects = {}
+        self._journal = []
+        self._journal_lines = 0
+        self._stored = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self._inputs = data.get('inputs', {})
+                self._outputs = data.get('outputs', {})
+                self._objects = data.get('objects', {})
+        except (OSError, ValueError):
+            # 索引不存在或已损坏时从空索引开始，缓存对象仍可按内容哈希命中
+            pass
+        try:
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        version, kind, name, value = json.loads(line)
+                    except ValueError:
+                        # 中断时写了一半的最后一行
+                        break
+                    if version == CACHE_VERSION:
+                        self._apply(kind, name, value)
+                    self._journal_lines += 1
+        except OSError:
+            pass
+
+    def _apply(self, kind, name, value):
+        table = {'i': self._inputs, 'o': self._outputs, 'u': self._objects}[kind]
+        if value is None:
+            table.pop(name, None)
+        else:
+            table[name] = value
+
+    def _change(self, kind, name, value):
+        """修改索引并记入待写出的日志（调用方持有锁）"""
+        self._apply(kind, name, value)
+        self._journal.append((kind, name, value))
+
+    def save(self):
+        """淘汰超出容量或过期的对象，并把索引的变化写回磁盘"""
+        if self._stored:
+            self._stored = False
+            self.prune()
+        with self._lock:
+            if not self._journal:
+                return
+            entries, self._journal = self._journal, []
+            compact = self._journal_lines + len(entries) > max(FORMAT_CACHE_CONFIG['index_batch'],
+                                                                 len(self._inputs) + len(self._outputs))
+            if compact:
+                self._drop_stale()
+                data = {'version': CACHE_VERSION, 'inputs': dict(self._inputs), 'outputs': dict(self._outputs),
+                        'objects': dict(self._objects)}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if not compact:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps([CACHE_VERSION, kind, name, value], ensure_ascii=False) + '\n'
+                                for kind, name, value in entries))
+            self._journal_lines += len(entries)
+            return
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.index_path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_lines = 0
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _drop_stale(self):
+        """整体重写索引前去掉已删除的输入和已淘汰对象的输出记录"""
+        self._inputs = {path: entry for path, entry in self._inputs.items() if os.path.exists(path)}
+        if self._objects:
+            self._outputs = {path: record for path, record in self._outputs.items() if record[0] in self._objects}
+
+    def prune(self):
+        """按最近使用时间从旧到新删除过期对象，直到总大小不超过 max_mb；返回删除的对象数"""
+        max_bytes = FORMAT_CACHE_CONFIG['max_mb'] * 1024 * 1024
+        max_age = FORMAT_CACHE_CONFIG['max_age_days'] * 86400
+        if not max_bytes and not max_age:
+            return 0
+        now = time.time()
+        objects = []
+        try:
+            folders = list(os.scandir(os.path.join(self.cache_dir, 'objects')))
+        except OSError:
+            return 0
+        for folder in folders:
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if not entry.name.endswith('.docx'):
+                    continue
+                key = entry.name[:-5]
+                size = entry.stat().st_size
+                # 索引中没有记录的对象（如索引丢失）按修改时间计
+                used = self._objects[key][1] if key in self._objects else entry.stat().st_mtime
+                objects.append((used, key, size, entry.path))
+        objects.sort()
+        total = sum(size for _, _, size, _ in objects)
+        removed = 0
+        for used, key, size, path in objects:
+            if not (max_age and now - used > max_age) and not (max_bytes and total > max_bytes):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            with self._lock:
+                self._change('u', key, None)
+        return removed
+
+    def object_path(self, key):
+        return os.path.join(self.cache_dir, 'objects', key[:2], f"{key}.docx")
+
+    def input_digest(self, path):
+        """输入文件内容哈希，大小和修改时间未变时使用索引中的记录"""
+        path = os.path.abspath(path)
+        stat = _stat_key(path)
+        entry = self._inputs.get(path)
+        if entry and entry[:2] == stat:
+            return entry[2]
+        digest = file_sha256(path)
+        with self._lock:
+            self._change('i', path, stat + [digest])
+        return digest
+
+    def key(self, doc_path, tpl_hash):
+        """缓存键：输入内容哈希与模板哈希的组合"""
+        return hashlib.sha256(f"{self.input_digest(doc_path)}:{tpl_hash}".encode('ascii')).hexdigest()
+
+    def lookup(self, key, output_path):
+        """命中时保证 output_path 为缓存的输出并返回 True
+
+        输出文件仍是上次写出的结果时直接跳过，否则从缓存链接或复制。
+        """
+        obj = self.object_path(key)
+        if not self._verify(key, obj):
+            return False
+        self._touch(key)
+        output_path = os.path.abspath(output_path)
+        record = self._outputs.get(output_path)
+        if record and record[0] == key and os.path.exists(output_path) and record[1:] == _stat_key(output_path):
+            return True
+        _link_or_copy(obj, output_path)
+        self._record_output(key, output_path)
+        return True
+
+    def store(self, key, output_path):
+        """保存新生成的输出，记录缓存对象的状态和内容哈希"""
+        obj = self.object_path(key)
+        if key in self._objects and os.path.exists(obj):
+            self._touch(key)
+        else:
+            _link_or_copy(output_path, obj)
+            self._stored = True
+            size, mtime_ns = _stat_key(obj)
+            digest = file_sha256(obj)
+            with self._lock:
+                self._change('u', key, [size, int(time.time()), mtime_ns, digest])
+        self._record_output(key, os.path.abspath(output_path))
+
+    def _verify(self, key, obj):
+        """缓存对象存在且内容与保存时一致；被改动或没有记录的对象删除"""
+        entry = self._objects.get(key)
+        try:
+            stat = _stat_key(obj)
+        except OSError:
+            return False
+        if entry and [entry[0], entry[2]] == stat:
+            return True
+        if entry and file_sha256(obj) == entry[3]:
+            # 只有修改时间变化（如被 touch），内容未变
+            with self._lock:
+                self._change('u', key, [stat[0], entry[1], stat[1], entry[3]])
+            return True
+        try:
+            os.remove(obj)
+        except OSError:
+            pass
+        with self._lock:
+            self._change('u', key, None)
+        return False
+
+    def _touch(self, key):
+        with self._lock:
+            entry = list(self._objects[key])
+            entry[1] = int(time.time())
+            self._change('u', key, entry)
+
+    def _record_output(self, key, output_path):
+        with self._lock:
+            self._change('o', output_path, [key] + _stat_key(output_path))
@@ -0,0 +1,327 @@
+import re
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.oxml.simpletypes import ST_HpsMeasure, ST_TwipsMeasure, ST_SignedTwipsMeasure
+from docx.shared import Pt, Cm
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_UNDERLINE, WD_LINE_SPACING
+
+ALIGNMENT_MAP = {
+    '左对齐': WD_ALIGN_PARAGRAPH.LEFT,
+    'center': WD_ALIGN_PARAGRAPH.CENTER,
+    '居中': WD_ALIGN_PARAGRAPH.CENTER,
+    '右对齐': WD_ALIGN_PARAGRAPH.RIGHT,
+    '两端对齐': WD_ALIGN_PARAGRAPH.JUSTIFY,
+    'justify': WD_ALIGN_PARAGRAPH.JUSTIFY
+}
+
+# w:pPr / w:rPr 子元素的规范顺序（与 python-docx 一致），新元素插入到第一个后继元素之前
+PPR_SEQUENCE = (
+    'w:pStyle', 'w:keepNext', 'w:keepLines', 'w:pageBreakBefore',
+    'w:framePr', 'w:widowControl', 'w:numPr', 'w:suppressLineNumbers',
+    'w:pBdr', 'w:shd', 'w:tabs', 'w:suppressAutoHyphens', 'w:kinsoku',
+    'w:wordWrap', 'w:overflowPunct', 'w:topLinePunct', 'w:autoSpaceDE',
+    'w:autoSpaceDN', 'w:bidi', 'w:adjustRightInd', 'w:snapToGrid',
+    'w:spacing', 'w:ind', 'w:contextualSpacing', 'w:mirrorIndents',
+    'w:suppressOverlap', 'w:jc', 'w:textDirection', 'w:textAlignment',
+    'w:textboxTightWrap', 'w:outlineLvl', 'w:divId', 'w:cnfStyle',
+    'w:rPr', 'w:sectPr', 'w:pPrChange'
+)
+RPR_SEQUENCE = (
+    'w:rStyle', 'w:rFonts', 'w:b', 'w:bCs', 'w:i', 'w:iCs', 'w:caps',
+    'w:smallCaps', 'w:strike', 'w:dstrike', 'w:outline', 'w:shadow',
+    'w:emboss', 'w:imprint', 'w:noProof', 'w:snapToGrid', 'w:vanish',
+    'w:webHidden', 'w:color', 'w:spacing', 'w:w', 'w:kern', 'w:position',
+    'w:sz', 'w:szCs', 'w:highlight', 'w:u', 'w:effect', 'w:bdr', 'w:shd',
+    'w:fitText', 'w:vertAlign', 'w:rtl', 'w:cs', 'w:em', 'w:lang',
+    'w:eastAsianLayout', 'w:specVanish', 'w:oMath'
+)
+
+
+def _successors(sequence, tag):
+    """后继元素标签 -> 优先级（越靠前越优先）"""
+    return {qn(t): rank for rank, t in enumerate(sequence[sequence.index(tag) + 1:])}
+
+
+W_P = qn('w:p')
+W_R = qn('w:r')
+W_T = qn('w:t')
+W_TAB = qn('w:tab')
+W_BR = qn('w:br')
+W_CR = qn('w:cr')
+W_IND = qn('w:ind')
+W_SPACING = qn('w:spacing')
+W_JC = qn('w:jc')
+W_RFONTS = qn('w:rFonts')
+W_SZ = qn('w:sz')
+W_B = qn('w:b')
+W_I = qn('w:i')
+W_U = qn('w:u')
+W_VAL = qn('w:val')
+W_STYLE = qn('w:style')
+W_STYLE_ID = qn('w:styleId')
+W_TYPE = qn('w:type')
+
+# 清除格式时移除的段落属性和 run 属性
+_CLEARED_IND_ATTRS = (qn('w:firstLine'), qn('w:hanging'), qn('w:left'), qn('w:right'))
+_CLEARED_SPACING_ATTRS = (qn('w:before'), qn('w:after'), qn('w:line'), qn('w:lineRule'))
+_CLEARED_RUN_TAGS = (W_RFONTS, W_SZ, W_B, W_I, W_U)
+
+# 样式模式生成的段落样式 ID 前缀，重复格式化时替换同名样式而不是累加
+STYLE_ID_PREFIX = 'XXWenLing'
+
+_SUCCESSORS = {
+    qn('w:pStyle'): _successors(PPR_SEQUENCE, 'w:pStyle'),
+    W_SPACING: _successors(PPR_SEQUENCE, 'w:spacing'),
+    W_IND: _successors(PPR_SEQUENCE, 'w:ind'),
+    W_JC: _successors(PPR_SEQUENCE, 'w:jc'),
+    W_RFONTS: _successors(RPR_SEQUENCE, 'w:rFonts'),
+    W_B: _successors(RPR_SEQUENCE, 'w:b'),
+    W_I: _successors(RPR_SEQUENCE, 'w:i'),
+    W_SZ: _successors(RPR_SEQUENCE, 'w:sz'),
+    W_U: _successors(RPR_SEQUENCE, 'w:u')
+}
+
+
+def _insert_in_sequence(parent, elem):
+    """按规范顺序插入子元素：放在优先级最高的已有后继元素之前，没有则追加
+
+    只遍历一次子元素，结果与按后继顺序逐个 find 相同。
+    """
+    successors = _SUCCESSORS[elem.tag]
+    successor = None
+    best = len(successors)
+    for child in parent:
+        rank = successors.get(child.tag, best)
+        if rank < best:
+            successor, best = child, rank
+    if successor is None:
+        parent.append(elem)
+    else:
+        successor.addprevious(elem)
+    return elem
+
+
+def _get_or_insert(parent, nsptag):
+    elem = parent.find(qn(nsptag))
+    if elem is None:
+        elem = _insert_in_sequence(parent, OxmlElement(nsptag))
+    return elem
+
+
+def _get_or_add_first(parent, nsptag):
+    """获取 pPr/rPr，不存在时作为第一个子元素插入"""
+    elem = parent.find(qn(nsptag))
+    if elem is None:
+        elem = OxmlElement(nsptag)
+        parent.insert(0, elem)
+    return elem
+
+
+def paragraph_text(p):
+    """与 python-docx Paragraph.text 相同：只拼接段落直接子 w:r 的文本"""
+    parts = []
+    for r in p.iterchildren(W_R):
+        for child in r:
+            tag = child.tag
+            if tag == W_T:
+                parts.append(child.text or '')
+            elif tag == W_TAB:
+                parts.append('\t')
+            elif tag == W_BR or tag == W_CR:
+                parts.append('\n')
+    return ''.join(parts)
+
+
+def iter_body_paragraphs(body):
+    """与 python-docx Document.paragraphs 相同：正文的直接子段落"""
+    return body.iterchildren(W_P)
+
+
+class ParagraphFormatPlan:
+    """一类段落（标题、正文……）的目标格式，模板编译时构建一次
+
+    apply 对段落只遍历一次其 run，效果与 DocumentFormatter.clear_format + apply_format 完全相同。
+    """
+
+    def __init__(self, format_rules):
+        self.jc = None
+        self.first_line = None
+        self.hanging = None
+        self.line = None
+        self.run_elements = []
+        if 'alignment' in format_rules:
+            value = ALIGNMENT_MAP.get(format_rules['alignment'], WD_ALIGN_PARAGRAPH.LEFT)
+            self.jc = WD_ALIGN_PARAGRAPH.to_xml(value)
+        if 'indent' in format_rules:
+            indent = Cm(format_rules['indent'])
+            if indent < 0:
+                self.hanging = ST_TwipsMeasure.convert_to_xml(-indent)
+            else:
+                self.first_line = ST_TwipsMeasure.convert_to_xml(indent)
+        if 'line_spacing' in format_rules:
+            self.line = ST_SignedTwipsMeasure.convert_to_xml(Pt(format_rules['line_spacing']))
+        # run 属性片段：每个 run 复制一份插入
+        font = format_rules.get('font')
+        if font is not None:
+            rfonts = OxmlElement('w:rFonts')
+            rfonts.set(qn('w:ascii'), font)
+            rfonts.set(qn('w:hAnsi'), font)
+            rfonts.set(qn('w:eastAsia'), font)
+            self.run_elements.append(rfonts)
+        if 'size' in format_rules:
+            sz = OxmlElement('w:sz')
+            sz.set(W_VAL, ST_HpsMeasure.convert_to_xml(Pt(format_rules['size'])))
+            self.run_elements.append(sz)
+        for key, tag in (('bold', 'w:b'), ('italic', 'w:i')):
+            value = format_rules.get(key)
+            if value is None:
+                continue
+            elem = OxmlElement(tag)
+            if not value:
+                elem.set(W_VAL, '0')
+            self.run_elements.append(elem)
+        underline = format_rules.get('underline')
+        if underline is not None:
+            if underline is True:
+                underline = WD_UNDERLINE.SINGLE
+            elif underline is False:
+                underline = WD_UNDERLINE.NONE
+            u = OxmlElement('w:u')
+            u.set(W_VAL, WD_UNDERLINE.to_xml(underline))
+            self.run_elements.append(u)
+
+    def apply(self, p):
+        pPr = _get_or_add_first(p, 'w:pPr')
+        _clear_paragraph_properties(pPr)
+        self.apply_paragraph_properties(pPr)
+        for r in p.iterchildren(W_R):
+            rPr = _get_or_add_first(r, 'w:rPr')
+            for child in list(rPr):
+                if child.tag in _CLEARED_RUN_TAGS:
+                    rPr.remove(child)
+            self.apply_run_properties(rPr)
+
+    def apply_paragraph_properties(self, pPr):
+        if self.jc is not None:
+            _get_or_insert(pPr, 'w:jc').set(W_VAL, self.jc)
+        if self.first_line is not None:
+            _get_or_insert(pPr, 'w:ind').set(qn('w:firstLine'), self.first_line)
+        elif self.hanging is not None:
+            _get_or_insert(pPr, 'w:ind').set(qn('w:hanging'), self.hanging)
+        if self.line is not None:
+            spacing = _get_or_insert(pPr, 'w:spacing')
+            spacing.set(qn('w:line'), self.line)
+            spacing.set(qn('w:lineRule'), WD_LINE_SPACING.to_xml(WD_LINE_SPACING.EXACTLY))
+
+    def apply_run_properties(self, rPr):
+        for elem in self.run_elements:
+            _insert_in_sequence(rPr, elem.__deepcopy__(None))
+
+
+def _clear_paragraph_properties(pPr):
+    """与 clear_format 相同：清除缩进、间距和对齐"""
+    ind = pPr.find(W_IND)
+    if ind is not None:
+        for attr in _CLEARED_IND_ATTRS:
+            ind.attrib.pop(attr, None)
+    spacing = pPr.find(W_SPACING)
+    if spacing is not None:
+        for attr in _CLEARED_SPACING_ATTRS:
+            spacing.attrib.pop(attr, None)
+    for jc in pPr.findall(W_JC):
+        pPr.remove(jc)
+
+
+class LxmlFormatEngine:
+    """直接操作 w:p/w:r 元素的格式化引擎，不创建 Paragraph/Run 代理对象"""
+
+    def __init__(self, template):
+        self.template = template
+        self.plans = {name: ParagraphFormatPlan(rules) for name, rules in template.get('formats', {}).items()}
+
+    def apply(self, p, para_type):
+        plan = self.plans.get(para_type)
+        if plan is not None:
+            plan.apply(p)
+
+
+def style_id_for(name, index):
+    """模板段落类型对应的样式 ID；非 ASCII 类型名按序号命名"""
+    if re.fullmatch(r'[A-Za-z0-9_]+', name):
+        return STYLE_ID_PREFIX + name
+    return f'{STYLE_ID_PREFIX}{index}'
+
+
+class StyleFormatEngine(LxmlFormatEngine):
+    """样式模式：每类段落在 styles.xml 中生成一个段落样式，段落只引用样式
+
+    段落上与样式冲突的直接格式（对齐、缩进、行距以及 run 的字体、字号、粗斜体、下划线）被移除，
+    不再向每个 run 写入格式，写入量只与段落数有关。
+    """
+
+    def __init__(self, template):
+        super().__init__(template)
+        self.style_ids = {name: style_id_for(name, i) for i, name in enumerate(self.plans)}
+
+    def install(self, styles):
+        """把各类段落的样式写入 styles 元素，替换已有的同 ID 样式"""
+        base = default_paragraph_style_id(styles)
+        for name, plan in self.plans.items():
+            style_id = self.style_ids[name]
+            for old in styles.iterchildren(W_STYLE):
+                if old.get(W_STYLE_ID) == style_id:
+                    styles.remove(old)
+            styles.append(self._build_style(name, style_id, plan, base))
+
+    def _build_style(self, name, style_id, plan, base):
+        style = OxmlElement('w:style')
+        style.set(W_TYPE, 'paragraph')
+        style.set(qn('w:customStyle'), '1')
+        style.set(W_STYLE_ID, style_id)
+        for tag, value in (('w:name', f'{STYLE_ID_PREFIX} {name}'), ('w:basedOn', base)):
+            if value is None:
+                continue
+            child = OxmlElement(tag)
+            child.set(W_VAL, value)
+            style.append(child)
+        style.append(OxmlElement('w:qFormat'))
+        pPr = OxmlElement('w:pPr')
+        plan.apply_paragraph_properties(pPr)
+        rPr = OxmlElement('w:rPr')
+        plan.apply_run_properties(rPr)
+        for props in (pPr, rPr):
+            if len(props):
+                style.append(props)
+        return style
+
+    def apply(self, p, para_type):
+        style_id = self.style_ids.get(para_type)
+        if style_id is None:
+            return
+        pPr = _get_or_add_first(p, 'w:pPr')
+        _get_or_insert(pPr, 'w:pStyle').set(W_VAL, style_id)
+        _clear_paragraph_properties(pPr)
+        for tag in (W_IND, W_SPACING):
+            elem = pPr.find(tag)
+            if elem is not None and not elem.attrib and not len(elem):
+                pPr.remove(elem)
+        for r in p.iterchildren(W_R):
+            rPr = r.find(qn('w:rPr'))
+            if rPr is None:
+                continue
+            for child in list(rPr):
+                if child.tag in _CLEARED_RUN_TAGS:
+                    rPr.remove(child)
+            if not len(rPr):
+                r.remove(rPr)
+
+    def apply_direct(self, p, para_type):
+        """文档没有样式部件时退回直接格式"""
+        super().apply(p, para_type)
+
+
+def default_paragraph_style_id(styles):
+    for style in styles.iterchildren(W_STYLE):
+        if style.get(W_TYPE) == 'paragraph' and style.get(qn('w:default')) in ('1', 'true', 'on'):
+            return style.get(W_STYLE_ID)
+    return None
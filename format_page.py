@@ -493,6 +493,8 @@ class FormatPage(QWidget):
             self.log.append(f"处理完成！\n")
             self.log.append(f"总文件数：{result['total']}\n")
             self.log.append(f"成功处理：{result['success']}\n")
+            if result.get('cached'):
+                self.log.append(f"其中未变化跳过：{result['cached']}\n")
             if result['failed']:
                 self.log.append("处理失败的文件：\n")
                 for file, error in result['failed']:
@@ -0,0 +1,166 @@
+import io
+import os
+import time
+import queue
+import threading
+import contextvars
+from docx import Document
+from docx_package import save_document, remove_stale_outputs
+from config.settings import PIPELINE_CONFIG
+from tracing import span
+
+# 各阶段之间传递的结束标记
+_DONE = object()
+
+
+class FormatPipeline:
+    """批量格式化流水线：预取读取 → 格式化 → 异步写出
+
+    三个阶段各占一个线程，阶段之间是有界队列：读取线程最多预取 read_ahead 个文件，
+    写出线程前最多排队 write_queue 个已格式化的文档，下游变慢时上游阻塞，内存占用有上限。
+    写出经临时文件原子替换，异常中断不会留下不完整的输出文件。
+    结果记录按输入顺序产出，回调由调用方在自己的线程中处理。
+    """
+
+    def __init__(self, formatter, read_ahead=None, write_queue=None):
+        self.formatter = formatter
+        self.read_ahead = read_ahead or PIPELINE_CONFIG['read_ahead']
+        self.write_queue = write_queue or PIPELINE_CONFIG['write_queue']
+        self._stop = threading.Event()
+
+    def run(self, jobs):
+        """jobs 为 (输入路径, 输出路径) 列表，按输入顺序逐个产出结果记录"""
+        for directory in {os.path.dirname(os.path.abspath(output)) for _, output in jobs}:
+            remove_stale_outputs(directory)
+        read_q = queue.Queue(self.read_ahead)
+        write_q = queue.Queue(self.write_queue)
+        result_q = self._results = queue.Queue()
+        self._stop.clear()
+        threads = [
+            self._thread('format-reader', self._read_all, jobs, read_q),
+            self._thread('format-worker', self._format_all, read_q, write_q),
+            self._thread('format-writer', self._write_all, write_q, result_q)
+        ]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = result_q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 调用方提前结束或出错时通知各阶段退出，未写出的文档直接丢弃
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+    def _thread(self, name, work, source, target):
+        # 各阶段线程继承调用方的上下文（当前跟踪的任务），每个线程使用自己的副本
+        context = contextvars.copy_context()
+        return threading.Thread(target=context.run, args=(self._stage, work, source, target), name=name, daemon=True)
+
+    def _stage(self, work, source, target):
+        try:
+            work(source, target)
+        except Exception as e:
+            # 单个文件的错误记录在结果中，这里只有意外错误，交给调用方抛出
+            self._stop.set()
+            self._results.put(e)
+        finally:
+            self._put(target, _DONE)
+
+    def _put(self, q, item):
+        while not self._stop.is_set() or item is _DONE:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self._stop.is_set():
+                    return False
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _read_all(self, jobs, read_q):
+        for doc_path, output_path in jobs:
+            if self._stop.is_set():
+                return
+            record = new_record(doc_path, output_path)
+            start = time.perf_counter()
+            data = None
+            try:
+                with span('read', file=record['file']), open(doc_path, 'rb') as f:
+                    data = f.read()
+            except Exception as e:
+                fail(record, e)
+            record['timings']['read_ms'] = int((time.perf_counter() - start) * 1000)
+            if not self._put(read_q, (record, data, start)):
+                return
+
+    def _format_all(self, read_q, write_q):
+        while True:
+            item = self._get(read_q)
+            if item is _DONE:
+                return
+            record, data, start = item
+            doc = parts = None
+            if record['success']:
+                timings = record['timings']
+                try:
+                    t0 = time.perf_counter()
+                    with span('parse', file=record['file']):
+                        doc = Document(io.BytesIO(data))
+                    t1 = time.perf_counter()
+                    with span('transform', file=record['file']):
+                        parts = self.formatter.transform_document(doc)
+                    timings['load_ms'] = timings['read_ms'] + int((t1 - t0) * 1000)
+                    timings['format_ms'] = int((time.perf_counter() - t1) * 1000)
+                except Exception as e:
+                    fail(record, e)
+                    doc = data = None
+            if not self._put(write_q, (record, doc, data, parts, start)):
+                return
+
+    def _write_all(self, write_q, result_q):
+        while True:
+            item = self._get(write_q)
+            if item is _DONE:
+                return
+            record, doc, data, parts, start = item
+            if record['success']:
+                try:
+                    t0 = time.perf_counter()
+                    with span('save', file=record['file']):
+                        save_document(doc, io.BytesIO(data), record['output'], parts=parts,
+                                      compress_level=self.formatter.compress_level)
+                    record['timings']['save_ms'] = int((time.perf_counter() - t0) * 1000)
+                except Exception as e:
+                    fail(record, e)
+            record['timings']['total_ms'] = int((time.perf_counter() - start) * 1000)
+            result_q.put(record)
+
+
+def new_record(doc_path, output_path):
+    return {
+        'file': os.path.basename(doc_path),
+        'path': doc_path,
+        'output': output_path,
+        'success': True,
+        'cached': False,
+        'error': None,
+        'timings': {}
+    }
+
+
+def fail(record, error):
+    record['success'] = False
+    record['error'] = f"处理文档时出错: {str(error)}"
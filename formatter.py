@@ -2,28 +2,94 @@ import os
 from docx import Document
 from docx.shared import Pt, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-import json
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import chain, islice
 from docx.oxml.ns import qn
-from database.models import DocTask, TaskLog, PerformanceLog, FormatTemplate
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from database.models import DocTask, TaskLog, FormatTemplate
+from database.cache import model_cache
+from database.log_writer import finish_worker_logs
 from datetime import datetime
+from docx_package import save_document
+from classifier import CompiledTemplate
+from format_cache import FormatCache, template_hash
+from format_pipeline import FormatPipeline
+from config.settings import FORMAT_CACHE_CONFIG, ZIP_CONFIG
+from format_engine import LxmlFormatEngine, StyleFormatEngine, ALIGNMENT_MAP, W_P, iter_body_paragraphs, paragraph_text
+from docx_stream import rewrite_document
+from checkpoint import TaskCheckpoint, DONE_STATUSES
+from tracing import trace_task, span, worker_trace_parent, collect_spans, add_worker_spans
+from profiler import profile_task, profile_file, profile_snapshot, profile_top
+
+# 可选的格式化引擎：docx 通过 python-docx 代理对象逐项设置；lxml 直接操作 XML 元素，输出相同；
+# style 把每类段落的格式写成 styles.xml 中的段落样式，段落只引用样式；
+# stream 增量解析主文档、逐段改写并直接写入输出包，内存占用与文档长度无关，适合超大文档
+ENGINES = ('docx', 'lxml', 'style', 'stream')
+
+# 流式引擎更新状态的段落间隔
+STREAM_STATUS_INTERVAL = 1000
 
 class DocumentFormatter:
-    def __init__(self, user_id=None):
+    def __init__(self, user_id=None, compress_level=None, engine='docx'):
+        if engine not in ENGINES:
+            raise Exception(f"未知的格式化引擎: {engine}")
         self.user_id = user_id
         self.current_template = None
+        # 保存时改写部件的压缩级别（0 仅存储），None 使用 ZIP_CONFIG
+        self.compress_level = compress_level
+        self.engine = engine
+        self._compiled = None
+        self._format_engine = None
+        # set_current_template 选中的模板（ID, 更新时间, 配置），用于记录任务的 template_id 和复用编译结果
+        self._template_row = None
+
+    @property
+    def compiled_template(self):
+        """当前模板编译后的分类器，模板变化时重新编译；数据库模板按ID和版本缓存编译结果"""
+        if self._compiled is None or self._compiled.template is not self.current_template:
+            if self._template_row and self._template_row[2] is self.current_template:
+                template_id, version, template = self._template_row
+                self._compiled = model_cache.get_or_load(('template_config', 'compiled', template_id, version),
+                                                         lambda: CompiledTemplate(template))
+            else:
+                self._compiled = CompiledTemplate(self.current_template)
+        return self._compiled
+
+    @property
+    def format_engine(self):
+        """当前模板对应的 lxml/样式格式化引擎，各类段落的目标格式只构建一次"""
+        if self._format_engine is None or self._format_engine.template is not self.current_template:
+            engine_class = StyleFormatEngine if self.engine == 'style' else LxmlFormatEngine
+            self._format_engine = engine_class(self.current_template)
+        return self._format_engine
         
     def set_current_template(self, name):
         ft = FormatTemplate()
-        templates = ft.get_user_templates(self.user_id)
-        for t in templates:
-            if t['name'] == name:
-                self.current_template = json.loads(t['config'])
-                return True
-        return False
+        t = ft.find_by_name(self.user_id, name)
+        if not t:
+            return False
+        self._use_template_row(ft, t)
+        return True
+
+    def _use_template_row(self, ft, t):
+        # 模板列表与解析后的配置都来自模型缓存，模板未变化时不查询数据库
+        self.current_template = ft.load_config(t)
+        self._template_row = (t['id'], t['updated_at'], self.current_template)
+
+    @property
+    def template_id(self):
+        """当前模板的记录ID，模板不是由 set_current_template 从数据库选中的时为 None"""
+        if self._template_row and self._template_row[2] is self.current_template:
+            return self._template_row[0]
+        return None
         
     def classify_paragraph(self, paragraph, rules, para_index=1):
-        """根据规则对段落进行分类，para_index为1基序号"""
+        """根据规则对段落进行分类，para_index为1基序号
+
+        逐条解释规则的参考实现；批量处理使用 compiled_template.classify，结果与此一致。
+        """
         text = paragraph.text.strip()
         for rule_type, rule in rules.items():
             if rule['type'] == 'regex' and re.search(rule['pattern'], text):
@@ -65,15 +131,7 @@ class DocumentFormatter:
             for run in paragraph.runs:
                 run.font.size = Pt(format_rules['size'])
         if 'alignment' in format_rules:
-            alignment_map = {
-                '左对齐': WD_ALIGN_PARAGRAPH.LEFT,
-                'center': WD_ALIGN_PARAGRAPH.CENTER,
-                '居中': WD_ALIGN_PARAGRAPH.CENTER,
-                '右对齐': WD_ALIGN_PARAGRAPH.RIGHT,
-                '两端对齐': WD_ALIGN_PARAGRAPH.JUSTIFY,
-                'justify': WD_ALIGN_PARAGRAPH.JUSTIFY
-            }
-            paragraph.alignment = alignment_map.get(format_rules['alignment'], WD_ALIGN_PARAGRAPH.LEFT)
+            paragraph.alignment = ALIGNMENT_MAP.get(format_rules['alignment'], WD_ALIGN_PARAGRAPH.LEFT)
         if 'indent' in format_rules:
             paragraph.paragraph_format.first_line_indent = Cm(format_rules['indent'])
         if 'line_spacing' in format_rules:
@@ -89,41 +147,138 @@ class DocumentFormatter:
             for run in paragraph.runs:
                 run.font.underline = format_rules['underline']
 
-    def format_document(self, doc_path, output_path=None, progress_callback=None, status_callback=None):
-        """格式化单个文档"""
+    def format_document(self, doc_path, output_path=None, progress_callback=None, status_callback=None, timings=None):
+        """格式化单个文档，timings 不为 None 时写入读取/排版/保存各阶段耗时（毫秒）"""
         try:
-            doc = Document(doc_path)
-            template = self.current_template
-            
-            if not template:
-                raise Exception("未选择格式模板！")
+            if self.engine == 'stream':
+                self._format_stream(doc_path, output_path or default_output_path(doc_path),
+                                    progress_callback, status_callback, timings)
+                return True
+            name = os.path.basename(doc_path)
+            t0 = time.perf_counter()
+            with span('parse', file=name):
+                doc = Document(doc_path)
+            t1 = time.perf_counter()
+            with span('transform', file=name):
+                parts = self.transform_document(doc, progress_callback, status_callback)
+                    
+            profile_snapshot()
+            # 保存文档：只重写主文档部件（样式模式下还有样式部件），其余部件原样复制
+            t2 = time.perf_counter()
+            with span('save', file=name):
+                save_document(doc, doc_path, output_path or default_output_path(doc_path), parts=parts,
+                              compress_level=self.compress_level)
+            if timings is not None:
+                timings['load_ms'] = int((t1 - t0) * 1000)
+                timings['format_ms'] = int((t2 - t1) * 1000)
+                timings['save_ms'] = int((time.perf_counter() - t2) * 1000)
                 
-            total_paragraphs = len(doc.paragraphs)
+            return True
+            
+        except Exception as e:
+            raise Exception(f"处理文档时出错: {str(e)}")
             
-            for i, paragraph in enumerate(doc.paragraphs):
+    def transform_document(self, doc, progress_callback=None, status_callback=None):
+        """按当前模板格式化已加载的文档，返回除主文档外需要一并保存的部件"""
+        template = self.current_template
+        if not template:
+            raise Exception("未选择格式模板！")
+        if self.engine == 'style':
+            return self._format_styles(doc, template, progress_callback, status_callback)
+        if self.engine in ('lxml', 'stream'):
+            self._format_elements(doc, template, progress_callback, status_callback)
+        else:
+            self._format_paragraphs(doc, template, progress_callback, status_callback)
+        return None
+
+    def _format_paragraphs(self, doc, template, progress_callback=None, status_callback=None):
+        classifier = self.compiled_template
+        paragraphs = doc.paragraphs
+        total_paragraphs = len(paragraphs)
+        # 先分类全部段落再应用格式（格式不改变文字，结果与逐段处理相同），两个阶段分别计时
+        with span('classify', paragraphs=total_paragraphs):
+            # 不跳过空段落，位置规则严格与文档段落索引对应；只对非空段落应用格式
+            para_types = [classifier.classify(text, para_index=i+1) if text else None
+                          for i, text in enumerate(paragraph.text.strip() for paragraph in paragraphs)]
+        
+        with span('apply', paragraphs=total_paragraphs):
+            for i, paragraph in enumerate(paragraphs):
                 if progress_callback:
                     progress_callback(int((i + 1) / total_paragraphs * 100))
                 if status_callback:
                     status_callback(f"正在处理第 {i+1}/{total_paragraphs} 段")
-                    
-                # 不跳过空段落，位置规则严格与文档段落索引对应
-                para_type = self.classify_paragraph(paragraph, template['rules'], para_index=i+1)
-                
-                # 只对非空段落应用格式
-                if para_type in template['formats'] and paragraph.text.strip():
+                para_type = para_types[i]
+                if para_type in template['formats']:
                     self.apply_format(paragraph, template['formats'][para_type])
-                    
-            # 保存文档
-            if output_path:
-                doc.save(output_path)
-            else:
-                base, ext = os.path.splitext(doc_path)
-                doc.save(f"{base}_formatted{ext}")
-                
-            return True
-            
-        except Exception as e:
-            raise Exception(f"处理文档时出错: {str(e)}")
+
+    def _format_stream(self, doc_path, output_path, progress_callback=None, status_callback=None, timings=None):
+        """流式引擎：增量解析主文档，每个段落解析完即分类、改写并写入输出，不加载整个文档树
+
+        段落总数事先未知，状态每 STREAM_STATUS_INTERVAL 段更新一次，进度在完成时置为 100。
+        """
+        template = self.current_template
+        if not template:
+            raise Exception("未选择格式模板！")
+        classifier = self.compiled_template
+        engine = self.format_engine
+        formats = template['formats']
+        index = 0
+
+        def transform(elem):
+            nonlocal index
+            if elem.tag != W_P:
+                return
+            index += 1
+            if status_callback and index % STREAM_STATUS_INTERVAL == 0:
+                status_callback(f"正在处理第 {index} 段")
+            text = paragraph_text(elem).strip()
+            para_type = classifier.classify(text, para_index=index)
+            if para_type in formats and text:
+                engine.apply(elem, para_type)
+
+        start = time.perf_counter()
+        # 解析、分类、改写与写出交织进行，记为一个阶段
+        with span('rewrite', file=os.path.basename(doc_path)):
+            rewrite_document(doc_path, output_path, transform, self.compress_level)
+        if progress_callback:
+            progress_callback(100)
+        if timings is not None:
+            # 读取、排版与写出交织进行，全部计入排版耗时
+            timings['load_ms'] = 0
+            timings['format_ms'] = int((time.perf_counter() - start) * 1000)
+            timings['save_ms'] = 0
+
+    def _format_styles(self, doc, template, progress_callback=None, status_callback=None):
+        """样式引擎：写入段落样式并让段落引用，返回需要一并保存的样式部件"""
+        engine = self.format_engine
+        styles_part = _styles_part(doc)
+        if styles_part is None:
+            # 没有 styles.xml 的文档无法只改写已有部件，退回直接格式
+            self._format_elements(doc, template, progress_callback, status_callback, engine.apply_direct)
+            return None
+        engine.install(styles_part.element)
+        self._format_elements(doc, template, progress_callback, status_callback, engine.apply)
+        return [styles_part]
+
+    def _format_elements(self, doc, template, progress_callback=None, status_callback=None, apply=None):
+        """lxml 引擎：直接遍历 w:p 元素，每个段落的 run 只遍历一次"""
+        classifier = self.compiled_template
+        apply = apply or self.format_engine.apply
+        paragraphs = list(iter_body_paragraphs(doc.element.body))
+        total_paragraphs = len(paragraphs)
+        with span('classify', paragraphs=total_paragraphs):
+            para_types = [classifier.classify(text, para_index=i+1) if text else None
+                          for i, text in enumerate(paragraph_text(p).strip() for p in paragraphs)]
+        
+        with span('apply', paragraphs=total_paragraphs):
+            for i, p in enumerate(paragraphs):
+                if progress_callback:
+                    progress_callback(int((i + 1) / total_paragraphs * 100))
+                if status_callback:
+                    status_callback(f"正在处理第 {i+1}/{total_paragraphs} 段")
+                para_type = para_types[i]
+                if para_type in template['formats']:
+                    apply(p, para_type)
             
     def format_directory(self, dir_path, output_dir=None, progress_callback=None, status_callback=None):
         """批量处理目录下的所有文档"""
@@ -166,43 +321,291 @@ class DocumentFormatter:
             'failed': failed_files
         }
 
-    def format_files(self, file_list, output_dir=None, progress_callback=None, status_callback=None):
+    def format_file(self, doc_path, output_path=None):
+        """格式化单个文件并返回结果记录，失败时不抛出异常"""
+        timings = {}
+        start = time.perf_counter()
+        result = {
+            'file': os.path.basename(doc_path),
+            'path': doc_path,
+            'output': output_path or default_output_path(doc_path),
+            'success': True,
+            'cached': False,
+            'error': None,
+            'timings': timings
+        }
+        try:
+            self.format_document(doc_path, output_path, timings=timings)
+        except Exception as e:
+            result['success'] = False
+            result['error'] = str(e)
+        timings['total_ms'] = int((time.perf_counter() - start) * 1000)
+        return result
+
+    def _format_profiled(self, jobs):
+        for doc_path, output in jobs:
+            with profile_file(doc_path):
+                result = self.format_file(doc_path, output)
+            yield result
+
+    def worker_options(self):
+        """创建工作进程中格式化器所需的构造参数"""
+        return {'user_id': self.user_id, 'compress_level': self.compress_level, 'engine': self.engine}
+
+    def cache_options(self):
+        """影响输出内容的格式化器参数，参与格式化缓存键的计算"""
+        compress_level = self.compress_level
+        if compress_level is None:
+            compress_level = ZIP_CONFIG['compress_level']
+        return {'engine': self.engine, 'compress_level': compress_level}
+
+    def format_files(self, file_list, output_dir=None, progress_callback=None, status_callback=None,
+                     workers=1, result_callback=None, use_cache=None, task_id=None, trace=None, profile=None,
+                     pool=None):
+        """批量格式化文件
+
+        单进程时由读取、格式化、写出三段流水线处理，磁盘读写与排版重叠进行；
+        workers>1 时由进程池并行处理，每个工作进程只接收并编译一次模板，文件完成即回报。
+        result_callback 不为 None 时对每个文件的结果记录（成功与否、错误、各阶段耗时）调用一次。
+        use_cache 为 True 时（默认取 FORMAT_CACHE_CONFIG）输入内容和模板都未变化的文件不再处理，
+        直接使用缓存的输出，结果记录的 cached 为 True。
+        task_id 为已创建的任务记录（如任务服务排队时创建），为 None 时新建。
+        每个文件的状态和任务进度按检查点批量写入 doc_files/doc_tasks，中断后可用 resume_task 继续。
+        各阶段耗时记录到 performance_logs（见 tracing.py），trace 为 Chrome trace-event JSON 的导出路径。
+        profile 为 True（全部文件）或 N（最慢的 N 个文件）时逐个文件剖析（见 profiler.py），
+        此时在本进程中按顺序处理，结果目录记录在任务的 profile_path。
+        pool 为 worker_pool 创建的常驻进程池（如监视服务），给出时在其中处理，不再为本批新建进程池。
+        """
+        if task_id is None:
+            task_id = DocTask().create(self.user_id, 'format', format_task_name(), '', output_dir or '', self.template_id)
+        # 剖析结果放在输出目录（未指定时为第一个输入文件所在目录）下
+        profile_base = output_dir or (os.path.dirname(os.path.abspath(file_list[0])) if file_list else '.')
+        with trace_task(task_id, 'format', user_id=self.user_id, export=trace), \
+                profile_task(task_id, 'format', profile_base, profile_top(profile)) as profiler:
+            return self._format_batch(file_list, output_dir, progress_callback, status_callback, workers,
+                                      result_callback, use_cache, task_id, profiler, pool)
+
+    def _format_batch(self, file_list, output_dir, progress_callback, status_callback, workers, result_callback,
+                      use_cache, task_id, profiler=None, pool=None):
         total_files = len(file_list)
         success_count = 0
+        cached_count = 0
         failed_files = []
         task_model = DocTask()
-        task_name = f"批量格式化_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        output_path = output_dir or ''
-        task_id = task_model.create(self.user_id, 'format', task_name, '', output_path, None)
         log_model = TaskLog()
-        perf_model = PerformanceLog()
-        start_time = datetime.now()
-        for i, doc_path in enumerate(file_list):
-            try:
-                if output_dir:
-                    output_path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(doc_path))[0]}_formatted.docx")
-                else:
-                    output_path = None
+        with span('db_register', files=total_files):
+            checkpoint = TaskCheckpoint(task_id, file_list)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        if use_cache is None:
+            use_cache = FORMAT_CACHE_CONFIG['enabled']
+        cache = FormatCache() if use_cache and self.current_template else None
+        cache_keys = {}
+        pending = file_list
+        cached_results = []
+        if cache:
+            tpl_hash = template_hash(self.current_template, self.cache_options())
+            pending = []
+            with span('cache_lookup', files=len(file_list)):
+                for doc_path in file_list:
+                    output = batch_output_path(doc_path, output_dir) or default_output_path(doc_path)
+                    try:
+                        key = cache.key(doc_path, tpl_hash)
+                        hit = cache.lookup(key, output)
+                    except OSError:
+                        # 无法读取的文件交给正常流程报告错误
+                        pending.append(doc_path)
+                        continue
+                    if hit:
+                        cached_results.append(cached_result(doc_path, output))
+                    else:
+                        cache_keys[doc_path] = key
+                        pending.append(doc_path)
+        parallel = pool is not None or (workers > 1 and len(pending) > 1)
+        if parallel and pending and not profiler:
+            if not self.current_template:
+                raise Exception("未选择格式模板！")
+            results = self._format_parallel(pending, output_dir, workers, pool)
+        else:
+            jobs = [(doc_path, batch_output_path(doc_path, output_dir) or default_output_path(doc_path))
+                    for doc_path in pending]
+            if profiler:
+                # cProfile 只统计当前线程，剖析时在本线程中逐个处理
+                results = self._format_profiled(jobs)
+            elif self.engine == 'stream':
+                # 流式引擎自身边读边写，不经过流水线的整文档加载
+                results = (self.format_file(doc_path, output) for doc_path, output in jobs)
+            else:
+                results = FormatPipeline(self).run(jobs)
+        try:
+            for i, result in enumerate(chain(cached_results, results)):
                 if progress_callback:
                     progress_callback(int((i + 1) / total_files * 100))
                 if status_callback:
-                    status_callback(f"正在处理: {os.path.basename(doc_path)}")
-                log_model.add_log(task_id, 'progress', f"正在处理: {os.path.basename(doc_path)}", user_id=self.user_id)
-                self.format_document(doc_path, output_path)
-                success_count += 1
-            except Exception as e:
-                failed_files.append((os.path.basename(doc_path), str(e)))
-                log_model.add_log(task_id, 'error', f"处理失败: {os.path.basename(doc_path)} - {str(e)}", user_id=self.user_id)
-        end_time = datetime.now()
-        duration = int((end_time - start_time).total_seconds() * 1000)
-        perf_model.add_log(task_id, 'format', duration, None, user_id=self.user_id)
-        if failed_files:
-            task_model.update_status(task_id, 'failed', f"失败文件数: {len(failed_files)}", user_id=self.user_id)
-        else:
-            task_model.update_status(task_id, 'success', "全部处理成功", user_id=self.user_id)
-        log_model.add_log(task_id, 'info', f"处理完成，成功: {success_count}，失败: {len(failed_files)}", user_id=self.user_id)
+                    status_callback(f"已处理: {result['file']}")
+                log_model.add_log(task_id, 'progress', f"已处理: {result['file']}", user_id=self.user_id)
+                if result['cached']:
+                    cached_count += 1
+                    success_count += 1
+                elif result['success']:
+                    success_count += 1
+                    if result['path'] in cache_keys:
+                        cache.store(cache_keys[result['path']], result['output'])
+                else:
+                    failed_files.append((result['file'], result['error']))
+                    log_model.add_log(task_id, 'error', f"处理失败: {result['file']} - {result['error']}", user_id=self.user_id)
+                checkpoint.mark(result['path'], result_status(result), result['error'])
+                if result_callback:
+                    result_callback(result)
+        finally:
+            # 中断时也写入已完成文件的状态，继续执行时跳过它们
+            checkpoint.flush()
+            if cache:
+                cache.save()
+        log_model.add_log(task_id, 'info', f"处理完成，成功: {success_count}（缓存: {cached_count}），失败: {len(failed_files)}",
+                          user_id=self.user_id)
+        # 任务状态最后更新，结束状态会先写完缓冲中的日志
+        with span('db_status'):
+            if failed_files:
+                task_model.update_status(task_id, 'failed', f"失败文件数: {len(failed_files)}", user_id=self.user_id)
+            else:
+                task_model.update_status(task_id, 'success', "全部处理成功", user_id=self.user_id)
         return {
+            'task_id': task_id,
             'total': total_files,
             'success': success_count,
+            'cached': cached_count,
             'failed': failed_files
-        } 
\ No newline at end of file
+        }
+
+    def resume_task(self, task_id, progress_callback=None, status_callback=None, workers=1,
+                    result_callback=None, use_cache=None, trace=None, profile=None):
+        """继续执行中断或部分失败的格式化任务，只处理尚未成功的文件，输出目录沿用任务记录
+
+        未选择模板时使用任务记录的模板。
+        """
+        task_model = DocTask()
+        task = task_model.get_by_id(task_id)
+        if not task or task['task_type'] != 'format':
+            raise Exception(f"格式化任务不存在: {task_id}")
+        if task['status'] == 'success':
+            raise Exception(f"任务已全部完成: {task_id}")
+        if not self.current_template:
+            ft = FormatTemplate()
+            template = ft.get_by_id(task['template_id']) if task['template_id'] else None
+            if not template:
+                raise Exception("任务未记录格式模板，请指定模板！")
+            self._use_template_row(ft, template)
+        remaining = [f['file_path'] for f in task_model.get_task_files(task_id) if f['status'] not in DONE_STATUSES]
+        task_model.update_status(task_id, 'running', f"继续处理剩余 {len(remaining)} 个文件", user_id=self.user_id)
+        return self.format_files(remaining, task['output_path'] or None, progress_callback, status_callback,
+                                 workers, result_callback, use_cache, task_id, trace, profile)
+
+    def worker_pool(self, workers):
+        """创建格式化进程池：每个工作进程只接收并编译一次当前模板，可跨多批文件复用"""
+        if not self.current_template:
+            raise Exception("未选择格式模板！")
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_format_worker,
+                                   initargs=(self.current_template, self.worker_options()))
+
+    def _format_parallel(self, file_list, output_dir, workers, pool=None):
+        """在进程池中格式化，按完成顺序产出结果记录
+
+        最多同时提交 workers*2 个文件，以限制排队的任务和结果占用的内存。
+        pool 为调用方持有的常驻进程池，本批结束后不关闭；为 None 时本批新建并关闭。
+        工作进程中的阶段跨度随结果返回，记入当前任务。
+        """
+        own_pool = pool is None
+        if own_pool:
+            pool = self.worker_pool(workers)
+        remaining = iter(file_list)
+        trace_parent = worker_trace_parent()
+
+        def submit(doc_path):
+            return pool.submit(_format_in_worker, doc_path, batch_output_path(doc_path, output_dir), trace_parent)
+
+        pending = set()
+        try:
+            pending = {submit(doc_path) for doc_path in islice(remaining, workers * 2)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    next_path = next(remaining, None)
+                    if next_path is not None:
+                        pending.add(submit(next_path))
+                    result = future.result()
+                    add_worker_spans(result.pop('spans'))
+                    yield result
+        except BaseException:
+            # 调用方中断（如 KeyboardInterrupt）或提前关闭生成器时，取消尚未开始的文件
+            if own_pool:
+                pool.shutdown(cancel_futures=True)
+            else:
+                for future in pending:
+                    future.cancel()
+            raise
+        finally:
+            if own_pool:
+                pool.shutdown()
+
+
+def format_task_name():
+    return f"批量格式化_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def cached_result(doc_path, output_path):
+    """命中格式化缓存的文件的结果记录"""
+    return {
+        'file': os.path.basename(doc_path),
+        'path': doc_path,
+        'output': output_path,
+        'success': True,
+        'cached': True,
+        'error': None,
+        'timings': {'total_ms': 0}
+    }
+
+
+def result_status(result):
+    """结果记录对应的 doc_files 状态"""
+    if result['cached']:
+        return 'cached'
+    return 'success' if result['success'] else 'failed'
+
+
+def _styles_part(doc):
+    try:
+        return doc.part.part_related_by(RT.STYLES)
+    except KeyError:
+        return None
+
+def default_output_path(doc_path):
+    """未指定输出路径时的默认输出文件：原文件名加 _formatted 后缀"""
+    base, ext = os.path.splitext(doc_path)
+    return f"{base}_formatted{ext}"
+
+
+def batch_output_path(doc_path, output_dir):
+    """批量处理时的输出路径，未指定输出目录时返回 None（使用默认输出文件）"""
+    if not output_dir:
+        return None
+    return os.path.join(output_dir, f"{os.path.splitext(os.path.basename(doc_path))[0]}_formatted.docx")
+
+
+# 工作进程中的格式化器，由进程池初始化函数创建，模板只传递和编译一次
+_worker_formatter = None
+
+
+def _init_format_worker(template, options):
+    global _worker_formatter
+    _worker_formatter = DocumentFormatter(**options)
+    _worker_formatter.current_template = template
+    _worker_formatter.compiled_template
+
+
+def _format_in_worker(doc_path, output_path, trace_parent=None):
+    with collect_spans(trace_parent) as spans:
+        result = _worker_formatter.format_file(doc_path, output_path)
+    result['spans'] = spans
+    finish_worker_logs()
+    return result
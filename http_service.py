@@ -0,0 +1,409 @@
+"""小小文灵本地任务服务（HTTP/JSON，不依赖 Qt）
+
+    POST /uploads?name=a.docx[&batch=批次]   请求体为文件内容，返回批次与保存路径
+    POST /jobs/merge    {"user", "batch", "name", "save_dir", "workers", "profile"}
+    POST /jobs/format   {"user", "batch", "template" 或 "template_config",
+                         "output_dir", "engine", "workers", "use_cache", "profile"}
+    POST /tasks/<id>/resume     {"engine", "workers", "use_cache", "template" 或 "template_config", "profile"}
+                               继续执行中断或失败的任务；profile 为 true 或 N 时剖析全部或最慢的 N 个文件，
+                               结果目录见任务记录的 profile_path
+    GET  /tasks/<id>           任务记录、服务内执行状态与文件明细
+    GET  /tasks/<id>/logs      任务日志
+    GET  /tasks/<id>/output    下载合并结果；格式化任务用 ?file=<文件ID> 下载单个输出
+    GET  /stats                队列、数据库连接池、模型缓存与日志写入统计
+    GET  /health               存活检查，只返回 {"status": "ok"}
+
+提交任务返回 202 与任务ID，任务在服务的线程池中排队执行，状态与日志来自 doc_tasks/task_logs。
+任务的 workers（任务内部的进程数）不超过服务的 workers（SERVICE_WORKERS）。
+除 /health 外的请求都需在请求头中给出 Authorization: Bearer <SERVICE_TOKEN>。
+任务只能处理已上传的批次；save_dir/output_dir 为 SERVICE_OUTPUT_DIR 下的相对目录（默认为批次名），
+不接受服务所在机器上的任意路径。
+"""
+import os
+import re
+import json
+import uuid
+import hmac
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+from config.settings import SERVICE_CONFIG
+
+_TASK_PATH = re.compile(r'^/tasks/(\d+)(?:/(logs|output))?$')
+_RESUME_PATH = re.compile(r'^/tasks/(\d+)/resume$')
+_BATCH_ID = re.compile(r'^[0-9a-f]{32}$')
+_COPY_CHUNK = 1024 * 1024
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class JobService:
+    """任务服务：接收合并/格式化任务，排队后由固定大小的线程池执行
+
+    提交时即创建 doc_tasks 记录并返回任务ID（状态 pending），开始执行时改为 running，
+    之后由 merge_documents/format_files 写入最终状态、任务日志和文件明细。
+    单个任务内部仍可通过 workers 参数使用进程池。
+    """
+
+    def __init__(self, workers=None, upload_dir=None, output_dir=None, token=None):
+        self.workers = workers or SERVICE_CONFIG['workers']
+        self.upload_dir = os.path.realpath(upload_dir or SERVICE_CONFIG['upload_dir'])
+        self.output_dir = os.path.realpath(output_dir or SERVICE_CONFIG['output_dir'])
+        self.token = token or SERVICE_CONFIG['token']
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        # 任务ID -> 服务内执行状态（queued/running/done/error）
+        self._jobs = {}
+
+    def authorize(self, header):
+        """校验请求头 Authorization 中的令牌"""
+        scheme, _, token = (header or '').partition(' ')
+        return bool(self.token) and scheme == 'Bearer' and hmac.compare_digest(token.strip(), self.token)
+
+    def resolve_user(self, params):
+        from database.models import User
+        username = params.get('user')
+        if not username:
+            raise Exception("缺少参数: user")
+        user = User().get_by_username(username)
+        if not user:
+            raise Exception(f"用户不存在: {username}")
+        return user['id']
+
+    def batch_dir(self, batch):
+        if not _BATCH_ID.match(batch or ''):
+            raise Exception(f"无效的上传批次: {batch}")
+        return os.path.join(self.upload_dir, batch)
+
+    def job_workers(self, params):
+        """任务内部的进程数：客户端给出的 workers 限制在 1 到服务的 workers 之间"""
+        try:
+            workers = int(params.get('workers', 1))
+        except (TypeError, ValueError):
+            raise Exception(f"无效的参数: workers={params.get('workers')}")
+        return max(1, min(workers, self.workers))
+
+    def input_dir(self, params):
+        """输入目录：只能是已上传的批次"""
+        if params.get('dir') or params.get('files'):
+            raise Exception("不接受服务器路径，请先上传文件并使用 batch")
+        path = self.batch_dir(params.get('batch'))
+        if not os.path.isdir(path):
+            raise Exception("上传批次不存在！")
+        return path
+
+    def output_path(self, params, key):
+        """输出目录：SERVICE_OUTPUT_DIR 下的相对目录 params[key]，默认为批次名，解析后不得超出输出根目录"""
+        relative = params.get(key) or params['batch']
+        if os.path.isabs(relative):
+            raise Exception(f"{key} 必须是输出根目录下的相对路径")
+        path = os.path.realpath(os.path.join(self.output_dir, relative))
+        if os.path.commonpath([path, self.output_dir]) != self.output_dir:
+            raise Exception(f"{key} 超出输出根目录")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def save_upload(self, stream, length, name, batch=None):
+        """把请求体保存为上传批次中的文件，batch 为空时新建批次"""
+        if not name or os.path.basename(name) != name or name.startswith('.'):
+            raise Exception(f"无效的文件名: {name}")
+        if not name.lower().endswith(('.doc', '.docx')):
+            raise Exception("只支持上传 .doc 和 .docx 文件！")
+        if length > SERVICE_CONFIG['max_upload_mb'] * 1024 * 1024:
+            raise Exception(f"上传文件超过 {SERVICE_CONFIG['max_upload_mb']}MB")
+        batch = batch or uuid.uuid4().hex
+        directory = self.batch_dir(batch)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        remaining = length
+        with open(path, 'wb') as f:
+            while remaining > 0:
+                chunk = stream.read(min(_COPY_CHUNK, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            os.remove(path)
+            raise Exception("上传数据不完整")
+        return {'batch': batch, 'path': path, 'size': length}
+
+    def submit_merge(self, params):
+        from merger import merge_documents
+        from database.models import DocTask
+        user_id = self.resolve_user(params)
+        doc_dir = self.input_dir(params)
+        name = params.get('name')
+        if not name or os.path.basename(name) != name:
+            raise Exception("缺少或无效的参数: name")
+        save_dir = self.output_path(params, 'save_dir')
+        output_path = os.path.join(save_dir, f"{name}.docx")
+        task_id = DocTask().create(user_id, 'merge', name, doc_dir, output_path, None)
+        return self._submit(task_id, user_id, merge_documents, (doc_dir, name, save_dir), {
+            'user_id': user_id,
+            'workers': self.job_workers(params),
+            'task_id': task_id,
+            'profile': params.get('profile')
+        })
+
+    def submit_format(self, params):
+        from cli import expand_inputs
+        from formatter import DocumentFormatter, format_task_name
+        from database.models import DocTask
+        user_id = self.resolve_user(params)
+        formatter = DocumentFormatter(user_id=user_id, engine=params.get('engine', 'docx'))
+        if params.get('template_config'):
+            formatter.current_template = params['template_config']
+        elif not params.get('template') or not formatter.set_current_template(params['template']):
+            raise Exception(f"模板不存在: {params.get('template')}")
+        files = expand_inputs([self.input_dir(params)])
+        if not files:
+            raise Exception("没有需要处理的文档文件！")
+        output_dir = self.output_path(params, 'output_dir')
+        task_id = DocTask().create(user_id, 'format', format_task_name(), '', output_dir, formatter.template_id)
+        return self._submit(task_id, user_id, formatter.format_files, (files, output_dir), {
+            'workers': self.job_workers(params),
+            'use_cache': params.get('use_cache'),
+            'task_id': task_id,
+            'profile': params.get('profile')
+        })
+
+    def submit_resume(self, task_id, params):
+        """排队继续执行中断或失败的任务，格式化任务只处理未成功的文件，合并任务完整重做"""
+        from database.models import DocTask
+        task = DocTask().get_by_id(task_id)
+        if not task:
+            raise Exception(f"任务不存在: {task_id}")
+        job = self.job_state(task_id)
+        if job and job['state'] in ('queued', 'running'):
+            raise Exception(f"任务正在执行: {task_id}")
+        if task['status'] == 'success':
+            raise Exception(f"任务已全部完成: {task_id}")
+        workers = self.job_workers(params)
+        if task['task_type'] == 'merge':
+            from merger import resume_merge
+            return self._submit(task_id, task['user_id'], resume_merge, (task_id,), {
+                'workers': workers,
+                'profile': params.get('profile')
+            })
+        from formatter import DocumentFormatter
+        formatter = DocumentFormatter(user_id=task['user_id'], engine=params.get('engine', 'docx'))
+        if params.get('template_config'):
+            formatter.current_template = params['template_config']
+        elif params.get('template') and not formatter.set_current_template(params['template']):
+            raise Exception(f"模板不存在: {params['template']}")
+        return self._submit(task_id, task['user_id'], formatter.resume_task, (task_id,), {
+            'workers': workers,
+            'use_cache': params.get('use_cache'),
+            'profile': params.get('profile')
+        })
+
+    def _submit(self, task_id, user_id, work, args, kwargs):
+        with self._lock:
+            self._jobs[task_id] = {'state': 'queued', 'error': None, 'result': None}
+        self._pool.submit(self._run, task_id, user_id, work, args, kwargs)
+        return task_id
+
+    def _update(self, task_id, **state):
+        with self._lock:
+            self._jobs[task_id].update(state)
+
+    def _run(self, task_id, user_id, work, args, kwargs):
+        from database.models import DocTask
+        task_model = DocTask()
+        self._update(task_id, state='running')
+        try:
+            task_model.update_status(task_id, 'running', user_id=user_id)
+            result = work(*args, **kwargs)
+            self._update(task_id, state='done', result=result)
+        except Exception as e:
+            self._update(task_id, state='error', error=str(e))
+            # 在处理函数接管任务记录之前失败时（如目录中没有文档），由这里补记失败状态
+            try:
+                task = task_model.get_by_id(task_id)
+                if task and task['status'] not in ('success', 'failed'):
+                    task_model.update_status(task_id, 'failed', str(e), user_id=user_id)
+            except Exception:
+                pass
+
+    def job_state(self, task_id):
+        """服务内执行状态，服务重启前提交的任务返回 None"""
+        with self._lock:
+            job = self._jobs.get(task_id)
+            return dict(job) if job else None
+
+    def task_status(self, task_id):
+        from database.models import DocTask
+        task_model = DocTask()
+        task = task_model.get_by_id(task_id)
+        if not task:
+            return None
+        files = task_model.get_task_files(task_id)
+        if task['task_type'] == 'format':
+            for f in files:
+                f['output'] = format_output_path(task, f)
+        return {'task': task, 'job': self.job_state(task_id), 'files': files}
+
+    def task_logs(self, task_id):
+        from database.models import TaskLog
+        return TaskLog().get_task_logs(task_id)
+
+    def task_output(self, task_id, file_id=None):
+        """任务的输出文件路径：合并任务为合并结果，格式化任务为指定文件的输出"""
+        from database.models import DocTask
+        task_model = DocTask()
+        task = task_model.get_by_id(task_id)
+        if not task:
+            return None
+        if task['task_type'] == 'merge':
+            path = task['output_path'] if task['status'] == 'success' else None
+        else:
+            path = None
+            for f in task_model.get_task_files(task_id):
+                if str(f['id']) == str(file_id) and f['status'] in ('success', 'cached'):
+                    path = format_output_path(task, f)
+        return path if path and os.path.isfile(path) else None
+
+    def stats(self):
+        from cli import db_pool_stats
+        from database.cache import model_cache
+        from database.log_writer import log_writer_stats
+        with self._lock:
+            states = [job['state'] for job in self._jobs.values()]
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'queued': states.count('queued'),
+            'running': states.count('running'),
+            'db_pool': db_pool_stats(),
+            'model_cache': model_cache.stats(),
+            'log_writer': log_writer_stats()
+        }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def format_output_path(task, file_row):
+    from formatter import batch_output_path, default_output_path
+    return batch_output_path(file_row['file_path'], task['output_path']) or default_output_path(file_row['file_path'])
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'XXWenLing/1.0'
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _authorized(self):
+        if self.service.authorize(self.headers.get('Authorization')):
+            return True
+        self._error(401, "缺少或无效的访问令牌")
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == '/health':
+                return self._json(200, {'status': 'ok'})
+            if not self._authorized():
+                return
+            if url.path == '/stats':
+                return self._json(200, self.service.stats())
+            match = _TASK_PATH.match(url.path)
+            if not match:
+                return self._error(404, "未知的请求路径")
+            task_id, sub = int(match.group(1)), match.group(2)
+            if sub == 'logs':
+                if not self.service.task_status(task_id):
+                    return self._error(404, f"任务不存在: {task_id}")
+                return self._json(200, {'task_id': task_id, 'logs': self.service.task_logs(task_id)})
+            if sub == 'output':
+                file_id = parse_qs(url.query).get('file', [None])[0]
+                path = self.service.task_output(task_id, file_id)
+                if not path:
+                    return self._error(404, "输出文件不存在或任务尚未完成")
+                return self._file(path)
+            status = self.service.task_status(task_id)
+            if not status:
+                return self._error(404, f"任务不存在: {task_id}")
+            return self._json(200, status)
+        except Exception as e:
+            return self._error(500, str(e))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if not self._authorized():
+            return
+        try:
+            length = self._content_length()
+            if url.path == '/uploads':
+                query = parse_qs(url.query)
+                result = self.service.save_upload(self.rfile, length, query.get('name', [None])[0],
+                                                  query.get('batch', [None])[0])
+                return self._json(201, result)
+            if url.path == '/jobs/merge':
+                task_id = self.service.submit_merge(self._read_json(length))
+            elif url.path == '/jobs/format':
+                task_id = self.service.submit_format(self._read_json(length))
+            elif _RESUME_PATH.match(url.path):
+                task_id = self.service.submit_resume(int(_RESUME_PATH.match(url.path).group(1)),
+                                                     self._read_json(length))
+            else:
+                return self._error(404, "未知的请求路径")
+        except Exception as e:
+            return self._error(400, str(e))
+        self._json(202, {'task_id': task_id, 'status_url': f"/tasks/{task_id}"})
+
+    def _content_length(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise Exception("无效的 Content-Length")
+        if length < 0:
+            raise Exception("无效的 Content-Length")
+        return length
+
+    def _read_json(self, length):
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise Exception("请求体不是有效的 JSON")
+        if not isinstance(params, dict):
+            raise Exception("请求体必须是 JSON 对象")
+        return params
+
+    def _json(self, code, data):
+        body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code, message):
+        self._json(code, {'error': message})
+
+    def _file(self, path):
+        self.send_response(200)
+        self.send_header('Content-Type', DOCX_CONTENT_TYPE)
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f"attachment; filename*=UTF-8''{quote(os.path.basename(path))}")
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, _COPY_CHUNK)
+
+
+def make_server(host=None, port=None, service=None):
+    """创建 HTTP 服务（尚未开始监听循环），port 为 0 时由系统分配端口"""
+    service = service or JobService()
+    if not service.token:
+        raise Exception("未设置访问令牌 SERVICE_TOKEN，任务服务不启动")
+    server = ThreadingHTTPServer((host or SERVICE_CONFIG['host'],
+                                  SERVICE_CONFIG['port'] if port is None else port), JobRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
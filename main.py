@@ -6,7 +6,7 @@ from PyQt6.QtGui import QPixmap, QFont, QDesktopServices
 from PyQt6.QtCore import Qt, QUrl
 from merger import merge_documents
 from format_page import FormatPage
-from database.init_db import init_database
+from database.migrations import ensure_schema
 
 ASSETS = os.path.join(os.path.dirname(__file__), 'assets')
 BG_PATH = os.path.join(ASSETS, 'bg.jpg')
@@ -372,7 +372,9 @@ class MainWindow(QMainWindow):
 
 # 入口
 if __name__ == "__main__":
-    init_database()  # 启动时自动初始化数据库
+    import multiprocessing
+    multiprocessing.freeze_support()  # 打包后的程序中并行合并需要
+    ensure_schema()  # 启动时检查数据库结构版本，只在有未执行的迁移时建表/升级
     import sys
     from PyQt6.QtWidgets import QApplication
     app = QApplication(sys.argv)
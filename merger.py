@@ -1,65 +1,210 @@
 import os
-from docx import Document
-import pythoncom
-import win32com.client
-from database.models import DocTask, TaskLog, PerformanceLog
-from datetime import datetime
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from lxml import etree
+from database.models import DocTask, DocFile, TaskLog
+from database.log_writer import finish_worker_logs
+from converter import get_converter
+from checkpoint import TaskCheckpoint
+from tracing import trace_task, span, worker_trace_parent, collect_spans, add_worker_spans
+from profiler import profile_task, profile_file, profile_top
+from docx_stream import (
+    StreamingDocxWriter, iter_body_elements, strip_declared_namespaces, collect_media,
+    relationship_id_map, remap_relationship_ids, W_SECT_PR
+)
 
-def merge_documents(doc_dir, out_name, save_dir, progress=None, status=None, user_id=None):
+def list_merge_inputs(doc_dir):
+    """目录下可合并的文档"""
     supported_extensions = ['.doc', '.docx']
-    doc_files = [os.path.join(doc_dir, f) for f in os.listdir(doc_dir) if any(f.lower().endswith(ext) for ext in supported_extensions)]
+    return [os.path.join(doc_dir, f) for f in os.listdir(doc_dir) if any(f.lower().endswith(ext) for ext in supported_extensions)]
+
+def merge_documents(doc_dir, out_name, save_dir, progress=None, status=None, user_id=None, workers=1, compress_level=None,
+                    task_id=None, trace=None, profile=None):
+    """合并目录下的文档
+
+    合并始终为流式：逐个增量解析源文档正文并直接写入输出包，图片等媒体按内容去重并改写关系ID，
+    峰值内存只取决于最大的单个输入文档。
+    workers>1 时使用进程池并行解析源文档，输出顺序与分页不变。
+    compress_level 为改写部件的压缩级别（0 仅存储），默认取 ZIP_CONFIG。
+    task_id 为已创建的任务记录（如任务服务排队时创建），为 None 时新建。
+    trace 为 Chrome trace 导出路径（见 tracing 模块）。
+    profile 为 True（全部文件）或 N（最慢的 N 个文件）时逐个文件剖析（见 profiler 模块），
+    剖析时不使用进程池。
+    """
+    doc_files = list_merge_inputs(doc_dir)
     if not doc_files:
         raise Exception("所选目录中没有支持的文档文件！")
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
     output_path = os.path.join(save_dir, f"{out_name}.docx")
-    merged_doc = Document(doc_files[0])
-    merged_doc._body.clear_content()
-    total = len(doc_files)
     # 创建数据库任务记录
+    if task_id is None:
+        task_id = DocTask().create(user_id, 'merge', out_name, doc_dir, output_path, None)
+    return run_merge(task_id, doc_files, output_path, progress, status, workers, compress_level, trace, profile)
+
+def resume_merge(task_id, progress=None, status=None, workers=1, compress_level=None, trace=None, profile=None):
+    """重新执行未完成的合并任务
+
+    合并结果在最后才整体写出，中断的合并无法从中间接着写，因此按任务登记的文件列表和
+    输出路径完整重做一次。
+    """
+    task_model = DocTask()
+    task = task_model.get_by_id(task_id)
+    if not task or task['task_type'] != 'merge':
+        raise Exception(f"合并任务不存在: {task_id}")
+    if task['status'] == 'success':
+        raise Exception(f"任务已全部完成: {task_id}")
+    doc_files = [f['file_path'] for f in task_model.get_task_files(task_id)]
+    if not doc_files:
+        # 在登记文件之前就中断的任务，按记录的输入目录重新列出
+        doc_files = list_merge_inputs(task['input_path'])
+    if not doc_files:
+        raise Exception("所选目录中没有支持的文档文件！")
+    DocFile().reset_status(task_id)
+    task_model.update_status(task_id, 'running', "重新执行合并", user_id=task['user_id'])
+    os.makedirs(os.path.dirname(os.path.abspath(task['output_path'])), exist_ok=True)
+    return run_merge(task_id, doc_files, task['output_path'], progress, status, workers, compress_level, trace,
+                     profile)
+
+def run_merge(task_id, doc_files, output_path, progress=None, status=None, workers=1, compress_level=None, trace=None,
+              profile=None):
+    """执行合并并记录任务日志、文件状态和最终状态"""
+    top = profile_top(profile)
+    if top is not None:
+        # cProfile 只统计当前线程，剖析时在主进程中逐个解析源文档
+        workers = 1
+    with trace_task(task_id, 'merge', export=trace), \
+            profile_task(task_id, 'merge', os.path.dirname(os.path.abspath(output_path)), top):
+        return _run_merge(task_id, doc_files, output_path, progress, status, workers, compress_level)
+
+def _run_merge(task_id, doc_files, output_path, progress, status, workers, compress_level):
+    total = len(doc_files)
     task_model = DocTask()
-    task_id = task_model.create(user_id, 'merge', out_name, doc_dir, output_path, None)
     log_model = TaskLog()
-    perf_model = PerformanceLog()
-    start_time = datetime.now()
+    with span('db_register', files=total):
+        checkpoint = TaskCheckpoint(task_id, doc_files)
+    # 已开始处理的文件；合并结果保存之前输出文件还不存在，各文件保持 pending，
+    # 保存成功后一次标记为成功，失败时只把正在处理的文件标记为失败
+    started = []
+
+    def report(idx, doc_file):
+        started.append(doc_file)
+        if progress:
+            progress.setValue(int((idx + 1) / total * 100))
+        if status:
+            status.setText(f"正在处理: {os.path.basename(doc_file)}")
+        log_model.add_log(task_id, 'progress', f"正在处理: {os.path.basename(doc_file)}")
+
     try:
-        for idx, doc_file in enumerate(doc_files):
-            if progress:
-                progress.setValue(int((idx + 1) / total * 100))
-            if status:
-                status.setText(f"正在处理: {os.path.basename(doc_file)}")
-            log_model.add_log(task_id, 'progress', f"正在处理: {os.path.basename(doc_file)}")
-            if doc_file.endswith('.docx'):
-                doc = Document(doc_file)
-            else:
-                doc = convert_doc_to_docx(doc_file)
-            for element in doc.element.body:
-                merged_doc.element.body.append(element)
-            if idx < total - 1:
-                merged_doc.add_page_break()
-        merged_doc.save(output_path)
-        end_time = datetime.now()
-        duration = int((end_time - start_time).total_seconds() * 1000)
-        perf_model.add_log(task_id, 'merge', duration, None)
-        task_model.update_status(task_id, 'success', f"合成完成：{output_path}")
+        merge_streaming(doc_files, output_path, report, workers, compress_level)
+        checkpoint.mark_all(doc_files, 'success')
         log_model.add_log(task_id, 'info', f"合成完成：{output_path}")
+        task_model.update_status(task_id, 'success', f"合成完成：{output_path}")
         return output_path
     except Exception as e:
-        task_model.update_status(task_id, 'failed', str(e))
+        checkpoint.mark_all(started[-1:], 'failed', str(e))
         log_model.add_log(task_id, 'error', f"合成失败：{str(e)}")
+        task_model.update_status(task_id, 'failed', str(e))
         raise
 
-def convert_doc_to_docx(doc_path):
-    pythoncom.CoInitialize()
-    word = win32com.client.Dispatch("Word.Application")
-    word.Visible = False
-    temp_docx = doc_path + "x"
-    try:
-        doc = word.Documents.Open(doc_path)
-        doc.SaveAs2(temp_docx, FileFormat=16)
-        doc.Close()
-        return Document(temp_docx)
-    finally:
-        word.Quit()
-        if os.path.exists(temp_docx):
-            os.remove(temp_docx) 
\ No newline at end of file
+def merge_streaming(doc_files, output_path, report=None, workers=1, compress_level=None):
+    """流式合并：以第一个文档为基准包，按原顺序逐个写入各文档正文
+
+    workers>1 时由进程池并发解压、解析和规范化源文档，主进程按原顺序拼接片段。
+    """
+    total = len(doc_files)
+    # 基准包需要是 docx，.doc 先行转换
+    base = doc_files[0]
+    if not base.lower().endswith('.docx'):
+        base = convert_doc_to_file(base)
+    with StreamingDocxWriter(output_path, base, compress_level) as writer:
+        prepared = _prepare_in_order(doc_files, workers, writer.declared_namespaces, report)
+        for idx, (doc_file, source, refs, fragments) in enumerate(prepared):
+            # 串行时正文片段边解析边写入，解析与写出记为一个阶段
+            with span('merge_file', file=os.path.basename(doc_file)), profile_file(doc_file):
+                writer.add_media(source, refs.values())
+                if isinstance(fragments, bytes):
+                    writer.write_raw(fragments)
+                else:
+                    for fragment in fragments:
+                        writer.write_fragment(fragment)
+                if idx < total - 1:
+                    writer.write_page_break()
+    return output_path
+
+def load_source_media(source):
+    """读取源文档的图片、嵌入对象等关系及其内容哈希"""
+    with zipfile.ZipFile(source) as zf:
+        return collect_media(zf)
+
+def iter_source_fragments(source, refs):
+    """逐个产出源文档正文片段的序列化字节
+
+    关系引用改写为按内容哈希导出的 ID；各源文档的节属性不复制。
+    """
+    mapping = relationship_id_map(refs)
+    with zipfile.ZipFile(source) as zf:
+        for element in iter_body_elements(zf):
+            if element.tag == W_SECT_PR:
+                continue
+            if mapping:
+                remap_relationship_ids(element, mapping)
+            yield etree.tostring(element)
+
+def prepare_fragments(source, declared, trace_parent=None):
+    """进程池工作函数：解析并规范化一个源文档，返回 (媒体关系, 拼接好的正文字节, 跟踪跨度)"""
+    with collect_spans(trace_parent) as spans:
+        with span('prepare', file=os.path.basename(source)):
+            refs = load_source_media(source)
+            body = b''.join(strip_declared_namespaces(fragment, declared)
+                            for fragment in iter_source_fragments(source, refs))
+    finish_worker_logs()
+    return refs, body, spans
+
+def _prepare_in_order(doc_files, workers, declared, report=None):
+    """按原顺序产出 (文件, 源 docx 路径, 媒体关系, 正文片段)
+
+    并行时最多预取 workers*2 个文档以限制内存。
+    report(idx, doc_file) 在按顺序取用每个文件的结果之前调用，文件解析失败时它就是最后报告的文件。
+    """
+    if workers <= 1:
+        for idx, doc_file in enumerate(doc_files):
+            if report:
+                report(idx, doc_file)
+            source = doc_file
+            if not doc_file.lower().endswith('.docx'):
+                source = convert_doc_to_file(doc_file)
+            refs = load_source_media(source)
+            yield doc_file, source, refs, iter_source_fragments(source, refs)
+        return
+    # .doc 文件在主进程的转换池中提前转换，工作进程只处理 docx
+    converter = get_converter()
+    conversions = {f: converter.submit(f) for f in doc_files if not f.lower().endswith('.docx')}
+    trace_parent = worker_trace_parent()
+
+    def submit(pool, doc_file):
+        source = conversions[doc_file].result() if doc_file in conversions else doc_file
+        return source, pool.submit(prepare_fragments, source, declared, trace_parent)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        remaining = iter(doc_files)
+        for doc_file in islice(remaining, workers * 2):
+            pending.append((doc_file, *submit(pool, doc_file)))
+        for idx in range(len(doc_files)):
+            doc_file, source, future = pending.popleft()
+            if report:
+                report(idx, doc_file)
+            next_file = next(remaining, None)
+            if next_file is not None:
+                pending.append((next_file, *submit(pool, next_file)))
+            refs, body, spans = future.result()
+            add_worker_spans(spans)
+            yield doc_file, source, refs, body
+
+def convert_doc_to_file(doc_path):
+    """将 .doc 转换为 .docx，返回转换缓存中的文件路径（调用方不得删除）"""
+    with span('convert', file=os.path.basename(doc_path)):
+        return get_converter().convert(doc_path)
@@ -0,0 +1,214 @@
+"""批处理性能剖析
+
+    with profile_task(task_id, 'format', output_dir, top=5):
+        for path in files:
+            with profile_file(path):
+                ...
+
+profile_task 开启剖析后，profile_file 对每个文件单独运行 cProfile，并用 tracemalloc 统计
+该文件处理期间新增的内存分配；任务结束时只保留最慢的 top 个文件（top 为 0 时全部保留），
+在输出目录旁的 profile_task_<ID> 目录中写出：
+
+    summary.json          各文件耗时、峰值内存与报告路径（按耗时从高到低）
+    NN_<文件名>.prof      cProfile 统计，可用 python -m pstats 或 snakeviz 查看
+    NN_<文件名>.txt       按累计耗时排序的函数统计和内存分配最多的代码行
+    inputs/<文件名>       输入文档副本，用于离线复现
+
+目录路径记录在 doc_tasks.profile_path。没有开启剖析时 profile_file 什么也不做。
+cProfile 只统计当前线程，剖析时调用方按顺序在本线程中逐个处理文件。
+"""
+import io
+import os
+import sys
+import json
+import time
+import heapq
+import shutil
+import pstats
+import cProfile
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from config.settings import PROFILE_CONFIG
+
+_profiler = contextvars.ContextVar('profiler', default=None)
+
+
+class FileProfile:
+    """一个文件的剖析结果"""
+
+    def __init__(self, label, path, duration_ms, peak_mb, profile, allocations, copy_input):
+        self.label = label
+        self.path = path
+        self.duration_ms = duration_ms
+        self.peak_mb = peak_mb
+        self.profile = profile
+        self.allocations = allocations
+        self.copy_input = copy_input
+
+
+class BatchProfiler:
+    """一个任务的剖析器：逐个文件剖析，只在内存中保留最慢的 top 个结果"""
+
+    def __init__(self, task_id, kind, directory, top=0):
+        self.task_id = task_id
+        self.kind = kind
+        self.directory = directory
+        self.top = top
+        self.profiled = 0
+        self._kept = []
+        self._seq = 0
+        self._started_tracemalloc = False
+        self._snapshot = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_CONFIG['frames'])
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def measure(self, path, label=None, copy_input=True):
+        before = tracemalloc.take_snapshot()
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._snapshot = None
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            peak_mb = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024 / 1024, 1)
+            # 处理代码标记过内存最高点（文档已全部载入）时用该快照，否则用结束时的快照
+            after = self._snapshot or tracemalloc.take_snapshot()
+            self._snapshot = None
+            allocations = [str(stat) for stat in after.compare_to(before, 'lineno')[:PROFILE_CONFIG['alloc_lines']]]
+            self._keep(FileProfile(label or os.path.basename(path), path, duration_ms, peak_mb, profile,
+                                   allocations, copy_input))
+
+    def snapshot(self):
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def _keep(self, result):
+        self.profiled += 1
+        self._seq += 1
+        item = (result.duration_ms, self._seq, result)
+        if not self.top or len(self._kept) < self.top:
+            heapq.heappush(self._kept, item)
+        elif item[0] > self._kept[0][0]:
+            heapq.heapreplace(self._kept, item)
+
+    def write(self):
+        """写出剖析结果，返回结果目录；没有剖析任何文件时返回 None"""
+        if not self._kept:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        kept = [result for _, _, result in sorted(self._kept, key=lambda item: (-item[0], item[1]))]
+        for rank, result in enumerate(kept, 1):
+            stem = f"{rank:02d}_{os.path.splitext(result.label)[0]}"
+            prof_path = os.path.join(self.directory, stem + '.prof')
+            report_path = os.path.join(self.directory, stem + '.txt')
+            result.profile.dump_stats(prof_path)
+            with open(report_path, 'w', encoding='utf-8') as f:
+                f.write(self._report(result))
+            input_copy = None
+            if result.copy_input and os.path.isfile(result.path):
+                input_copy = os.path.join(self.directory, 'inputs', f"{rank:02d}_{os.path.basename(result.path)}")
+                os.makedirs(os.path.dirname(input_copy), exist_ok=True)
+                shutil.copyfile(result.path, input_copy)
+            files.append({
+                'file': result.label,
+                'path': result.path,
+                'duration_ms': result.duration_ms,
+                'peak_mb': result.peak_mb,
+                'profile': os.path.basename(prof_path),
+                'report': os.path.basename(report_path),
+                'input_copy': os.path.relpath(input_copy, self.directory) if input_copy else None
+            })
+        with open(os.path.join(self.directory, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'task_id': self.task_id,
+                'task_type': self.kind,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'profiled': self.profiled,
+                'top': self.top,
+                'files': files
+            }, f, ensure_ascii=False, indent=2)
+        return self.directory
+
+    def _report(self, result):
+        buf = io.StringIO()
+        buf.write(f"文件: {result.path}\n耗时: {result.duration_ms} ms\n内存峰值增量: {result.peak_mb} MB\n\n")
+        stats = pstats.Stats(result.profile, stream=buf)
+        stats.sort_stats('cumulative').print_stats(PROFILE_CONFIG['stats_lines'])
+        buf.write("\n内存分配（相对开始处理前，按代码行）:\n")
+        for line in result.allocations:
+            buf.write(line + '\n')
+        return buf.getvalue()
+
+
+def profile_dir(task_id, base_dir):
+    return os.path.join(base_dir, f"profile_task_{task_id}")
+
+
+@contextmanager
+def profile_task(task_id, kind, base_dir, top=None):
+    """为任务开启剖析；top 为 None 时不剖析，为 0 时保留全部文件，否则保留最慢的 top 个
+
+    结束后写出结果并把目录记录到 doc_tasks.profile_path。
+    """
+    if top is None:
+        yield None
+        return
+    profiler = BatchProfiler(task_id, kind, profile_dir(task_id, base_dir), top)
+    profiler.start()
+    token = _profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _profiler.reset(token)
+        profiler.stop()
+        try:
+            path = profiler.write()
+            if path and task_id is not None:
+                from database.models import DocTask
+                DocTask().set_profile_path(task_id, os.path.abspath(path))
+        except Exception as e:
+            # 剖析结果写入失败不影响处理本身
+            print(f"性能剖析结果写入失败: {str(e)}", file=sys.stderr)
+
+
+@contextmanager
+def profile_file(path, label=None, copy_input=True):
+    """剖析一个文件的处理过程；没有开启剖析时不做任何事"""
+    profiler = _profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.measure(path, label, copy_input):
+        yield
+
+
+def profile_snapshot():
+    """在内存占用最高处（如文档载入并处理完、保存之前）记录内存快照"""
+    profiler = _profiler.get()
+    if profiler is not None:
+        profiler.snapshot()
+
+
+def profile_top(profile):
+    """把 profile 参数（None/False 关闭，True 或 0 全部文件，N 最慢的 N 个）转换为 profile_task 的 top"""
+    if profile is None or profile is False:
+        return None
+    if profile is True:
+        return 0
+    return max(int(profile), 0)
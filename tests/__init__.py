@@ -0,0 +1,19 @@
+"""回归测试
+
+    python -m pytest tests
+    python -m unittest discover -s tests -t .
+
+测试使用临时目录中的 SQLite 数据库和格式化缓存，不需要 MySQL、Word 或 LibreOffice。
+环境变量须在导入项目模块（读取配置）之前设置，因此放在包初始化中。
+"""
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix='xxwenling_test_')
+
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(TEST_DIR, 'test.db')
+os.environ['FORMAT_CACHE'] = '0'
+os.environ['FORMAT_CACHE_DIR'] = os.path.join(TEST_DIR, 'format_cache')
+os.environ['TRACE'] = '0'
+os.environ.pop('TRACE_EXPORT_DIR', None)
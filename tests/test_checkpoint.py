@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import unittest
+from tests import TEST_DIR
+from benchmarks.corpus import corpus_params, generate_corpus
+from checkpoint import TaskCheckpoint
+from database.migrations import ensure_schema
+from database.models import DocTask, User
+
+TEMPLATE = {
+    'name': '检查点测试',
+    'rules': {'body': {'type': 'default'}},
+    'formats': {'body': {'font': '仿宋', 'size': 16}}
+}
+
+
+class CheckpointTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        ensure_schema()
+        user = User().get_by_username('checkpoint_test')
+        cls.user_id = user['id'] if user else User().create('checkpoint_test', 'checkpoint_test@example.com', '')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def task(self, task_type='format'):
+        return DocTask().create(self.user_id, task_type, 'checkpoint', self.dir, self.dir, None)
+
+    def progress(self, task_id):
+        task = DocTask().get_by_id(task_id)
+        return task['total_files'], task['processed_files'], task['error_count']
+
+    def statuses(self, task_id):
+        return [row['status'] for row in DocTask().get_task_files(task_id)]
+
+
+class TaskCheckpointTest(CheckpointTestCase):
+
+    def test_mark_flushes_at_interval(self):
+        task_id = self.task()
+        paths = [os.path.join(self.dir, f"{i}.docx") for i in range(5)]
+        checkpoint = TaskCheckpoint(task_id, paths, interval=2, max_delay=3600)
+        self.assertEqual(self.progress(task_id), (5, 0, 0))
+        checkpoint.mark(paths[0], 'success')
+        self.assertEqual(self.statuses(task_id), ['pending'] * 5)
+        checkpoint.mark(paths[1], 'failed', '损坏')
+        self.assertEqual(self.statuses(task_id)[:3], ['success', 'failed', 'pending'])
+        self.assertEqual(self.progress(task_id), (5, 2, 1))
+        checkpoint.mark(paths[2], 'cached')
+        checkpoint.flush()
+        self.assertEqual(self.progress(task_id), (5, 3, 1))
+
+    def test_mark_all_writes_at_once(self):
+        task_id = self.task('merge')
+        paths = [os.path.join(self.dir, f"{i}.docx") for i in range(3)]
+        TaskCheckpoint(task_id, paths, interval=100, max_delay=3600).mark_all(paths, 'success')
+        self.assertEqual(self.statuses(task_id), ['success'] * 3)
+        self.assertEqual(self.progress(task_id), (3, 3, 0))
+
+    def test_open_records_reused(self):
+        task_id = self.task()
+        paths = [os.path.join(self.dir, f"{i}.docx") for i in range(3)]
+        checkpoint = TaskCheckpoint(task_id, paths, interval=100, max_delay=3600)
+        checkpoint.mark(paths[0], 'success')
+        checkpoint.mark(paths[1], 'failed', '损坏')
+        checkpoint.flush()
+        # 继续执行时只登记未完成的文件，已成功的计入进度
+        TaskCheckpoint(task_id, paths[1:], interval=100, max_delay=3600)
+        self.assertEqual(len(self.statuses(task_id)), 3)
+        self.assertEqual(self.progress(task_id), (3, 1, 0))
+
+
+class ResumeTest(CheckpointTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.input_dir = os.path.join(self.dir, 'in')
+        self.files = generate_corpus(self.input_dir, corpus_params(docs=4, paragraphs=10, seed=11))
+        self.bad = os.path.join(self.input_dir, 'z_bad.docx')
+        with open(self.bad, 'w') as f:
+            f.write('不是文档')
+
+    def repair(self):
+        shutil.copy(self.files[0], self.bad)
+
+    def formatter(self):
+        from formatter import DocumentFormatter
+        formatter = DocumentFormatter(user_id=self.user_id)
+        formatter.current_template = TEMPLATE
+        return formatter
+
+    def test_resume_format_skips_done_files(self):
+        files = self.files + [self.bad]
+        seen = []
+
+        def interrupt(result):
+            seen.append(result['path'])
+            if len(seen) == 2:
+                raise KeyboardInterrupt
+
+        task_id = self.task()
+        with self.assertRaises(KeyboardInterrupt):
+            self.formatter().format_files(files, os.path.join(self.dir, 'out'), result_callback=interrupt,
+                                          use_cache=False, task_id=task_id)
+        self.assertEqual(self.progress(task_id), (5, 2, 0))
+        resumed = []
+        result = self.formatter().resume_task(task_id, result_callback=lambda r: resumed.append(r['path']),
+                                              use_cache=False)
+        self.assertEqual(sorted(resumed), sorted(set(files) - set(seen)))
+        self.assertEqual((result['success'], len(result['failed'])), (2, 1))
+        self.assertEqual(self.progress(task_id), (5, 5, 1))
+        self.assertEqual(DocTask().get_by_id(task_id)['status'], 'failed')
+        self.repair()
+        result = self.formatter().resume_task(task_id, use_cache=False)
+        self.assertEqual((result['total'], result['success']), (1, 1))
+        self.assertEqual(self.progress(task_id), (5, 5, 0))
+        with self.assertRaisesRegex(Exception, '任务已全部完成'):
+            self.formatter().resume_task(task_id)
+
+    def test_resume_merge_redoes_registered_files(self):
+        from merger import merge_documents, resume_merge
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                with open(self.bad, 'w') as f:
+                    f.write('不是文档')
+                task_id = DocTask().create(self.user_id, 'merge', 'merged', self.input_dir,
+                                           os.path.join(self.dir, 'merged.docx'), None)
+                with self.assertRaises(Exception):
+                    merge_documents(self.input_dir, 'merged', self.dir, user_id=self.user_id, workers=workers,
+                                    task_id=task_id)
+                # 只有解析失败的文件记为失败
+                failed = [row['file_path'] for row in DocTask().get_task_files(task_id) if row['status'] != 'pending']
+                self.assertEqual(failed, [self.bad])
+                self.repair()
+                output = resume_merge(task_id, workers=workers)
+                self.assertTrue(os.path.exists(output))
+                self.assertEqual(self.statuses(task_id), ['success'] * 5)
+                self.assertEqual(self.progress(task_id), (5, 5, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import random
+import unittest
+from types import SimpleNamespace
+from benchmarks.bench_classify import KEYWORD_TEMPLATE, SAMPLES, TEMPLATE
+from classifier import KEYWORD_AUTOMATON_THRESHOLD, CompiledTemplate
+from formatter import DocumentFormatter
+
+# 规则顺序与位置、长度、空关键词、互为前缀的关键词交错
+MIXED_TEMPLATE = {
+    'rules': {
+        'short': {'type': 'length', 'max_length': 4},
+        'notice': {'type': 'keyword', 'keyword': '通知'},
+        'third': {'type': 'position', 'position': 3},
+        'chapter': {'type': 'regex', 'pattern': r'^第[一二三]章'},
+        'any': {'type': 'keyword', 'keyword': ''},
+    },
+    'formats': {}
+}
+
+PREFIX_TEMPLATE = {
+    'rules': dict([(f"long{i}", {'type': 'keyword', 'keyword': f"通知附件{i}"})
+                   for i in range(KEYWORD_AUTOMATON_THRESHOLD)] +
+                  [('prefix', {'type': 'keyword', 'keyword': '通知'}),
+                   ('late', {'type': 'keyword', 'keyword': '附件'})]),
+    'formats': {}
+}
+
+TEXTS = SAMPLES + ['', '通知', '第一章 通知', '关于印发通知附件3的说明', '附件', '第四章 附则']
+
+
+class CompiledTemplateTest(unittest.TestCase):
+
+    def assert_matches_rule_loop(self, template, texts):
+        formatter = DocumentFormatter()
+        expected = [formatter.classify_paragraph(SimpleNamespace(text=text), template['rules'], para_index=i)
+                    for i, text in enumerate(texts, 1)]
+        self.assertEqual(CompiledTemplate(template).classify_all([text.strip() for text in texts]), expected)
+
+    def test_matches_rule_loop(self):
+        rnd = random.Random(3)
+        texts = [rnd.choice(TEXTS) for _ in range(200)]
+        for name, template in (('mixed', TEMPLATE), ('keywords', KEYWORD_TEMPLATE),
+                               ('ordered', MIXED_TEMPLATE), ('prefix', PREFIX_TEMPLATE)):
+            with self.subTest(template=name):
+                self.assert_matches_rule_loop(template, texts)
+
+    def test_prefix_keyword_counted_in_automaton(self):
+        classifier = CompiledTemplate(PREFIX_TEMPLATE)
+        self.assertIsNotNone(classifier._keyword_pattern)
+        self.assertEqual(classifier.classify('通知附件3'), 'long3')
+        self.assertEqual(classifier.classify('关于通知附件'), 'prefix')
+        self.assertEqual(classifier.classify('附件'), 'late')
+
+    def test_no_match_is_body(self):
+        self.assertEqual(CompiledTemplate({'rules': {}}).classify('任意文本'), 'body')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from tests import TEST_DIR
+from cli import expand_inputs, main
+
+
+class CliTest(unittest.TestCase):
+
+    def run_cli(self, argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(argv)
+        return code, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_resume_templates_file_requires_template(self):
+        code, events = self.run_cli(['resume', '1', '--templates-file'])
+        self.assertEqual(code, 2)
+        self.assertEqual(events, [{'event': 'error', 'error': '--templates-file 需要与 --template 一起使用'}])
+
+    def test_expand_inputs(self):
+        directory = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, directory, True)
+        for name in ('b.docx', 'a.DOCX', '~$a.docx', 'c.doc', 'note.txt'):
+            open(os.path.join(directory, name), 'wb').close()
+        self.assertEqual(expand_inputs([directory, 'x.docx']),
+                         [os.path.join(directory, 'a.DOCX'), os.path.join(directory, 'b.docx'), 'x.docx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
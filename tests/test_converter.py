@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from tests import TEST_DIR
+from config.settings import CONVERTER_CONFIG
+from converter import ConverterPool, CopyBackend
+
+
+class CountingBackend(CopyBackend):
+    name = 'counting'
+    conversions = []
+
+    def convert(self, src_path, dst_path):
+        self.conversions.append(src_path)
+        super().convert(src_path, dst_path)
+
+
+class OtherBackend(CopyBackend):
+    name = 'other'
+
+
+class ConverterPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        CountingBackend.conversions = []
+
+    def pool(self, backend=CountingBackend):
+        pool = ConverterPool(backend, pool_size=2, cache_dir=self.cache_dir)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_same_content_converted_once(self):
+        first = self.write('a.doc', b'content')
+        second = self.write('b.doc', b'content')
+        pool = self.pool()
+        path = pool.convert(first)
+        self.assertEqual(pool.convert(second), path)
+        self.assertEqual(self.pool().convert(second), path)
+        self.assertEqual(CountingBackend.conversions, [first])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'content')
+
+    def test_cache_key_includes_backend(self):
+        source = self.write('a.doc', b'content')
+        counting = self.pool().convert(source)
+        other = self.pool(OtherBackend).convert(source)
+        self.assertNotEqual(counting, other)
+        self.assertEqual(os.path.relpath(other, self.cache_dir).split(os.sep)[0], 'other')
+
+    def test_prune_least_recently_used(self):
+        pool = self.pool()
+        paths = [pool.convert(self.write(f"{i}.doc", bytes([i]) * 600 * 1024)) for i in range(3)]
+        old = time.time() - 2 * ConverterPool.KEEP_RECENT
+        for i, path in enumerate(paths):
+            os.utime(path, (old + i, old + i))
+        # 命中缓存的文件记为最近使用
+        pool.convert(self.write('again.doc', bytes([0]) * 600 * 1024))
+        with mock.patch.dict(CONVERTER_CONFIG, max_mb=1):
+            self.assertEqual(pool.prune(), 2)
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, False])
+
+    def test_recently_used_files_kept_over_size(self):
+        pool = self.pool()
+        paths = [pool.convert(self.write(f"{i}.doc", bytes([i]) * 600 * 1024)) for i in range(2)]
+        with mock.patch.dict(CONVERTER_CONFIG, max_mb=1):
+            self.assertEqual(pool.prune(), 0)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_prune_expired(self):
+        pool = self.pool()
+        path = pool.convert(self.write('a.doc', b'content'))
+        old = time.time() - 31 * 86400
+        os.utime(path, (old, old))
+        self.assertEqual(pool.prune(), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from tests import TEST_DIR
+from benchmarks.corpus import corpus_params, generate_corpus
+from format_pipeline import FormatPipeline
+from formatter import DocumentFormatter
+from tests.test_format_engines import TEMPLATE
+
+DOCUMENT = 'word/document.xml'
+
+
+def read_document(path):
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(DOCUMENT)
+
+
+class FormatBatchTest(unittest.TestCase):
+    """流水线和进程池批量格式化的输出与逐个调用 format_document 一致"""
+
+    @classmethod
+    def setUpClass(cls):
+        from database.migrations import ensure_schema
+        from database.models import User
+        ensure_schema()
+        user = User().get_by_username('batch_test')
+        cls.user_id = user['id'] if user else User().create('batch_test', 'batch_test@example.com', '')
+        cls.corpus = generate_corpus(os.path.join(TEST_DIR, 'batch_corpus'),
+                                     corpus_params(docs=4, paragraphs=30, tables=1, images=1, seed=13))
+        cls.expected_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        cls.expected = {}
+        formatter = cls.formatter()
+        for source in cls.corpus:
+            output = os.path.join(cls.expected_dir, os.path.basename(source))
+            formatter.format_document(source, output)
+            cls.expected[source] = read_document(output)
+
+    @classmethod
+    def formatter(cls, engine='docx'):
+        formatter = DocumentFormatter(user_id=cls.user_id, engine=engine)
+        formatter.current_template = TEMPLATE
+        return formatter
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.bad = os.path.join(self.dir, 'bad.docx')
+        with open(self.bad, 'w') as f:
+            f.write('不是文档')
+
+    def assert_outputs(self, results, files):
+        self.assertEqual(sorted(result['path'] for result in results), sorted(files))
+        for result in results:
+            with self.subTest(file=result['file']):
+                if result['path'] == self.bad:
+                    self.assertFalse(result['success'])
+                    self.assertIn('处理文档时出错', result['error'])
+                else:
+                    self.assertTrue(result['success'], result['error'])
+                    self.assertEqual(read_document(result['output']), self.expected[result['path']])
+
+    def test_pipeline_in_input_order(self):
+        files = self.corpus[:2] + [self.bad] + self.corpus[2:]
+        jobs = [(path, os.path.join(self.dir, 'out', f"{i}.docx")) for i, path in enumerate(files)]
+        os.makedirs(os.path.join(self.dir, 'out'))
+        results = list(FormatPipeline(self.formatter(), read_ahead=1, write_queue=1).run(jobs))
+        self.assertEqual([result['path'] for result in results], files)
+        self.assert_outputs(results, files)
+
+    def test_pipeline_stops_when_closed_early(self):
+        jobs = [(path, os.path.join(self.dir, os.path.basename(path))) for path in self.corpus]
+        results = FormatPipeline(self.formatter(), read_ahead=1, write_queue=1).run(jobs)
+        next(results)
+        results.close()
+        self.assertFalse([t for t in threading.enumerate() if t.name.startswith('format-')])
+
+    def test_format_files(self):
+        files = self.corpus + [self.bad]
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                results = []
+                summary = self.formatter().format_files(files, os.path.join(self.dir, f"out{workers}"),
+                                                        workers=workers, result_callback=results.append,
+                                                        use_cache=False)
+                self.assertEqual((summary['success'], len(summary['failed'])), (len(self.corpus), 1))
+                self.assert_outputs(results, files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from tests import TEST_DIR
+from format_cache import FormatCache, template_hash
+from config.settings import FORMAT_CACHE_CONFIG
+
+TEMPLATE = {'name': 't', 'formats': {'body': {'font': '仿宋', 'size': 16}}}
+
+
+class FormatCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        self.source = self.write('in.docx', b'source')
+        self.output = os.path.join(self.dir, 'out', 'in_formatted.docx')
+        self.tpl_hash = template_hash(TEMPLATE)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def formatted(self, cache, data=b'formatted'):
+        """模拟一次格式化：写出输出并存入缓存，返回缓存键"""
+        key = cache.key(self.source, self.tpl_hash)
+        self.assertFalse(cache.lookup(key, self.output))
+        os.makedirs(os.path.dirname(self.output), exist_ok=True)
+        with open(self.output, 'wb') as f:
+            f.write(data)
+        cache.store(key, self.output)
+        cache.save()
+        return key
+
+    def read_output(self):
+        with open(self.output, 'rb') as f:
+            return f.read()
+
+    def test_hit_restores_output(self):
+        key = self.formatted(FormatCache(self.cache_dir))
+        os.remove(self.output)
+        # 重新加载索引（日志）后仍然命中
+        cache = FormatCache(self.cache_dir)
+        self.assertEqual(cache.key(self.source, self.tpl_hash), key)
+        self.assertTrue(cache.lookup(key, self.output))
+        self.assertEqual(self.read_output(), b'formatted')
+        # 默认复制：输出与缓存对象是不同的文件
+        self.assertFalse(os.path.samefile(self.output, cache.object_path(key)))
+
+    def test_template_and_input_changes_invalidate(self):
+        cache = FormatCache(self.cache_dir)
+        key = self.formatted(cache)
+        changed = dict(TEMPLATE, formats={'body': {'font': '仿宋', 'size': 14}})
+        self.assertNotEqual(cache.key(self.source, template_hash(changed)), key)
+        self.assertNotEqual(cache.key(self.source, template_hash(TEMPLATE, {'engine': 'lxml'})), key)
+        time.sleep(0.01)
+        self.write('in.docx', b'edited source')
+        self.assertNotEqual(cache.key(self.source, self.tpl_hash), key)
+
+    def test_template_hash_ignores_key_order(self):
+        reordered = {'formats': {'body': {'size': 16, 'font': '仿宋'}}, 'name': 't'}
+        self.assertEqual(template_hash(reordered), self.tpl_hash)
+
+    def test_linked_output_edited_in_place_is_not_served(self):
+        with mock.patch.dict(FORMAT_CACHE_CONFIG, link=True):
+            cache = FormatCache(self.cache_dir)
+            key = self.formatted(cache)
+            obj = cache.object_path(key)
+            self.assertTrue(os.path.samefile(self.output, obj))
+            # 用户原地修改硬链接的输出，缓存对象随之改变
+            with open(self.output, 'r+b') as f:
+                f.write(b'EDITED')
+            cache = FormatCache(self.cache_dir)
+            self.assertFalse(cache.lookup(key, self.output))
+            self.assertFalse(os.path.exists(obj))
+            self.assertEqual(self.read_output(), b'EDITEDted')
+
+    def test_touched_object_still_hits(self):
+        cache = FormatCache(self.cache_dir)
+        key = self.formatted(cache)
+        obj = cache.object_path(key)
+        os.utime(obj, ns=(0, 0))
+        os.remove(self.output)
+        self.assertTrue(cache.lookup(key, self.output))
+        self.assertEqual(self.read_output(), b'formatted')
+
+    def test_unindexed_object_is_dropped(self):
+        key = self.formatted(FormatCache(self.cache_dir))
+        os.remove(os.path.join(self.cache_dir, 'index.log'))
+        cache = FormatCache(self.cache_dir)
+        self.assertFalse(cache.lookup(key, self.output))
+        self.assertFalse(os.path.exists(cache.object_path(key)))
+
+    def test_prune_removes_least_recently_used(self):
+        cache = FormatCache(self.cache_dir)
+        keys = []
+        for i in range(3):
+            self.source = self.write(f"in{i}.docx", f"source {i}".encode())
+            keys.append(self.formatted(cache, b'x' * 600 * 1024))
+        # 最早保存的对象最近被使用过，淘汰第二个
+        cache._objects[keys[0]][1] += 10
+        with mock.patch.dict(FORMAT_CACHE_CONFIG, max_mb=1):
+            self.assertEqual(cache.prune(), 2)
+        remaining = [key for key in keys if os.path.exists(cache.object_path(key))]
+        self.assertEqual(remaining, [keys[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
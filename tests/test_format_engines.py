@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from tests import TEST_DIR
+from benchmarks.corpus import corpus_params, generate_corpus
+from formatter import DocumentFormatter
+
+# 覆盖位置、正则、关键词、长度和默认规则，与语料的公文结构对应
+TEMPLATE = {
+    'name': '测试模板',
+    'rules': {
+        'title': {'type': 'position', 'position': 1},
+        'chapter': {'type': 'regex', 'pattern': r'^第[一二三四五六七八九十]+章'},
+        'notice': {'type': 'keyword', 'keyword': '通知'},
+        'signature': {'type': 'length', 'max_length': 12},
+        'body': {'type': 'default'}
+    },
+    'formats': {
+        'title': {'font': '方正小标宋简体', 'size': 22, 'alignment': '居中', 'bold': True},
+        'chapter': {'font': '黑体', 'size': 16, 'alignment': '左对齐', 'line_spacing': 28},
+        'notice': {'font': '黑体', 'size': 16, 'alignment': '居中', 'underline': True},
+        'signature': {'font': '仿宋', 'size': 16, 'alignment': '右对齐', 'indent': -0.5},
+        'body': {'font': '仿宋', 'size': 16, 'alignment': '两端对齐', 'indent': 0.74, 'line_spacing': 28}
+    }
+}
+
+# 输出与 docx 引擎逐字节一致的引擎（style 引擎改写样式表，正文不同）
+ENGINES = ('docx', 'lxml', 'stream')
+
+
+def read_member(path, name):
+    with zipfile.ZipFile(path) as zf:
+        return zf.read(name)
+
+
+class FormatEngineParityTest(unittest.TestCase):
+    """各格式化引擎对同一文档生成的 word/document.xml 必须逐字节相同"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = generate_corpus(os.path.join(TEST_DIR, 'engine_corpus'),
+                                     corpus_params(docs=3, paragraphs=40, runs=4, tables=1, images=1, seed=7))
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.out_dir, True)
+
+    def format_with(self, engine, source):
+        formatter = DocumentFormatter(engine=engine)
+        formatter.current_template = TEMPLATE
+        output = os.path.join(self.out_dir, f"{engine}_{os.path.basename(source)}")
+        formatter.format_document(source, output)
+        return output
+
+    def test_document_xml_identical(self):
+        for source in self.corpus:
+            outputs = {engine: self.format_with(engine, source) for engine in ENGINES}
+            expected = read_member(outputs['docx'], 'word/document.xml')
+            self.assertNotEqual(expected, read_member(source, 'word/document.xml'))
+            for engine in ENGINES[1:]:
+                with self.subTest(file=os.path.basename(source), engine=engine):
+                    self.assertEqual(read_member(outputs[engine], 'word/document.xml'), expected)
+
+    def test_other_parts_unchanged(self):
+        source = self.corpus[0]
+        for engine in ENGINES:
+            output = self.format_with(engine, source)
+            with zipfile.ZipFile(source) as src, zipfile.ZipFile(output) as out:
+                self.assertEqual(sorted(src.namelist()), sorted(out.namelist()))
+                for name in src.namelist():
+                    if name != 'word/document.xml':
+                        with self.subTest(engine=engine, part=name):
+                            self.assertEqual(out.read(name), src.read(name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from tests import TEST_DIR
+from http_service import JobService, make_server
+
+TOKEN = 'test-token'
+
+
+class JobServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.service = JobService(2, upload_dir=os.path.join(self.dir, 'up'),
+                                  output_dir=os.path.join(self.dir, 'out'), token=TOKEN)
+        self.addCleanup(self.service.shutdown)
+
+    def test_job_workers_clamped(self):
+        self.assertEqual(self.service.job_workers({}), 1)
+        self.assertEqual(self.service.job_workers({'workers': 64}), 2)
+        self.assertEqual(self.service.job_workers({'workers': '0'}), 1)
+        with self.assertRaises(Exception):
+            self.service.job_workers({'workers': 'many'})
+
+
+class JobRequestHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        service = JobService(1, upload_dir=os.path.join(self.dir, 'up'),
+                             output_dir=os.path.join(self.dir, 'out'), token=TOKEN)
+        self.server = make_server('127.0.0.1', 0, service)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(service.shutdown)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def request(self, method, path, headers=None, body=None, auth=True):
+        conn = http.client.HTTPConnection(*self.server.server_address, timeout=10)
+        self.addCleanup(conn.close)
+        headers = dict(headers or {})
+        if auth:
+            headers['Authorization'] = f"Bearer {TOKEN}"
+        conn.putrequest(method, path)
+        for name, value in headers.items():
+            conn.putheader(name, value)
+        conn.endheaders(body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_health_is_liveness_only(self):
+        self.assertEqual(self.request('GET', '/health', auth=False), (200, {'status': 'ok'}))
+
+    def test_stats_require_token(self):
+        self.assertEqual(self.request('GET', '/stats', auth=False)[0], 401)
+        code, stats = self.request('GET', '/stats')
+        self.assertEqual(code, 200)
+        self.assertIn('db_pool', stats)
+
+    def test_invalid_content_length_rejected(self):
+        for value in ('abc', '-1'):
+            with self.subTest(content_length=value):
+                code, body = self.request('POST', '/jobs/merge', {'Content-Length': value})
+                self.assertEqual(code, 400)
+                self.assertIn('Content-Length', body['error'])
+
+    def test_content_length_checked_after_token(self):
+        code, _ = self.request('POST', '/jobs/merge', {'Content-Length': 'abc'}, auth=False)
+        self.assertEqual(code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
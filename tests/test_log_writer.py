@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from tests import TEST_DIR
+from database.connection import DatabaseConnection
+from database.log_writer import LogWriter, finish_worker_logs, flush_logs, write_log
+from database.sqlite_backend import SQLiteBackend
+
+INSERT = "INSERT INTO entries (message) VALUES (%s)"
+
+
+def _write_in_worker(message):
+    write_log(INSERT, (message,))
+    finish_worker_logs()
+    return os.getpid()
+
+
+class LogWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.path = os.path.join(self.dir, 'logs.db')
+        backend = SQLiteBackend(self.path)
+        backend.execute_update("CREATE TABLE entries (id INTEGER PRIMARY KEY, message TEXT)")
+        flush_logs(10)
+        original = DatabaseConnection._backend
+        DatabaseConnection._backend = backend
+
+        def restore():
+            flush_logs(10)
+            DatabaseConnection._backend = original
+        self.addCleanup(restore)
+
+    def messages(self):
+        with sqlite3.connect(self.path) as conn:
+            return [row[0] for row in conn.execute("SELECT message FROM entries ORDER BY id")]
+
+    def test_batched_write(self):
+        writer = LogWriter(batch_size=2, flush_interval=60)
+        self.addCleanup(writer.close)
+        for message in ('a', 'b', 'c'):
+            writer.write(INSERT, (message,))
+        self.assertTrue(writer.flush(10))
+        self.assertEqual(self.messages(), ['a', 'b', 'c'])
+        self.assertEqual(writer.stats()['written'], 3)
+
+    def test_failed_batch_reported(self):
+        writer = LogWriter(flush_interval=0)
+        self.addCleanup(writer.close)
+        with self.assertLogs('database.log_writer', 'ERROR') as logs:
+            writer.write("INSERT INTO missing (message) VALUES (%s)", ('a',))
+            self.assertTrue(writer.flush(10))
+        self.assertIn('日志写入失败（1 条）', logs.output[0])
+        self.assertEqual((writer.stats()['retried'], writer.stats()['failed']), (1, 1))
+        self.assertEqual(len(writer.take_errors()), 1)
+        self.assertEqual(writer.take_errors(), [])
+
+    def test_finish_worker_logs_raises_on_failure(self):
+        writer = LogWriter(flush_interval=0)
+        self.addCleanup(writer.close)
+        with mock.patch('database.log_writer._writer', writer), \
+                mock.patch('database.log_writer._writer_pid', os.getpid()), \
+                self.assertLogs('database.log_writer', 'ERROR'):
+            writer.write("INSERT INTO missing (message) VALUES (%s)", ('a',))
+            with self.assertRaisesRegex(Exception, '日志写入失败'):
+                finish_worker_logs(10)
+            # 错误只报告一次
+            finish_worker_logs(10)
+
+    def test_worker_logs_written_before_task_returns(self):
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            pids = [pool.submit(_write_in_worker, message).result() for message in ('a', 'b')]
+            # 工作进程仍在运行时日志已经写入
+            self.assertEqual(self.messages(), ['a', 'b'])
+        self.assertNotIn(os.getpid(), pids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from lxml import etree
+from tests import TEST_DIR
+from benchmarks.corpus import corpus_params, generate_corpus
+from docx_stream import W_NS, R_NS, PKG_REL_NS, W_SECT_PR, RT_IMAGE
+from merger import merge_streaming, merge_documents
+
+DOCUMENT = 'word/document.xml'
+DOCUMENT_RELS = 'word/_rels/document.xml.rels'
+
+
+def package_members(path):
+    with zipfile.ZipFile(path) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def document_relationships(members):
+    rels = etree.fromstring(members[DOCUMENT_RELS])
+    return {rel.get('Id'): rel for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship')}
+
+
+def referenced_ids(members):
+    """正文中引用的关系ID（r:id、r:embed 等）"""
+    root = etree.fromstring(members[DOCUMENT])
+    return {value for el in root.iter(etree.Element) for key, value in el.attrib.items()
+            if key.startswith(f'{{{R_NS}}}')}
+
+
+class MergeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus_dir = os.path.join(TEST_DIR, 'merge_corpus')
+        cls.corpus = generate_corpus(cls.corpus_dir, corpus_params(docs=4, paragraphs=30, tables=1, images=2, seed=3))
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+
+    def merge(self, doc_files, workers=1, name='merged'):
+        output = os.path.join(self.work_dir, f"{name}.docx")
+        merge_streaming(doc_files, output, workers=workers)
+        return output
+
+    def test_parallel_matches_streaming(self):
+        serial = package_members(self.merge(self.corpus, workers=1, name='serial'))
+        parallel = package_members(self.merge(self.corpus, workers=2, name='parallel'))
+        self.assertEqual(sorted(serial), sorted(parallel))
+        for name in serial:
+            with self.subTest(part=name):
+                self.assertEqual(parallel[name], serial[name])
+
+    def test_body_order_page_breaks_and_section(self):
+        members = package_members(self.merge(self.corpus))
+        body = etree.fromstring(members[DOCUMENT]).find(f'{{{W_NS}}}body')
+        self.assertEqual(len(body.findall(W_SECT_PR)), 1)
+        self.assertEqual(body[-1].tag, W_SECT_PR)
+        breaks = body.findall(f'.//{{{W_NS}}}br[@{{{W_NS}}}type="page"]')
+        self.assertEqual(len(breaks), len(self.corpus) - 1)
+
+    def test_relationships_resolve(self):
+        members = package_members(self.merge(self.corpus))
+        rels = document_relationships(members)
+        used = referenced_ids(members)
+        self.assertTrue(used)
+        self.assertEqual(used - set(rels), set())
+        for rel_id in used:
+            rel = rels[rel_id]
+            if rel.get('TargetMode') != 'External':
+                self.assertIn(f"word/{rel.get('Target')}", members)
+
+    def test_media_deduplicated(self):
+        # 同一文档出现三次，图片内容只保存一份
+        source = self.corpus[1]
+        copies = []
+        for i in range(3):
+            path = os.path.join(self.work_dir, f"copy_{i}.docx")
+            shutil.copyfile(source, path)
+            copies.append(path)
+        members = package_members(self.merge([self.corpus[0]] + copies))
+        rels = document_relationships(members)
+        image_targets = {rels[rel_id].get('Target') for rel_id in referenced_ids(members)
+                         if rels[rel_id].get('Type') == RT_IMAGE}
+        with zipfile.ZipFile(source) as zf:
+            source_images = {name for name in zf.namelist() if name.startswith('word/media/')}
+        with zipfile.ZipFile(self.corpus[0]) as zf:
+            base_images = {name for name in zf.namelist() if name.startswith('word/media/')}
+        self.assertEqual(len(image_targets), len(source_images) + len(base_images))
+        media = [data for name, data in members.items() if name.startswith('word/media/')]
+        self.assertEqual(len(media), len(set(media)))
+
+    def test_merge_documents_marks_files_after_save(self):
+        from database.migrations import ensure_schema
+        from database.models import DocTask, User
+        ensure_schema()
+        user = User().get_by_username('merge_test')
+        user_id = user['id'] if user else User().create('merge_test', 'merge_test@example.com', '')
+        save_dir = os.path.join(self.work_dir, 'out')
+        output_path = os.path.join(save_dir, 'merged.docx')
+        task_id = DocTask().create(user_id, 'merge', 'merged', self.corpus_dir, output_path, None)
+        output = merge_documents(self.corpus_dir, 'merged', save_dir, task_id=task_id)
+        self.assertTrue(os.path.exists(output))
+        self.assertEqual(DocTask().get_by_id(task_id)['status'], 'success')
+        files = DocTask().get_task_files(task_id)
+        self.assertEqual([f['status'] for f in files], ['success'] * len(self.corpus))
+
+
+if __name__ == '__main__':
+    unittest.main()
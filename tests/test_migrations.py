@@ -0,0 +1,89 @@
+import os
+import unittest
+from datetime import datetime
+from unittest import mock
+from tests import TEST_DIR
+from database import migrations
+from database.connection import DatabaseConnection
+from database.log_writer import flush_logs
+from database.sqlite_backend import SQLiteBackend
+
+
+def columns(conn, table):
+    return {row['name'] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+class SQLiteMigrationTest(unittest.TestCase):
+    """从只有初始表结构（版本 1）的 SQLite 数据库升级到最新版本"""
+
+    def setUp(self):
+        path = os.path.join(TEST_DIR, f"migrate_{self._testMethodName}.db")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        # 迁移通过 DatabaseConnection 取得连接，测试期间换成独立的数据库文件；
+        # 切换前后写完异步日志，其他测试的日志不会写入本测试的数据库
+        connection = DatabaseConnection()
+        flush_logs(10)
+        self.addCleanup(setattr, DatabaseConnection, '_backend', connection.backend)
+        self.addCleanup(flush_logs, 10)
+        DatabaseConnection._backend = SQLiteBackend(path)
+        self.conn = DatabaseConnection().backend.get_connection()
+
+    def migrate_to_v1(self):
+        with mock.patch.object(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:1]):
+            self.assertEqual(migrations.migrate(), 1)
+        self.assertEqual(migrations.current_version(), 1)
+
+    def test_upgrade_v1_to_latest(self):
+        self.migrate_to_v1()
+        self.assertNotIn('span_id', columns(self.conn, 'performance_logs'))
+        self.assertNotIn('profile_path', columns(self.conn, 'doc_tasks'))
+        # 版本 1 时写入的数据升级后保留
+        user_id = self.conn.execute(
+            "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+            ('v1_user', 'v1@example.com', '')).lastrowid
+        task_id = self.conn.execute(
+            "INSERT INTO doc_tasks (user_id, task_type, task_name, input_path, output_path, start_time) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, 'format', 'v1_task', '/in', '/out', datetime.now())).lastrowid
+        self.conn.execute(
+            "INSERT INTO performance_logs (task_id, operation, start_time, end_time, duration_ms) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (task_id, 'v1_op', datetime.now(), datetime.now(), 5))
+        self.conn.commit()
+
+        self.assertEqual(migrations.ensure_schema(), migrations.LATEST_VERSION - 1)
+        self.assertEqual(migrations.current_version(), migrations.LATEST_VERSION)
+        versions = [row['version'] for row in self.conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        self.assertEqual(versions, [m['version'] for m in migrations.MIGRATIONS])
+        self.assertTrue({'span_id', 'parent_span_id'} <= columns(self.conn, 'performance_logs'))
+        self.assertIn('profile_path', columns(self.conn, 'doc_tasks'))
+        task = self.conn.execute("SELECT task_name, profile_path FROM doc_tasks WHERE id = ?", (task_id,)).fetchone()
+        self.assertEqual(task['task_name'], 'v1_task')
+        self.assertIsNone(task['profile_path'])
+        log = self.conn.execute("SELECT operation, span_id FROM performance_logs WHERE task_id = ?",
+                                (task_id,)).fetchone()
+        self.assertEqual(log['operation'], 'v1_op')
+        self.assertIsNone(log['span_id'])
+
+    def test_upgraded_schema_accepts_new_columns(self):
+        self.migrate_to_v1()
+        migrations.ensure_schema()
+        from database.models import DocTask, User, PerformanceLog
+        user_id = User().create('new_user', 'new@example.com', '')
+        task_id = DocTask().create(user_id, 'format', 'task', '/in', '/out', None)
+        self.assertTrue(DocTask().set_profile_path(task_id, '/profiles/task'))
+        self.assertEqual(DocTask().get_by_id(task_id)['profile_path'], '/profiles/task')
+        PerformanceLog().add_span(task_id, 'span', datetime.now(), datetime.now(), 1, 0.5, 11, 10)
+        spans = PerformanceLog().get_task_performance(task_id)
+        self.assertEqual([(s['span_id'], s['parent_span_id']) for s in spans], [(11, 10)])
+
+    def test_ensure_schema_is_idempotent(self):
+        self.assertEqual(migrations.ensure_schema(), migrations.LATEST_VERSION)
+        self.assertEqual(migrations.ensure_schema(), 0)
+        self.assertEqual(migrations.migrate(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+from database.connection import MySQLBackend, MySQLConnection, Session
+
+
+class FakeCursor:
+    """模拟 mysql-connector 的预处理游标，记录预处理、执行和释放次数"""
+
+    def __init__(self, server, prepared, dictionary):
+        self.server = server
+        self.prepared = prepared
+        self.dictionary = dictionary
+        self.statement = None
+        self.closed = False
+        self.lastrowid = 1
+        self.rowcount = 1
+
+    def execute(self, query, params=()):
+        if self.prepared and self.statement != query:
+            if self.statement:
+                self.server['deallocate'] += 1
+            self.server['prepare'] += 1
+            self.statement = query
+        self.server['execute'] += 1
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        if self.statement:
+            self.server['deallocate'] += 1
+            self.statement = None
+        self.closed = True
+
+
+class FakeConnection:
+    in_transaction = False
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+
+    def cursor(self, prepared=False, dictionary=False):
+        return FakeCursor(self.server, prepared, dictionary)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+class StatementCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = {'prepare': 0, 'execute': 0, 'deallocate': 0}
+        self.connections = []
+
+        def connect(**kwargs):
+            conn = FakeConnection(self.server)
+            self.connections.append(conn)
+            return conn
+
+        with mock.patch('mysql.connector.connect', connect):
+            self.backend = MySQLBackend()
+
+    def test_statements_prepared_once_per_connection(self):
+        for i in range(5):
+            with Session(self.backend) as s:
+                s.execute("UPDATE doc_tasks SET status = %s WHERE id = %s", ('running', i))
+                s.query("SELECT * FROM doc_tasks WHERE id = %s", (i,))
+        self.assertEqual(self.server, {'prepare': 2, 'execute': 10, 'deallocate': 0})
+
+    def test_least_recently_used_statement_closed(self):
+        conn = MySQLConnection(FakeConnection(self.server), statement_cache=2)
+        first = conn.statement('q1')
+        second = conn.statement('q2')
+        self.assertIs(conn.statement('q1'), first)
+        conn.statement('q3')
+        self.assertTrue(second.closed)
+        self.assertFalse(first.closed)
+        self.assertEqual(set(conn._statements), {('q1', False), ('q3', False)})
+        # 查询与写入使用不同的游标类型
+        self.assertTrue(conn.statement('q1', dictionary=True).dictionary)
+
+    def test_statements_released_when_pool_discards_connection(self):
+        with Session(self.backend) as s:
+            s.execute("UPDATE doc_tasks SET status = %s WHERE id = %s", ('running', 1))
+        self.backend._pool.close()
+        self.assertEqual(self.server['deallocate'], 1)
+        self.assertTrue(all(conn.closed for conn in self.connections))
+
+
+if __name__ == '__main__':
+    unittest.main()
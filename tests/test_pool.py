@@ -0,0 +1,140 @@
+import threading
+import time
+import unittest
+from database.pool import ConnectionPool
+
+
+class FakeConnection:
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+
+    def __init__(self):
+        self.created = []
+        self.fail = False
+
+    def __call__(self):
+        if self.fail:
+            raise Exception('连接失败')
+        conn = FakeConnection(len(self.created))
+        self.created.append(conn)
+        return conn
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def pool(self, **kwargs):
+        self.factory = Factory()
+        options = dict(min_size=0, max_size=1, timeout=5, idle_timeout=300, ping_interval=300)
+        options.update(kwargs)
+        pool = ConnectionPool(self.factory, ping=lambda conn: conn.alive, **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def start_waiter(self, pool, results, name):
+        thread = threading.Thread(target=lambda: results.append((name, pool.acquire())))
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        return thread
+
+    def wait_for_waiters(self, pool, count):
+        deadline = time.monotonic() + 5
+        while pool.stats()['waiting'] < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_warm_up(self):
+        pool = self.pool(min_size=2, max_size=3)
+        self.assertEqual((pool.stats()['size'], pool.stats()['idle']), (2, 2))
+
+    def test_released_connection_goes_to_waiters_in_order(self):
+        pool = self.pool()
+        conn = pool.acquire()
+        results = []
+        first = self.start_waiter(pool, results, 'first')
+        self.wait_for_waiters(pool, 1)
+        second = self.start_waiter(pool, results, 'second')
+        self.wait_for_waiters(pool, 2)
+        pool.release(conn)
+        first.join(5)
+        self.assertEqual(results, [('first', conn)])
+        pool.release(conn)
+        second.join(5)
+        self.assertEqual(results, [('first', conn), ('second', conn)])
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['created'], stats['waits']), (1, 1, 2))
+
+    def test_waiter_times_out(self):
+        pool = self.pool()
+        pool.acquire()
+        with self.assertRaisesRegex(Exception, '获取数据库连接超时'):
+            pool.acquire(timeout=0.05)
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['waiting']), (1, 0))
+
+    def test_broken_connection_slot_handed_to_waiter(self):
+        pool = self.pool()
+        conn = pool.acquire()
+        results = []
+        waiter = self.start_waiter(pool, results, 'waiter')
+        self.wait_for_waiters(pool, 1)
+        pool.release(conn, broken=True)
+        waiter.join(5)
+        self.assertTrue(conn.closed)
+        self.assertIsNot(results[0][1], conn)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_failed_create_frees_slot(self):
+        pool = self.pool()
+        self.factory.fail = True
+        with self.assertRaisesRegex(Exception, '连接失败'):
+            pool.acquire()
+        self.assertEqual(pool.stats()['size'], 0)
+        self.factory.fail = False
+        self.assertIsNotNone(pool.acquire(timeout=0))
+
+    def test_dead_idle_connection_replaced(self):
+        pool = self.pool(min_size=1, ping_interval=0)
+        dead = self.factory.created[0]
+        dead.alive = False
+        conn = pool.acquire()
+        self.assertIsNot(conn, dead)
+        self.assertTrue(dead.closed)
+        self.assertEqual(pool.stats()['failed_pings'], 1)
+
+    def test_shrinks_idle_connections_to_min_size(self):
+        pool = self.pool(min_size=1, max_size=3, idle_timeout=0)
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['closed']), (1, 1, 2))
+        self.assertEqual(sum(not conn.closed for conn in conns), 1)
+
+    def test_idle_connections_kept_before_timeout(self):
+        pool = self.pool(min_size=1, max_size=3)
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        self.assertEqual(pool.stats()['idle'], 3)
+
+    def test_pooled_connection_close_returns_to_pool(self):
+        pool = self.pool()
+        pooled = pool.connection()
+        self.assertEqual(pooled.number, 0)
+        pooled.close()
+        pooled.close()
+        stats = pool.stats()
+        self.assertEqual((stats['in_use'], stats['idle']), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
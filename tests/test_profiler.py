@@ -0,0 +1,87 @@
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+from tests import TEST_DIR
+from benchmarks.corpus import corpus_params, generate_corpus
+from profiler import BatchProfiler, profile_dir, profile_file, profile_task, profile_top
+from tests.test_format_engines import TEMPLATE
+
+
+def read_summary(directory):
+    with open(os.path.join(directory, 'summary.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class BatchProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def test_profile_top(self):
+        self.assertEqual([profile_top(value) for value in (None, False, True, 0, 3, '2', -1)],
+                         [None, None, 0, 0, 3, 2, 0])
+
+    def test_keeps_slowest_files(self):
+        directory = os.path.join(self.dir, 'profile')
+        profiler = BatchProfiler(None, 'format', directory, top=2)
+        profiler.start()
+        try:
+            for name, seconds in (('fast', 0), ('slowest', 0.06), ('slow', 0.03)):
+                path = os.path.join(self.dir, f"{name}.docx")
+                with open(path, 'wb') as f:
+                    f.write(name.encode())
+                with profiler.measure(path):
+                    time.sleep(seconds)
+        finally:
+            profiler.stop()
+        self.assertEqual(profiler.write(), directory)
+        summary = read_summary(directory)
+        self.assertEqual(summary['profiled'], 3)
+        self.assertEqual([entry['file'] for entry in summary['files']], ['slowest.docx', 'slow.docx'])
+        first = summary['files'][0]
+        self.assertEqual((first['profile'], first['report']), ('01_slowest.prof', '01_slowest.txt'))
+        pstats.Stats(os.path.join(directory, first['profile']))
+        with open(os.path.join(directory, first['input_copy']), 'rb') as f:
+            self.assertEqual(f.read(), b'slowest')
+
+    def test_disabled_without_task(self):
+        with profile_task(None, 'format', self.dir, None) as profiler:
+            with profile_file(os.path.join(self.dir, 'a.docx')):
+                pass
+        self.assertIsNone(profiler)
+        self.assertEqual(os.listdir(self.dir), [])
+
+
+class FormatProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def test_format_files_records_profile(self):
+        from database.migrations import ensure_schema
+        from database.models import DocTask, User
+        from formatter import DocumentFormatter
+        ensure_schema()
+        user = User().get_by_username('profile_test')
+        user_id = user['id'] if user else User().create('profile_test', 'profile_test@example.com', '')
+        files = generate_corpus(os.path.join(self.dir, 'in'), corpus_params(docs=3, paragraphs=10, seed=17))
+        formatter = DocumentFormatter(user_id=user_id)
+        formatter.current_template = TEMPLATE
+        output_dir = os.path.join(self.dir, 'out')
+        # 开启剖析时忽略 workers，在本进程中逐个处理
+        result = formatter.format_files(files, output_dir, workers=2, use_cache=False, profile=2)
+        directory = profile_dir(result['task_id'], output_dir)
+        self.assertEqual(DocTask().get_by_id(result['task_id'])['profile_path'], os.path.abspath(directory))
+        summary = read_summary(directory)
+        self.assertEqual((summary['task_type'], summary['profiled'], len(summary['files'])), ('format', 3, 2))
+        self.assertEqual(len(os.listdir(os.path.join(directory, 'inputs'))), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import gc
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from tests import TEST_DIR
+from database.connection import Session
+from database.sqlite_backend import SQLITE_NOW, SQLiteBackend, translate_ddl, translate_query
+
+
+class TranslateTest(unittest.TestCase):
+
+    def test_placeholders_and_now(self):
+        self.assertEqual(translate_query("UPDATE t SET a = %s, b = NOW() WHERE id = %s"),
+                         f"UPDATE t SET a = ?, b = {SQLITE_NOW} WHERE id = ?")
+
+    def test_quoted_text_unchanged(self):
+        query = "INSERT INTO t (a, b, c) VALUES (%s, '100%s 完成 NOW()', 'it''s %s')"
+        self.assertEqual(translate_query(query),
+                         "INSERT INTO t (a, b, c) VALUES (?, '100%s 完成 NOW()', 'it''s %s')")
+        self.assertEqual(translate_query("""SELECT 'a\\'%s', "%s", `%s` FROM t WHERE x = %s"""),
+                         """SELECT 'a\\'%s', "%s", `%s` FROM t WHERE x = ?""")
+
+    def test_create_table(self):
+        statements = translate_ddl("""
+        CREATE TABLE IF NOT EXISTS doc_tasks (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            status ENUM('pending', 'running') DEFAULT 'pending' COMMENT '状态',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_status (status)
+        ) COMMENT '任务'
+        """)
+        table, index, trigger = statements
+        self.assertIn('INTEGER PRIMARY KEY AUTOINCREMENT', table)
+        self.assertIn('status TEXT', table)
+        self.assertIn(f"DEFAULT ({SQLITE_NOW})", table)
+        for removed in ('COMMENT', 'ON UPDATE', 'INDEX'):
+            self.assertNotIn(removed, table)
+        self.assertEqual(index.strip(), 'CREATE INDEX IF NOT EXISTS idx_status ON doc_tasks(status)')
+        self.assertIn('CREATE TRIGGER IF NOT EXISTS trg_doc_tasks_updated_at', trigger)
+        conn = sqlite3.connect(':memory:')
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute("INSERT INTO doc_tasks (status) VALUES ('running')")
+        self.assertEqual(conn.execute("SELECT id, status FROM doc_tasks").fetchall(), [(1, 'running')])
+
+    def test_alter_table(self):
+        self.assertEqual(translate_ddl("ALTER TABLE t ADD COLUMN note VARCHAR(20) COMMENT '备注'"),
+                         ["ALTER TABLE t ADD COLUMN note VARCHAR(20)"])
+
+
+class SQLiteBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.backend = SQLiteBackend(os.path.join(self.dir, 'backend.db'), timeout=1)
+        self.backend.execute_update("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+
+    def names(self):
+        # 在另一个线程的连接上读取，只能看到已提交的数据
+        result = []
+        thread = threading.Thread(target=lambda: result.extend(
+            row['name'] for row in self.backend.execute_query("SELECT name FROM items ORDER BY id")))
+        thread.start()
+        thread.join()
+        return result
+
+    def test_thread_connection_closed_on_exit(self):
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(self.backend.get_connection()))
+        thread.start()
+        thread.join()
+        gc.collect()
+        self.assertEqual(self.backend.stats()['connections'], 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            connections[0].execute("SELECT 1")
+
+    def test_write_outside_session_commits(self):
+        self.backend.execute_update("INSERT INTO items (name) VALUES (%s)", ('a',))
+        self.assertEqual(self.names(), ['a'])
+
+    def test_nested_write_joins_session(self):
+        with self.assertRaises(RuntimeError):
+            with Session(self.backend) as s:
+                s.execute("INSERT INTO items (name) VALUES (%s)", ('a',))
+                self.backend.execute_update("INSERT INTO items (name) VALUES (%s)", ('b',))
+                # 写入未单独提交
+                self.assertEqual(self.names(), [])
+                raise RuntimeError('中途失败')
+        self.assertEqual(self.names(), [])
+        with Session(self.backend) as s:
+            s.execute("INSERT INTO items (name) VALUES (%s)", ('a',))
+            self.backend.execute_many("INSERT INTO items (name) VALUES (%s)", [('b',), ('c',)])
+        self.assertEqual(self.names(), ['a', 'b', 'c'])
+
+    def test_nested_session_uses_savepoint(self):
+        with Session(self.backend) as outer:
+            outer.execute("INSERT INTO items (name) VALUES (%s)", ('outer',))
+            with self.assertRaises(RuntimeError):
+                with Session(self.backend) as inner:
+                    inner.execute("INSERT INTO items (name) VALUES (%s)", ('discarded',))
+                    raise RuntimeError('内层失败')
+            with Session(self.backend) as inner:
+                inner.execute("INSERT INTO items (name) VALUES (%s)", ('inner',))
+            self.assertEqual(self.names(), [])
+        self.assertEqual(self.names(), ['outer', 'inner'])
+
+
+if __name__ == '__main__':
+    unittest.main()
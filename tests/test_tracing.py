@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from tests import TEST_DIR
+from benchmarks.corpus import corpus_params, generate_corpus
+from config.settings import TRACE_CONFIG
+from tracing import collect_spans, current_rss_mb, span
+
+TEMPLATE = {
+    'name': '跟踪测试',
+    'rules': {'body': {'type': 'default'}},
+    'formats': {'body': {'font': '仿宋', 'size': 16}}
+}
+
+
+def trace_events(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['traceEvents']
+
+
+@unittest.skipIf(current_rss_mb() is None, '无法读取当前进程的常驻内存')
+class SpanPeakMemoryTest(unittest.TestCase):
+
+    def test_peak_includes_memory_released_before_span_end(self):
+        with collect_spans(parent_id=1) as spans:
+            with span('alloc'):
+                before = current_rss_mb()
+                data = b'x' * (64 * 1024 * 1024)
+                time.sleep(0.1)
+                del data
+        (name, _, parent_id, _, _, _, _, _, peak_mb, _), = spans
+        self.assertEqual((name, parent_id), ('alloc', 1))
+        self.assertGreaterEqual(peak_mb, before + 48)
+
+    def test_no_spans_without_parent(self):
+        with collect_spans(None) as spans:
+            with span('ignored'):
+                pass
+        self.assertEqual(spans, [])
+
+
+class WorkerSpanTest(unittest.TestCase):
+    """进程池工作进程中的阶段随结果返回，写入导出的 trace"""
+
+    @classmethod
+    def setUpClass(cls):
+        from database.migrations import ensure_schema
+        from database.models import User
+        ensure_schema()
+        user = User().get_by_username('trace_test')
+        cls.user_id = user['id'] if user else User().create('trace_test', 'trace_test@example.com', '')
+        cls.corpus_dir = os.path.join(TEST_DIR, 'trace_corpus')
+        cls.corpus = generate_corpus(cls.corpus_dir, corpus_params(docs=3, paragraphs=20, seed=5))
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+        patcher = mock.patch.dict(TRACE_CONFIG, enabled=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_worker_spans(self, trace_path, names):
+        events = trace_events(trace_path)
+        root = [e for e in events if e['args']['parent_id'] is None]
+        self.assertEqual(len(root), 1)
+        workers = [e for e in events if e['pid'] != os.getpid()]
+        self.assertTrue({e['name'] for e in workers} >= names)
+        ids = {e['args']['span_id'] for e in events}
+        self.assertTrue(all(e['args']['parent_id'] in ids for e in workers))
+
+    def test_format_worker_spans(self):
+        from formatter import DocumentFormatter
+        formatter = DocumentFormatter(user_id=self.user_id)
+        formatter.current_template = TEMPLATE
+        trace_path = os.path.join(self.work_dir, 'format.json')
+        formatter.format_files(self.corpus, os.path.join(self.work_dir, 'out'), workers=2, use_cache=False,
+                               trace=trace_path)
+        self.assert_worker_spans(trace_path, {'parse', 'transform', 'save'})
+
+    def test_merge_worker_spans(self):
+        from merger import merge_documents
+        trace_path = os.path.join(self.work_dir, 'merge.json')
+        merge_documents(self.corpus_dir, 'merged', self.work_dir, user_id=self.user_id, workers=2, trace=trace_path)
+        self.assert_worker_spans(trace_path, {'prepare'})
+
+
+if __name__ == '__main__':
+    unittest.main()
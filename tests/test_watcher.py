@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+from tests import TEST_DIR
+from watcher import FolderWatcher, is_candidate
+
+
+class FakeFormatter:
+    """记录调用的格式化器：每个文件返回成功结果，可指定整批抛出的异常"""
+
+    def __init__(self):
+        self.current_template = {'name': 't'}
+        self.batches = []
+        self.pools = []
+        self.error = None
+
+    def worker_pool(self, workers):
+        pool = mock.Mock(name=f"pool{len(self.pools)}")
+        self.pools.append(pool)
+        return pool
+
+    def format_files(self, batch, output_dir, workers=1, result_callback=None, pool=None):
+        self.batches.append((list(batch), pool))
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+        for path in batch:
+            result_callback({'file': os.path.basename(path), 'path': path, 'success': True, 'error': None})
+
+
+class FolderWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=TEST_DIR)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.watch_dir = os.path.join(self.dir, 'in')
+        os.makedirs(self.watch_dir)
+        self.state = os.path.join(self.dir, 'state.json')
+        self.formatter = FakeFormatter()
+
+    def write(self, name, data=b'x'):
+        path = os.path.join(self.watch_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def watcher(self, **kwargs):
+        kwargs.setdefault('settle', 2)
+        kwargs.setdefault('state_path', self.state)
+        return FolderWatcher(self.formatter, self.watch_dir, **kwargs)
+
+    def test_candidates(self):
+        self.assertTrue(is_candidate('a.docx'))
+        self.assertFalse(is_candidate('~$a.docx'))
+        self.assertFalse(is_candidate('.~tmp.docx.tmp'))
+        self.assertFalse(is_candidate('a_formatted.docx'))
+        self.assertFalse(is_candidate('a.doc'))
+
+    def test_debounce_until_stable(self):
+        path = self.write('a.docx')
+        watcher = self.watcher()
+        self.assertEqual(watcher.scan(now=0), [])
+        self.assertEqual(watcher.scan(now=1), [])
+        # 文件仍在写入，重新计时
+        self.write('a.docx', b'xy')
+        self.assertEqual(watcher.scan(now=2.5), [])
+        self.assertEqual(watcher.scan(now=4), [])
+        self.assertEqual(watcher.scan(now=4.5), [path])
+        # 已入队的文件不会重复入队
+        self.assertEqual(watcher.scan(now=10), [])
+
+    def test_processed_files_not_repeated_after_restart(self):
+        path = self.write('a.docx')
+        watcher = self.watcher()
+        watcher.scan(now=0)
+        watcher.scan(now=3)
+        results = watcher.process_pending(timeout=0)
+        self.assertEqual([r['path'] for r in results], [path])
+        restarted = self.watcher()
+        restarted.scan(now=0)
+        self.assertEqual(restarted.scan(now=5), [])
+        # 修改后重新处理
+        self.write('a.docx', b'changed')
+        restarted.scan(now=6)
+        self.assertEqual(restarted.scan(now=9), [path])
+
+    def test_pending_queue_survives_restart(self):
+        path = self.write('a.docx')
+        watcher = self.watcher()
+        watcher.scan(now=0)
+        watcher.scan(now=3)
+        restarted = self.watcher()
+        self.assertEqual([r['path'] for r in restarted.process_pending(timeout=0)], [path])
+
+    def test_failed_batch_is_requeued(self):
+        path = self.write('a.docx')
+        watcher = self.watcher()
+        watcher.scan(now=0)
+        watcher.scan(now=3)
+        self.formatter.error = Exception('数据库不可用')
+        with self.assertRaises(Exception):
+            watcher.process_pending(timeout=0)
+        self.assertEqual([r['path'] for r in watcher.process_pending(timeout=0)], [path])
+
+    def test_scan_error_reported_and_polling_continues(self):
+        errors = []
+        watcher = self.watcher(interval=0.05, settle=0, error_callback=errors.append)
+        original_scan = watcher.scan
+        calls = []
+
+        def flaky_scan(now=None):
+            calls.append(now)
+            if len(calls) == 1:
+                raise OSError('网络共享不可用')
+            if len(calls) >= 3:
+                watcher.stop()
+            return original_scan(now)
+
+        watcher.scan = flaky_scan
+        thread = threading.Thread(target=watcher.run)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertGreaterEqual(len(calls), 3)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], OSError)
+
+    def test_persistent_pool_reused_across_batches(self):
+        done = threading.Event()
+        processed = []
+
+        def on_result(result):
+            processed.append(result['path'])
+            if len(processed) == 2:
+                done.set()
+
+        watcher = self.watcher(workers=2, interval=0.05, settle=0, result_callback=on_result)
+        thread = threading.Thread(target=watcher.run)
+        thread.start()
+        try:
+            self.write('a.docx')
+            for _ in range(200):
+                if processed:
+                    break
+                time.sleep(0.02)
+            self.write('b.docx')
+            self.assertTrue(done.wait(10))
+        finally:
+            watcher.stop()
+            thread.join(10)
+        self.assertEqual(len(self.formatter.pools), 1)
+        pool = self.formatter.pools[0]
+        self.assertGreaterEqual(len(self.formatter.batches), 2)
+        self.assertTrue(all(batch_pool is pool for _, batch_pool in self.formatter.batches))
+        pool.shutdown.assert_called_once_with(cancel_futures=True)
+
+    def test_broken_pool_replaced(self):
+        path = self.write('a.docx')
+        watcher = self.watcher(workers=2)
+        watcher._pool = self.formatter.worker_pool(2)
+        watcher.scan(now=0)
+        watcher.scan(now=3)
+        self.formatter.error = BrokenProcessPool('worker died')
+        with self.assertRaises(BrokenProcessPool):
+            watcher.process_pending(timeout=0)
+        self.assertEqual(len(self.formatter.pools), 2)
+        self.assertEqual([r['path'] for r in watcher.process_pending(timeout=0)], [path])
+        self.assertIs(self.formatter.batches[-1][1], self.formatter.pools[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
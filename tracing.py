@@ -0,0 +1,276 @@
+"""批处理性能跟踪
+
+    with trace_task(task_id, 'format', user_id=user_id, export='trace.json'):
+        with span('parse', file='a.docx'):
+            ...
+
+trace_task 为一个任务开始跟踪并打开根跨度；span 记录一个阶段的真实开始/结束时间、
+耗时和该阶段执行期间的峰值常驻内存（RSS），嵌套的跨度记录父跨度ID，结束时写入 performance_logs。
+峰值由后台线程在有跨度未结束时每 TRACE_SAMPLE_MS 毫秒采样一次，短于采样间隔的跨度取开始和结束时的较大值。
+没有正在跟踪的任务时 span 什么也不做。跟踪状态保存在 contextvars 中，同时执行的
+多个任务互不干扰；新线程需通过 contextvars.copy_context().run 继承（见 FormatPipeline）。
+进程池工作进程中的阶段用 collect_spans 收集，随结果返回主进程后由 add_worker_spans 记录
+（见 formatter._format_in_worker、merger.prepare_fragments）。
+指定 export 或 TRACE_EXPORT_DIR 时，任务结束后把全部跨度导出为 Chrome trace-event JSON，
+可在 chrome://tracing 或 Perfetto 中查看。
+"""
+import os
+import sys
+import json
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from config.settings import TRACE_CONFIG
+
+_tracer = contextvars.ContextVar('tracer', default=None)
+_parent = contextvars.ContextVar('trace_parent', default=None)
+
+
+def current_rss_mb():
+    """进程当前的常驻内存（MB），无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if sys.platform == 'win32':
+        return windows_memory_mb('WorkingSetSize')
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+
+
+def windows_memory_mb(field):
+    """Windows 进程内存计数器（如 WorkingSetSize、PeakWorkingSetSize，MB），无法获取时返回 None"""
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return round(getattr(counters, field) / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+class _PeakSampler:
+    """有跨度未结束时在后台线程中定期采样 RSS，更新各未结束跨度的峰值"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        # 进程池 fork 出的子进程中没有采样线程，锁也可能处于持有状态，重新创建
+        self._cond = threading.Condition()
+        self._open = {}
+        self._thread = None
+
+    def open(self):
+        """开始跟踪一个跨度的峰值，返回峰值记录；无法获取 RSS 时返回 None"""
+        rss = current_rss_mb()
+        if rss is None:
+            return None
+        peak = [rss]
+        if self.interval > 0:
+            with self._cond:
+                self._open[id(peak)] = peak
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='trace-rss-sampler', daemon=True)
+                    self._thread.start()
+                self._cond.notify()
+        return peak
+
+    def close(self, peak):
+        """结束跟踪并返回跨度期间的峰值 RSS（MB）"""
+        if peak is None:
+            return None
+        rss = current_rss_mb()
+        with self._cond:
+            self._open.pop(id(peak), None)
+            if rss is not None and rss > peak[0]:
+                peak[0] = rss
+        return peak[0]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._open:
+                    self._cond.wait()
+            rss = current_rss_mb()
+            if rss is not None:
+                with self._cond:
+                    for peak in self._open.values():
+                        if rss > peak[0]:
+                            peak[0] = rss
+            time.sleep(self.interval)
+
+
+_sampler = _PeakSampler(TRACE_CONFIG['sample_ms'] / 1000)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_sampler._reset)
+
+
+class Tracer:
+    """一个任务的跟踪器：跨度结束时写入 performance_logs，需要导出时在内存中保留全部跨度"""
+
+    def __init__(self, task_id=None, user_id=None, export=None, min_ms=None, detail=None, collect=False):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.export_path = export
+        # 在内存中保留全部跨度（导出或在工作进程中收集时）
+        self.collect = collect or bool(export)
+        # 是否记录各阶段的跨度（否则只有任务根跨度）
+        self.detail = TRACE_CONFIG['enabled'] if detail is None else detail
+        self.min_ms = TRACE_CONFIG['min_ms'] if min_ms is None else min_ms
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, name, span_id, parent_id, start, end, started_at, args, peak_mb=None):
+        """记录一个结束的跨度，peak_mb 为该阶段执行期间的峰值 RSS（MB）"""
+        self.add((name, span_id, parent_id, start, end, started_at, os.getpid(), threading.get_ident(), peak_mb,
+                  args))
+
+    def add(self, item):
+        name, span_id, parent_id, start, end, started_at, _, _, peak_mb, _ = item
+        duration_ms = (end - start) * 1000
+        if self.collect:
+            with self._lock:
+                self.spans.append(item)
+        if self.task_id is not None and duration_ms >= self.min_ms:
+            from database.models import PerformanceLog
+            try:
+                PerformanceLog().add_span(self.task_id, name, started_at, started_at + timedelta(seconds=end - start),
+                                          int(duration_ms), peak_mb, span_id, parent_id)
+            except Exception as e:
+                # 跟踪记录失败不影响处理本身
+                print(f"性能日志写入失败: {str(e)}", file=sys.stderr)
+
+    def export_chrome(self, path):
+        """导出为 Chrome trace-event JSON（完整事件，时间单位微秒）
+
+        工作进程的跨度以其进程ID单独成行；perf_counter 为系统范围的单调时钟，各进程的时间可直接对齐。
+        """
+        events = []
+        for name, span_id, parent_id, start, end, _, pid, tid, peak_mb, args in self.spans:
+            events.append({
+                'name': name,
+                'cat': 'xxwenling',
+                'ph': 'X',
+                'ts': round((start - self.origin) * 1e6, 1),
+                'dur': round((end - start) * 1e6, 1),
+                'pid': pid,
+                'tid': tid,
+                'args': dict(args, span_id=span_id, parent_id=parent_id, peak_rss_mb=peak_mb)
+            })
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'task_id': self.task_id}}, f, ensure_ascii=False, default=str)
+        return path
+
+
+def _new_span_id():
+    # 跨度在写入前生成ID（日志异步批量写入，拿不到自增ID），63 位随机数跨进程基本不重复
+    return random.getrandbits(63)
+
+
+@contextmanager
+def span(name, **args):
+    """记录一个阶段；没有正在跟踪的任务或关闭了阶段跟踪时不做任何事"""
+    tracer = _tracer.get()
+    if tracer is None or not tracer.detail:
+        yield
+        return
+    with _record_span(tracer, name, args):
+        yield
+
+
+@contextmanager
+def _record_span(tracer, name, args):
+    span_id = _new_span_id()
+    parent_id = _parent.get()
+    token = _parent.set(span_id)
+    peak = _sampler.open()
+    started_at = datetime.now()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _parent.reset(token)
+        tracer.record(name, span_id, parent_id, start, end, started_at, args, _sampler.close(peak))
+
+
+def worker_trace_parent():
+    """提交到进程池的任务所属的跨度ID；没有跟踪阶段时返回 None，工作进程不收集跨度"""
+    tracer = _tracer.get()
+    if tracer is None or not tracer.detail:
+        return None
+    return _parent.get()
+
+
+@contextmanager
+def collect_spans(parent_id):
+    """在工作进程中收集跨度（父跨度为 parent_id），产出的列表随结果返回主进程交给 add_worker_spans
+
+    parent_id 为 None 时不跟踪，列表为空。
+    """
+    if parent_id is None:
+        yield []
+        return
+    tracer = Tracer(collect=True, detail=True)
+    tracer_token = _tracer.set(tracer)
+    parent_token = _parent.set(parent_id)
+    try:
+        yield tracer.spans
+    finally:
+        _parent.reset(parent_token)
+        _tracer.reset(tracer_token)
+
+
+def add_worker_spans(spans):
+    """把工作进程返回的跨度记入当前任务"""
+    tracer = _tracer.get()
+    if tracer is None:
+        return
+    for item in spans:
+        tracer.add(item)
+
+
+@contextmanager
+def trace_task(task_id, name, user_id=None, export=None):
+    """跟踪一个任务：打开名为 name 的根跨度，结束后按需导出 Chrome trace
+
+    TRACE=0 时只记录根跨度（整个任务一条性能日志）；export 为空且设置了 TRACE_EXPORT_DIR 时
+    导出到该目录下的 task_<ID>.json。
+    """
+    if export is None and TRACE_CONFIG['export_dir']:
+        export = os.path.join(TRACE_CONFIG['export_dir'], f"task_{task_id}.json")
+    tracer = Tracer(task_id, user_id, export)
+    tracer_token = _tracer.set(tracer)
+    parent_token = _parent.set(None)
+    try:
+        with _record_span(tracer, name, {}):
+            yield tracer
+    finally:
+        _parent.reset(parent_token)
+        _tracer.reset(tracer_token)
+        if export:
+            tracer.export_chrome(export)
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import queue
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from docx_package import TEMP_PREFIX
+from config.settings import WATCH_CONFIG
+
+
+def default_state_path(watch_dir):
+    """监视目录对应的状态文件路径"""
+    digest = hashlib.sha1(os.path.abspath(watch_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(WATCH_CONFIG['state_dir'], f"{digest}.json")
+
+
+def is_candidate(name):
+    """需要处理的文件：.docx，排除 Word 锁文件、临时输出文件和已格式化的输出"""
+    lower = name.lower()
+    return (lower.endswith('.docx') and not name.startswith('~$') and not name.startswith(TEMP_PREFIX)
+            and not lower.endswith('_formatted.docx'))
+
+
+class FolderWatcher:
+    """监视目录服务：新增或修改的 .docx 文件稳定后自动格式化
+
+    按 interval 秒轮询目录，文件大小和修改时间连续 settle 秒不变才视为写入完成（扫描仪等
+    边写边落盘的文件不会被提前处理）。就绪文件进入队列，由处理线程成批交给
+    DocumentFormatter.format_files，每批在 doc_tasks/doc_files 中留有记录。workers>1 时
+    run 期间保持一个常驻进程池，工作进程只编译一次模板，各批文件复用。
+    待处理队列和已处理文件的状态持久化到状态文件，服务重启后继续处理且不重复处理未变化的文件。
+    扫描目录或处理一批文件出错（如网络共享暂时不可用）时通过 error_callback 报告并继续监视。
+    """
+
+    def __init__(self, formatter, watch_dir, output_dir=None, workers=1, interval=None, settle=None,
+                 state_path=None, result_callback=None, error_callback=None):
+        if not os.path.isdir(watch_dir):
+            raise Exception("监视目录不存在！")
+        self.formatter = formatter
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.workers = workers
+        self.interval = interval or WATCH_CONFIG['interval']
+        self.settle = WATCH_CONFIG['settle'] if settle is None else settle
+        self.state_path = state_path or default_state_path(watch_dir)
+        self.result_callback = result_callback
+        self.error_callback = error_callback
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._candidates = {}
+        # 路径 -> 入队时的 [大小, 修改时间]
+        self._pending = OrderedDict()
+        self._done = {}
+        self._pool = None
+        self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._pending = OrderedDict((path, stat) for path, stat in state.get('pending', []))
+        self._done = state.get('done', {})
+        for path in self._pending:
+            self._queue.put(path)
+
+    def _save_state(self):
+        with self._lock:
+            state = {'pending': list(self._pending.items()), 'done': self._done}
+        directory = os.path.dirname(self.state_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(temp_path, self.state_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def scan(self, now=None):
+        """扫描一次目录，把已稳定的新文件或修改过的文件加入队列，返回本次入队的文件"""
+        now = time.monotonic() if now is None else now
+        seen = set()
+        ready = []
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_candidate(entry.name):
+                    continue
+                path = entry.path
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                stat = [st.st_size, st.st_mtime_ns]
+                seen.add(path)
+                with self._lock:
+                    if path in self._pending or self._done.get(path) == stat:
+                        self._candidates.pop(path, None)
+                        continue
+                candidate = self._candidates.get(path)
+                if candidate is None or candidate[0] != stat:
+                    # 新出现或仍在变化，重新计时
+                    self._candidates[path] = (stat, now)
+                elif now - candidate[1] >= self.settle:
+                    del self._candidates[path]
+                    ready.append((path, stat))
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        with self._lock:
+            removed = [path for path in self._done if path not in seen]
+            for path in removed:
+                del self._done[path]
+        if ready or removed:
+            with self._lock:
+                for path, stat in ready:
+                    self._pending[path] = stat
+            self._save_state()
+        for path, _ in ready:
+            self._queue.put(path)
+        return [path for path, _ in ready]
+
+    def process_pending(self, timeout=None):
+        """取出队列中的全部文件作为一批处理，返回结果记录列表；timeout 内没有文件时返回空列表"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            batch = [path for path in dict.fromkeys(batch) if path in self._pending]
+        if not batch:
+            return []
+        results = []
+
+        def on_result(result):
+            # 失败的文件同样记为已处理，文件再次变化时才会重试
+            with self._lock:
+                stat = self._pending.pop(result['path'], None)
+                if stat is not None:
+                    self._done[result['path']] = stat
+            results.append(result)
+            if self.result_callback:
+                self.result_callback(result)
+
+        try:
+            self.formatter.format_files(batch, self.output_dir, workers=self.workers, result_callback=on_result,
+                                        pool=self._pool)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # 工作进程异常退出后进程池不可再用，换一个新的，放回队列的文件在新进程池中重试
+                self._replace_pool()
+            # 整批失败（如数据库不可用）时未处理的文件放回队列，稍后重试
+            with self._lock:
+                leftover = [path for path in batch if path in self._pending]
+            for path in leftover:
+                self._queue.put(path)
+            raise
+        finally:
+            self._save_state()
+        return results
+
+    def _report_error(self, error):
+        if self.error_callback:
+            try:
+                self.error_callback(error)
+            except Exception:
+                pass
+
+    def _replace_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self.formatter.worker_pool(self.workers)
+
+    def _process_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.process_pending(timeout=self.interval)
+            except Exception as e:
+                self._report_error(e)
+                self._stop.wait(self.interval)
+
+    def run(self):
+        """持续监视直到 stop 被调用（或收到 KeyboardInterrupt）"""
+        if not self.formatter.current_template:
+            raise Exception("未选择格式模板！")
+        self._stop.clear()
+        if self.workers > 1:
+            self._pool = self.formatter.worker_pool(self.workers)
+        worker = threading.Thread(target=self._process_loop, name='watch-processor', daemon=True)
+        worker.start()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.scan()
+                except Exception as e:
+                    # 目录暂时不可访问、文件在列出后被删除等，下一轮重新扫描
+                    self._report_error(e)
+                self._stop.wait(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            worker.join()
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+            self._save_state()
+
+    def stop(self):
+        self._stop.set()